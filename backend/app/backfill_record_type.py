@@ -0,0 +1,42 @@
+import asyncio
+import logging
+
+from .database import storage
+
+logger = logging.getLogger(__name__)
+
+
+async def backfill_record_type() -> int:
+    """
+    Set record_type on documents saved before it was added, so they appear
+    in the upload date index that backs document listing. Safe to rerun:
+    backfilled documents are skipped.
+    Returns:
+        Number of documents updated
+    """
+    updated = 0
+    cursor = None
+    while True:
+        page = await storage.scan_documents(
+            limit=100, cursor=cursor, missing_record_type=True
+        )
+        for item in page["items"]:
+            if await storage.set_record_type(item["id"]):
+                updated += 1
+        cursor = page["next_cursor"]
+        if not cursor:
+            return updated
+
+
+async def main() -> None:
+    updated = await backfill_record_type()
+    logger.info(f"Backfill finished, {updated} documents updated")
+    await storage.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    asyncio.run(main())
@@ -28,10 +28,72 @@ class Settings(BaseSettings):
     s3_endpoint: str = os.environ.get(
         "S3_ENDPOINT", None
     )  # For local development
+    # Storage Client Configuration
+    storage_async_mode: bool = (
+        os.environ.get("STORAGE_ASYNC_MODE", "True").lower() == "true"
+    )  # aioboto3 clients, False falls back to threaded boto3 calls
+    storage_max_connections: int = int(
+        os.environ.get("STORAGE_MAX_CONNECTIONS", "50")
+    )
+    storage_max_retries: int = int(os.environ.get("STORAGE_MAX_RETRIES", "3"))
+    max_upload_size: int = int(
+        os.environ.get("MAX_UPLOAD_SIZE", str(100 * 1024 * 1024))
+    )  # Bytes, larger PDF uploads are rejected
+    # Processing Queue Configuration
+    queue_backend: Literal["memory", "sqs"] = os.environ.get(
+        "QUEUE_BACKEND", "memory"
+    )  # memory runs the worker inside the API process
+    sqs_queue_url: str = os.environ.get("SQS_QUEUE_URL", "")
+    sqs_dead_letter_queue_url: str = os.environ.get(
+        "SQS_DEAD_LETTER_QUEUE_URL", ""
+    )
+    sqs_endpoint: str = os.environ.get(
+        "SQS_ENDPOINT", None
+    )  # For local development
+    worker_concurrency: int = int(os.environ.get("WORKER_CONCURRENCY", "2"))
+    queue_visibility_timeout: int = int(
+        os.environ.get("QUEUE_VISIBILITY_TIMEOUT", "900")
+    )  # Seconds a received job stays hidden before it is redelivered
+    queue_max_attempts: int = int(os.environ.get("QUEUE_MAX_ATTEMPTS", "3"))
+    queue_retry_backoff: int = int(
+        os.environ.get("QUEUE_RETRY_BACKOFF", "30")
+    )  # Seconds before the first retry, doubled for each further attempt
+    processing_stale_after: int = int(
+        os.environ.get("PROCESSING_STALE_AFTER", "3600")
+    )  # Seconds without progress before a processing job counts as crashed
     # Vector Database Configuration
-    vector_db: Literal["pinecone", "qdrant"] = os.environ.get(
+    vector_db: Literal["pinecone", "qdrant", "local"] = os.environ.get(
         "VECTOR_DB", "pinecone"
     )
+    search_candidate_factor: int = int(
+        os.environ.get("SEARCH_CANDIDATE_FACTOR", "4")
+    )  # Candidate documents fetched per searched document, for filtering
+    retrieval_mode: Literal["hybrid", "vector", "lexical"] = os.environ.get(
+        "RETRIEVAL_MODE", "hybrid"
+    )  # Default retrieval for questions, BM25 and vectors fused in hybrid
+    retrieval_candidates: int = int(
+        os.environ.get("RETRIEVAL_CANDIDATES", "20")
+    )  # Chunks ranked by each retriever before fusion
+    rrf_k: int = int(os.environ.get("RRF_K", "60"))
+    lexical_index_cache_size: int = int(
+        os.environ.get("LEXICAL_INDEX_CACHE_SIZE", "64")
+    )  # Lexical indexes kept in memory after loading from S3
+    lexical_index_cache_ttl: int = int(
+        os.environ.get("LEXICAL_INDEX_CACHE_TTL", "300")
+    )  # Seconds, bounds staleness when another process reindexes
+    context_candidates: int = int(
+        os.environ.get("CONTEXT_CANDIDATES", "10")
+    )  # Retrieved chunks considered when packing a question's context
+    context_token_budget: int = int(
+        os.environ.get("CONTEXT_TOKEN_BUDGET", "1200")
+    )  # Tokens of document context sent with a question
+    ask_batch_concurrency: int = int(
+        os.environ.get("ASK_BATCH_CONCURRENCY", "8")
+    )  # Answers generated at once for one /ask-batch request
+    # Local vector store (for offline development)
+    local_vector_dir: str = os.environ.get(
+        "LOCAL_VECTOR_DIR", "/tmp/research-vectors"
+    )
     # Pinecone Configuration (for production)
     pinecone_api_key: str = os.environ.get("PINECONE_API_KEY", "")
     pinecone_environment: str = os.environ.get(
@@ -49,10 +111,81 @@ class Settings(BaseSettings):
     embedding_dimension: int = int(
         os.environ.get("EMBEDDING_DIMENSION", "1536")
     )
+    embedding_batch_size: int = int(
+        os.environ.get("EMBEDDING_BATCH_SIZE", "100")
+    )  # Max chunks per embeddings request
+    embedding_batch_tokens: int = int(
+        os.environ.get("EMBEDDING_BATCH_TOKENS", "50000")
+    )  # Max tokens per embeddings request
+    embedding_max_concurrency: int = int(
+        os.environ.get("EMBEDDING_MAX_CONCURRENCY", "8")
+    )  # Embedding requests in flight, separate from the LLM chain calls
+    # OCR Configuration
+    ocr_pages_per_range: int = int(
+        os.environ.get("OCR_PAGES_PER_RANGE", "8")
+    )  # Pages sent per OCR request for large PDFs
+    ocr_max_concurrency: int = int(os.environ.get("OCR_MAX_CONCURRENCY", "4"))
+    ocr_max_retries: int = int(os.environ.get("OCR_MAX_RETRIES", "2"))
+    # Pages with a good embedded text layer skip remote OCR
+    ocr_local_text: bool = (
+        os.environ.get("OCR_LOCAL_TEXT", "true").lower() == "true"
+    )
+    ocr_local_workers: int = int(os.environ.get("OCR_LOCAL_WORKERS", "2"))
+    ocr_local_min_chars: int = int(
+        os.environ.get("OCR_LOCAL_MIN_CHARS", "200")
+    )  # Characters on a page for full text density
+    ocr_local_min_quality: float = float(
+        os.environ.get("OCR_LOCAL_MIN_QUALITY", "0.8")
+    )
     # Mistral API
     mistral_api_key: str = os.getenv("MISTRAL_API_KEY", "")
     # OpenAI API
     openai_api_key: str = os.getenv("OPENAI_API_KEY", "")
+    # LLM Processing Configuration
+    llm_concurrent_mode: bool = (
+        os.environ.get("LLM_CONCURRENT_MODE", "True").lower() == "true"
+    )
+    llm_max_concurrency: int = int(
+        os.environ.get("LLM_MAX_CONCURRENCY", "4")
+    )  # Analysis chains plus metadata extraction of one document
+    llm_call_timeout: float = float(
+        os.environ.get("LLM_CALL_TIMEOUT", "120")
+    )  # Seconds per chain call, 0 disables the timeout
+    llm_max_input_tokens: int = int(
+        os.environ.get("LLM_MAX_INPUT_TOKENS", "12000")
+    )  # Document tokens packed into one call, below the model context limit
+    # Result Cache Configuration
+    cache_backend: Literal["memory", "disk", "s3", "none"] = os.environ.get(
+        "CACHE_BACKEND", "memory"
+    )
+    cache_ttl: int = int(
+        os.environ.get("CACHE_TTL", str(7 * 24 * 3600))
+    )  # Seconds, 0 keeps entries until evicted
+    cache_max_entries: int = int(os.environ.get("CACHE_MAX_ENTRIES", "1024"))
+    cache_dir: str = os.environ.get("CACHE_DIR", "/tmp/research-cache")
+    embedding_cache_entries: int = int(
+        os.environ.get("EMBEDDING_CACHE_ENTRIES", "10000")
+    )  # Chunk embeddings, about 8 KiB each at 1536 dimensions
+    ocr_page_cache_entries: int = int(
+        os.environ.get("OCR_PAGE_CACHE_ENTRIES", "512")
+    )  # OCR pages kept for retrying a failed range, dropped once done
+    # Document metadata cached by the API between requests
+    metadata_cache_ttl: int = int(
+        os.environ.get("METADATA_CACHE_TTL", "5")
+    )  # Seconds, how stale a document's status may be, 0 disables caching
+    metadata_cache_entries: int = int(
+        os.environ.get("METADATA_CACHE_ENTRIES", "1024")
+    )
+    # Answer Cache Configuration
+    answer_cache_documents: int = int(
+        os.environ.get("ANSWER_CACHE_DOCUMENTS", "256")
+    )
+    answer_cache_entries: int = int(
+        os.environ.get("ANSWER_CACHE_ENTRIES", "64")
+    )  # Answers kept per document
+    answer_cache_similarity: float = float(
+        os.environ.get("ANSWER_CACHE_SIMILARITY", "0.95")
+    )  # Cosine similarity for a question to reuse another's answer
 
     class Config:
         case_sensitive = False
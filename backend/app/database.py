@@ -1,48 +1,158 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+from contextlib import AsyncExitStack
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
 from uuid import UUID
 
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
 from .config import get_settings
+from .models import RECORD_TYPE, DocumentMetadata, ProcessingStatus
 
+try:
+    import aioboto3
+except ImportError:  # pragma: no cover - aioboto3 is a declared dependency
+    aioboto3 = None
+
+logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Secondary indexes backing document listing (see init-localstack.sh)
+STATUS_INDEX = "status-upload_date-index"
+UPLOAD_DATE_INDEX = "record_type-upload_date-index"
+# Secondary index finding documents by the SHA-256 of their PDF
+CONTENT_HASH_INDEX = "content_hash-index"
+# Bytes read from S3 per chunk when streaming an object
+STREAM_CHUNK_SIZE = 64 * 1024
+# Part size for multipart uploads, above the S3 minimum of 5 MiB
+MULTIPART_PART_SIZE = 8 * 1024 * 1024
+# Attributes returned by list_documents
+METADATA_FIELDS = tuple(DocumentMetadata.model_fields)
+
+
+class UploadTooLargeError(Exception):
+    """Raised when a streamed upload exceeds the configured maximum size"""
+
+
+def encode_cursor(last_key: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Encode a DynamoDB LastEvaluatedKey as an opaque page cursor"""
+    if not last_key:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(last_key).encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Decode a page cursor produced by encode_cursor"""
+    if not cursor:
+        return None
+    return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+
 
 class Storage:
-    def __init__(self):
+    """
+    DynamoDB and S3 storage using synchronous boto3 clients. Blocking calls
+    run in worker threads so they do not stall the event loop. Used as the
+    fallback when the aioboto3 implementation is disabled or unavailable.
+    """
+
+    def __init__(self, endpoint_url: Optional[str] = None):
         # Configure AWS clients with environment variables
+        self.endpoint_url = endpoint_url
         self._setup_clients()
 
-    def _setup_clients(self):
-        """Initialize AWS clients with appropriate endpoints"""
-        session_kwargs = {
+    def _client_kwargs(self, service: str) -> Dict[str, Any]:
+        """Keyword arguments shared by the sync and async AWS clients"""
+        kwargs = {
             "region_name": settings.aws_region,
             "aws_access_key_id": settings.aws_access_key_id,
             "aws_secret_access_key": settings.aws_secret_access_key,
+            "config": Config(
+                max_pool_connections=settings.storage_max_connections,
+                retries={
+                    "max_attempts": settings.storage_max_retries,
+                    "mode": "standard",
+                },
+            ),
         }
-        if settings.dev_mode:
-            self.dynamodb = boto3.resource(
-                "dynamodb",
-                endpoint_url=settings.dynamodb_endpoint,
-                **session_kwargs,
-            )
-            self.s3 = boto3.client(
-                "s3", endpoint_url=settings.s3_endpoint, **session_kwargs
+        endpoint_url = self.endpoint_url
+        if endpoint_url is None and settings.dev_mode:
+            endpoint_url = (
+                settings.dynamodb_endpoint
+                if service == "dynamodb"
+                else settings.s3_endpoint
             )
-        else:
-            self.dynamodb = boto3.resource("dynamodb", **session_kwargs)
-            self.s3 = boto3.client("s3", **session_kwargs)
+        if endpoint_url:
+            kwargs["endpoint_url"] = endpoint_url
+        return kwargs
+
+    def _setup_clients(self):
+        """Initialize AWS clients with appropriate endpoints"""
+        self.dynamodb = boto3.resource(
+            "dynamodb", **self._client_kwargs("dynamodb")
+        )
+        self.s3 = boto3.client("s3", **self._client_kwargs("s3"))
         self.table = self.dynamodb.Table(settings.dynamodb_table)
         self.bucket_name = settings.s3_bucket_name
 
+    async def _table_call(self, method: str, **kwargs) -> Dict[str, Any]:
+        """Call a DynamoDB table method"""
+        return await asyncio.to_thread(getattr(self.table, method), **kwargs)
+
+    async def _s3_call(self, method: str, **kwargs) -> Dict[str, Any]:
+        """Call an S3 client method"""
+        return await asyncio.to_thread(getattr(self.s3, method), **kwargs)
+
+    async def _read_object(self, key: str) -> bytes:
+        """Read the full body of an S3 object"""
+
+        def read() -> bytes:
+            response = self.s3.get_object(Bucket=self.bucket_name, Key=key)
+            return response["Body"].read()
+
+        return await asyncio.to_thread(read)
+
+    async def _iter_body(self, body: Any) -> AsyncIterator[bytes]:
+        """Yield an S3 response body in fixed-size chunks"""
+        try:
+            while True:
+                chunk = await asyncio.to_thread(body.read, STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
+
+    async def _list_keys(self, prefix: str) -> List[str]:
+        """List all S3 keys under a prefix"""
+
+        def list_keys() -> List[str]:
+            paginator = self.s3.get_paginator("list_objects_v2")
+            pages = paginator.paginate(Bucket=self.bucket_name, Prefix=prefix)
+            return [
+                obj["Key"]
+                for page in pages
+                for obj in page.get("Contents", [])
+            ]
+
+        return await asyncio.to_thread(list_keys)
+
+    async def close(self) -> None:
+        """Release client resources"""
+
     async def get_document_metadata(
         self, document_id: UUID
     ) -> Optional[Dict[str, Any]]:
         """Get document metadata from DynamoDB"""
         try:
-            response = self.table.get_item(Key={"id": str(document_id)})
+            response = await self._table_call(
+                "get_item", Key={"id": str(document_id)}
+            )
             return response.get("Item")
         except ClientError as e:
             print(f"Error getting document metadata: {e}")
@@ -58,20 +168,180 @@ class Storage:
             for key, value in metadata.items():
                 if isinstance(value, datetime):
                     metadata[key] = value.isoformat()
-            self.table.put_item(Item=metadata)
+            await self._table_call("put_item", Item=metadata)
             return True
         except ClientError as e:
             print(f"Error saving document metadata: {e}")
             return False
 
-    async def list_documents(self) -> List[Dict[str, Any]]:
-        """List all documents in DynamoDB"""
+    async def list_documents(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        status: Optional[str] = None,
+        tag: Optional[str] = None,
+        uploaded_after: Optional[str] = None,
+        uploaded_before: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        List documents newest first, one page at a time
+        Args:
+            limit: Maximum number of documents to return
+            cursor: next_cursor from the previous page
+            status: Only documents with this processing status
+            tag: Only documents with this tag
+            uploaded_after: Inclusive ISO 8601 lower bound on upload_date
+            uploaded_before: Inclusive ISO 8601 upper bound on upload_date
+        Returns:
+            Dictionary with the page "items", limited to DocumentMetadata
+            fields, and "next_cursor", None on the last page
+        """
+        names = {f"#{field}": field for field in METADATA_FIELDS}
+        if status:
+            # Status queries its own index, otherwise the all-documents one
+            index_name = STATUS_INDEX
+            key_condition = "#status = :partition"
+            values = {":partition": status}
+        else:
+            index_name = UPLOAD_DATE_INDEX
+            names["#record_type"] = "record_type"
+            key_condition = "#record_type = :partition"
+            values = {":partition": RECORD_TYPE}
+        if uploaded_after and uploaded_before:
+            key_condition += " AND #upload_date BETWEEN :after AND :before"
+        elif uploaded_after:
+            key_condition += " AND #upload_date >= :after"
+        elif uploaded_before:
+            key_condition += " AND #upload_date <= :before"
+        if uploaded_after:
+            values[":after"] = uploaded_after
+        if uploaded_before:
+            values[":before"] = uploaded_before
+        query = {
+            "IndexName": index_name,
+            "KeyConditionExpression": key_condition,
+            "ProjectionExpression": ", ".join(
+                f"#{field}" for field in METADATA_FIELDS
+            ),
+            "ExpressionAttributeNames": names,
+            "ExpressionAttributeValues": values,
+            "ScanIndexForward": False,
+        }
+        if tag:
+            # Tags are a list attribute, which DynamoDB cannot index
+            query["FilterExpression"] = "contains(#tags, :tag)"
+            values[":tag"] = tag
         try:
-            response = self.table.scan()
-            return response.get("Items", [])
+            items: List[Dict[str, Any]] = []
+            last_key = decode_cursor(cursor)
+            # Filtered pages can come back short, so keep reading
+            while True:
+                if last_key:
+                    query["ExclusiveStartKey"] = last_key
+                response = await self._table_call(
+                    "query", Limit=limit - len(items), **query
+                )
+                items.extend(response.get("Items", []))
+                last_key = response.get("LastEvaluatedKey")
+                if not last_key or len(items) >= limit:
+                    break
+            return {"items": items, "next_cursor": encode_cursor(last_key)}
         except ClientError as e:
             print(f"Error listing documents: {e}")
-            return []
+            return {"items": [], "next_cursor": None}
+
+    async def find_document_by_hash(self, content_hash: str) -> Optional[str]:
+        """
+        Find a document uploaded with the same PDF
+        Args:
+            content_hash: SHA-256 of the PDF bytes
+        Returns:
+            ID of a document with this PDF that has not failed, or None
+        """
+        try:
+            response = await self._table_call(
+                "query",
+                IndexName=CONTENT_HASH_INDEX,
+                KeyConditionExpression="#content_hash = :content_hash",
+                FilterExpression="#status <> :failed",
+                ExpressionAttributeNames={
+                    "#content_hash": "content_hash",
+                    "#status": "status",
+                },
+                ExpressionAttributeValues={
+                    ":content_hash": content_hash,
+                    ":failed": ProcessingStatus.FAILED.value,
+                },
+            )
+            items = response.get("Items", [])
+            return str(items[0]["id"]) if items else None
+        except ClientError as e:
+            print(f"Error finding document by hash: {e}")
+            return None
+
+    async def scan_documents(
+        self,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        missing_record_type: bool = False,
+        fields: Sequence[str] = METADATA_FIELDS,
+    ) -> Dict[str, Any]:
+        """
+        Read every document in table order, one page at a time. Unlike
+        list_documents this also finds documents saved before record_type
+        was set, which the upload date index does not contain.
+        Args:
+            limit: Maximum number of items to read per page
+            cursor: next_cursor from the previous page
+            missing_record_type: Only documents without record_type
+            fields: Attributes to read, the DocumentMetadata fields by
+                default
+        Returns:
+            Dictionary with the page "items", limited to fields, and
+            "next_cursor", None on the last page. Filtered pages can be
+            short or empty before the last page.
+        """
+        names = {f"#{field}": field for field in fields}
+        scan: Dict[str, Any] = {
+            "Limit": limit,
+            "ProjectionExpression": ", ".join(f"#{field}" for field in fields),
+            "ExpressionAttributeNames": names,
+        }
+        if missing_record_type:
+            names["#record_type"] = "record_type"
+            scan["FilterExpression"] = "attribute_not_exists(#record_type)"
+        last_key = decode_cursor(cursor)
+        if last_key:
+            scan["ExclusiveStartKey"] = last_key
+        try:
+            response = await self._table_call("scan", **scan)
+            return {
+                "items": response.get("Items", []),
+                "next_cursor": encode_cursor(response.get("LastEvaluatedKey")),
+            }
+        except ClientError as e:
+            print(f"Error scanning documents: {e}")
+            return {"items": [], "next_cursor": None}
+
+    async def set_record_type(self, document_id: UUID) -> bool:
+        """Add a document saved without record_type to the listing index"""
+        try:
+            await self._table_call(
+                "update_item",
+                Key={"id": str(document_id)},
+                UpdateExpression="SET #record_type = :record_type",
+                # Never recreate a document deleted in the meantime
+                ConditionExpression="attribute_exists(#id)",
+                ExpressionAttributeNames={
+                    "#id": "id",
+                    "#record_type": "record_type",
+                },
+                ExpressionAttributeValues={":record_type": RECORD_TYPE},
+            )
+            return True
+        except ClientError as e:
+            print(f"Error setting document record type: {e}")
+            return False
 
     async def upload_pdf(
         self, document_id: UUID, file_content: bytes
@@ -79,7 +349,8 @@ class Storage:
         """Upload PDF to S3 and return the key"""
         try:
             key = f"pdfs/{document_id}.pdf"
-            self.s3.put_object(
+            await self._s3_call(
+                "put_object",
                 Bucket=self.bucket_name,
                 Key=key,
                 Body=file_content,
@@ -90,13 +361,133 @@ class Storage:
             print(f"Error uploading PDF: {e}")
             return None
 
+    async def _upload_stream(
+        self,
+        key: str,
+        chunks: AsyncIterator[bytes],
+        content_type: str,
+        max_size: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Stream content to S3 with a multipart upload, hashing it on the fly
+        Args:
+            key: S3 key of the object
+            chunks: Content in chunks of any size
+            content_type: Content type of the object
+            max_size: Maximum number of bytes accepted, None for no limit
+        Returns:
+            Dictionary with the S3 "key", "size" and hex "sha256" of the
+            content
+        Raises:
+            UploadTooLargeError: The content is larger than max_size
+            Exception: Any error from S3 or from the chunks iterator. The
+                multipart upload is aborted before raising.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        upload = await self._s3_call(
+            "create_multipart_upload",
+            Bucket=self.bucket_name,
+            Key=key,
+            ContentType=content_type,
+        )
+        upload_id = upload["UploadId"]
+        parts: List[Dict[str, Any]] = []
+
+        async def upload_part(body: bytes) -> None:
+            part_number = len(parts) + 1
+            response = await self._s3_call(
+                "upload_part",
+                Bucket=self.bucket_name,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                Body=body,
+            )
+            parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+
+        try:
+            # Only one part is buffered at a time
+            buffer = bytearray()
+            async for chunk in chunks:
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise UploadTooLargeError(
+                        f"Upload exceeds {max_size} bytes"
+                    )
+                digest.update(chunk)
+                buffer.extend(chunk)
+                if len(buffer) >= MULTIPART_PART_SIZE:
+                    await upload_part(bytes(buffer))
+                    buffer.clear()
+            if buffer or not parts:
+                await upload_part(bytes(buffer))
+            await self._s3_call(
+                "complete_multipart_upload",
+                Bucket=self.bucket_name,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+        except BaseException:
+            try:
+                await self._s3_call(
+                    "abort_multipart_upload",
+                    Bucket=self.bucket_name,
+                    Key=key,
+                    UploadId=upload_id,
+                )
+            except ClientError as abort_error:
+                print(f"Error aborting upload: {abort_error}")
+            raise
+        return {"key": key, "size": size, "sha256": digest.hexdigest()}
+
+    async def upload_pdf_stream(
+        self,
+        document_id: UUID,
+        chunks: AsyncIterator[bytes],
+        max_size: int,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Stream a PDF to S3 with a multipart upload, hashing it on the fly
+        Args:
+            document_id: UUID of the document
+            chunks: PDF content in chunks of any size
+            max_size: Maximum number of bytes accepted
+        Returns:
+            Dictionary with the S3 "key", "size" and hex "sha256" of the
+            content, or None if the upload failed
+        Raises:
+            UploadTooLargeError: The content is larger than max_size. The
+                multipart upload is aborted before raising.
+        """
+        try:
+            return await self._upload_stream(
+                f"pdfs/{document_id}.pdf", chunks, "application/pdf", max_size
+            )
+        except ClientError as e:
+            print(f"Error uploading PDF: {e}")
+            return None
+
+    async def delete_object(self, key: str) -> bool:
+        """Delete a single S3 object"""
+        try:
+            await self._s3_call(
+                "delete_object", Bucket=self.bucket_name, Key=key
+            )
+            return True
+        except ClientError as e:
+            print(f"Error deleting object: {e}")
+            return False
+
     async def upload_text(
         self, document_id: UUID, text: str, text_type: str
     ) -> Optional[str]:
         """Upload text content to S3 and return the key"""
         try:
             key = f"{text_type}/{document_id}.txt"
-            self.s3.put_object(
+            await self._s3_call(
+                "put_object",
                 Bucket=self.bucket_name,
                 Key=key,
                 Body=text,
@@ -107,11 +498,68 @@ class Storage:
             print(f"Error uploading text: {e}")
             return None
 
+    async def upload_text_stream(
+        self,
+        document_id: UUID,
+        texts: AsyncIterator[str],
+        text_type: str,
+    ) -> Optional[str]:
+        """
+        Upload text content to S3 as it is produced and return the key
+        Errors raised by the texts iterator propagate after the upload is
+        aborted.
+        """
+
+        async def encoded() -> AsyncIterator[bytes]:
+            async for text in texts:
+                yield text.encode("utf-8")
+
+        try:
+            upload = await self._upload_stream(
+                f"{text_type}/{document_id}.txt", encoded(), "text/plain"
+            )
+            return upload["key"]
+        except ClientError as e:
+            print(f"Error uploading text: {e}")
+            return None
+
+    async def upload_document_index(
+        self, document_id: UUID, body: bytes, index_type: str
+    ) -> Optional[str]:
+        """Upload a serialized per-document index and return the key"""
+        try:
+            key = f"{index_type}/{document_id}.npz"
+            await self._s3_call(
+                "put_object",
+                Bucket=self.bucket_name,
+                Key=key,
+                Body=body,
+                ContentType="application/octet-stream",
+            )
+            return key
+        except ClientError as e:
+            print(f"Error uploading {index_type}: {e}")
+            return None
+
+    async def get_document_index(
+        self, document_id: UUID, index_type: str
+    ) -> Optional[bytes]:
+        """Get a serialized per-document index, None if missing"""
+        try:
+            return await self._read_object(f"{index_type}/{document_id}.npz")
+        except ClientError:
+            return None
+
+    async def delete_document_index(
+        self, document_id: UUID, index_type: str
+    ) -> bool:
+        """Delete a per-document index"""
+        return await self.delete_object(f"{index_type}/{document_id}.npz")
+
     async def get_pdf(self, key: str) -> Optional[bytes]:
         """Get PDF content from S3"""
         try:
-            response = self.s3.get_object(Bucket=self.bucket_name, Key=key)
-            return response["Body"].read()
+            return await self._read_object(key)
         except ClientError as e:
             print(f"Error getting PDF: {e}")
             return None
@@ -119,12 +567,114 @@ class Storage:
     async def get_text(self, key: str) -> Optional[str]:
         """Get text content from S3"""
         try:
-            response = self.s3.get_object(Bucket=self.bucket_name, Key=key)
-            return response["Body"].read().decode("utf-8")
+            return (await self._read_object(key)).decode("utf-8")
         except ClientError as e:
             print(f"Error getting text: {e}")
             return None
 
+    async def stream_object(
+        self,
+        key: str,
+        byte_range: Optional[str] = None,
+        if_none_match: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Open an S3 object for streaming without loading it into memory
+        Args:
+            key: S3 key of the object
+            byte_range: HTTP Range header value, passed through to S3
+            if_none_match: HTTP If-None-Match header value
+        Returns:
+            Dictionary with the HTTP "status_code", response "headers" and
+            a chunked "body" iterator (None for 304 and 416), or None if
+            the object could not be read
+        """
+        kwargs = {"Bucket": self.bucket_name, "Key": key}
+        if byte_range:
+            kwargs["Range"] = byte_range
+        if if_none_match:
+            kwargs["IfNoneMatch"] = if_none_match
+        try:
+            response = await self._s3_call("get_object", **kwargs)
+        except ClientError as e:
+            status_code = e.response["ResponseMetadata"]["HTTPStatusCode"]
+            if status_code == 304:
+                return {
+                    "status_code": 304,
+                    "headers": {"ETag": if_none_match},
+                    "body": None,
+                }
+            if status_code == 416:
+                return {"status_code": 416, "headers": {}, "body": None}
+            print(f"Error streaming object: {e}")
+            return None
+        headers = {
+            "Accept-Ranges": "bytes",
+            "Content-Length": str(response["ContentLength"]),
+            "ETag": response["ETag"],
+        }
+        if response.get("ContentRange"):
+            headers["Content-Range"] = response["ContentRange"]
+        return {
+            "status_code": 206 if response.get("ContentRange") else 200,
+            "headers": headers,
+            "body": self._iter_body(response["Body"]),
+        }
+
+    async def get_texts(
+        self, keys: Dict[str, Optional[str]]
+    ) -> Dict[str, Optional[str]]:
+        """
+        Get several text objects from S3 concurrently
+        Args:
+            keys: Mapping of result names to S3 keys, None to skip a name
+        Returns:
+            Mapping of the same names to text, None if missing or failed
+        """
+        present = [name for name, key in keys.items() if key]
+        texts = await asyncio.gather(
+            *(self.get_text(keys[name]) for name in present)
+        )
+        results: Dict[str, Optional[str]] = dict.fromkeys(keys)
+        results.update(zip(present, texts))
+        return results
+
+    async def put_cache_entry(self, key: str, body: str) -> bool:
+        """Store a serialized cache entry in S3 under the cache/ prefix"""
+        try:
+            await self._s3_call(
+                "put_object",
+                Bucket=self.bucket_name,
+                Key=f"cache/{key}.json",
+                Body=body,
+                ContentType="application/json",
+            )
+            return True
+        except ClientError as e:
+            print(f"Error saving cache entry: {e}")
+            return False
+
+    async def get_cache_entry(self, key: str) -> Optional[str]:
+        """Get a serialized cache entry from S3, None if it does not exist"""
+        try:
+            body = await self._read_object(f"cache/{key}.json")
+            return body.decode("utf-8")
+        except ClientError:
+            return None
+
+    async def delete_cache_entry(self, key: str) -> bool:
+        """Delete a cache entry from S3"""
+        try:
+            await self._s3_call(
+                "delete_object",
+                Bucket=self.bucket_name,
+                Key=f"cache/{key}.json",
+            )
+            return True
+        except ClientError as e:
+            print(f"Error deleting cache entry: {e}")
+            return False
+
     async def delete_document(self, document_id: UUID) -> bool:
         """Delete document and all associated files"""
         try:
@@ -133,19 +683,17 @@ class Storage:
             if not metadata:
                 return False
             # Delete from DynamoDB
-            self.table.delete_item(Key={"id": str(document_id)})
+            await self._table_call("delete_item", Key={"id": str(document_id)})
             # Delete all S3 objects with prefix
             prefix = f"{document_id}"
-            paginator = self.s3.get_paginator("list_objects_v2")
-            pages = paginator.paginate(Bucket=self.bucket_name, Prefix=prefix)
-            object_list = []
-            for page in pages:
-                if "Contents" in page:
-                    for obj in page["Contents"]:
-                        object_list.append({"Key": obj["Key"]})
+            object_list = [
+                {"Key": key} for key in await self._list_keys(prefix)
+            ]
             if object_list:
-                self.s3.delete_objects(
-                    Bucket=self.bucket_name, Delete={"Objects": object_list}
+                await self._s3_call(
+                    "delete_objects",
+                    Bucket=self.bucket_name,
+                    Delete={"Objects": object_list},
                 )
             return True
         except ClientError as e:
@@ -153,5 +701,91 @@ class Storage:
             return False
 
 
+class AsyncStorage(Storage):
+    """
+    Storage using aioboto3 clients shared across requests, so concurrent
+    calls are multiplexed over one connection pool per service. The sync
+    boto3 clients are kept for local-only operations such as presigning.
+    """
+
+    def __init__(self, endpoint_url: Optional[str] = None):
+        super().__init__(endpoint_url)
+        self.session = aioboto3.Session()
+        self._exit_stack: Optional[AsyncExitStack] = None
+        self._async_s3 = None
+        self._async_table = None
+        self._clients_lock = asyncio.Lock()
+
+    async def _open_clients(self) -> None:
+        """Open the shared async clients on first use"""
+        async with self._clients_lock:
+            if self._exit_stack is not None:
+                return
+            exit_stack = AsyncExitStack()
+            self._async_s3 = await exit_stack.enter_async_context(
+                self.session.client("s3", **self._client_kwargs("s3"))
+            )
+            dynamodb = await exit_stack.enter_async_context(
+                self.session.resource(
+                    "dynamodb", **self._client_kwargs("dynamodb")
+                )
+            )
+            self._async_table = await dynamodb.Table(settings.dynamodb_table)
+            self._exit_stack = exit_stack
+
+    async def _table_call(self, method: str, **kwargs) -> Dict[str, Any]:
+        if self._exit_stack is None:
+            await self._open_clients()
+        return await getattr(self._async_table, method)(**kwargs)
+
+    async def _s3_call(self, method: str, **kwargs) -> Dict[str, Any]:
+        if self._exit_stack is None:
+            await self._open_clients()
+        return await getattr(self._async_s3, method)(**kwargs)
+
+    async def _read_object(self, key: str) -> bytes:
+        response = await self._s3_call(
+            "get_object", Bucket=self.bucket_name, Key=key
+        )
+        async with response["Body"] as body:
+            return await body.read()
+
+    async def _iter_body(self, body: Any) -> AsyncIterator[bytes]:
+        # Entering the body yields the raw HTTP response, whose read()
+        # takes no size, so chunks are read through the body itself
+        async with body:
+            while True:
+                chunk = await body.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+    async def _list_keys(self, prefix: str) -> List[str]:
+        if self._exit_stack is None:
+            await self._open_clients()
+        paginator = self._async_s3.get_paginator("list_objects_v2")
+        keys = []
+        async for page in paginator.paginate(
+            Bucket=self.bucket_name, Prefix=prefix
+        ):
+            keys.extend(obj["Key"] for obj in page.get("Contents", []))
+        return keys
+
+    async def close(self) -> None:
+        """Close the shared async clients"""
+        if self._exit_stack is not None:
+            await self._exit_stack.aclose()
+            self._exit_stack = None
+
+
+def create_storage(endpoint_url: Optional[str] = None) -> Storage:
+    """Create the async storage, falling back to sync boto3 clients"""
+    if settings.storage_async_mode and aioboto3 is not None:
+        return AsyncStorage(endpoint_url)
+    if settings.storage_async_mode:
+        logger.warning("aioboto3 not installed, using sync storage clients")
+    return Storage(endpoint_url)
+
+
 # Initialize storage singleton
-storage = Storage()
+storage = create_storage()
@@ -4,7 +4,11 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from mangum import Mangum
 
+from .config import get_settings
+from .database import storage
 from .routers import documents, health
+from .services.ocr_service import ocr_service
+from .worker import create_worker
 
 # Configure logging
 logging.basicConfig(
@@ -12,6 +16,7 @@ logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
 )
 logger = logging.getLogger(__name__)
+settings = get_settings()
 # Initialize FastAPI app
 app = FastAPI(
     title="Research Summarizer API",
@@ -31,5 +36,28 @@ app.include_router(health.router, prefix="/api", tags=["health"])
 app.include_router(
     documents.router, prefix="/api/documents", tags=["documents"]
 )
+# In-process worker for the memory queue backend
+worker = create_worker() if settings.queue_backend == "memory" else None
+
+
+@app.on_event("startup")
+async def start_worker():
+    """Start processing queued documents inside the API process"""
+    if worker:
+        worker.start()
+
+
+@app.on_event("shutdown")
+async def close_storage():
+    """
+    Stop the in-process worker, close pooled storage connections and the
+    OCR process pool
+    """
+    if worker:
+        await worker.shutdown()
+    await storage.close()
+    await ocr_service.close()
+
+
 # AWS Lambda handler
 handler = Mangum(app)
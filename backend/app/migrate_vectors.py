@@ -0,0 +1,60 @@
+import asyncio
+import logging
+
+from .database import storage
+from .services.vector_service import vector_service
+from .services.vector_store import PineconeVectorStore
+
+logger = logging.getLogger(__name__)
+
+
+async def migrate_to_namespaces() -> int:
+    """
+    Move the vectors of every document from the shared default namespace
+    into per-document namespaces, adding the document centroids. Safe to
+    rerun: migrated documents have no vectors left to move.
+    Returns:
+        Number of vectors moved
+    """
+    store = vector_service.store
+    if not isinstance(store, PineconeVectorStore):
+        logger.info("Vector store is already partitioned by document")
+        return 0
+    moved = 0
+    cursor = None
+    while True:
+        # A scan, not list_documents, so legacy items without record_type
+        # are migrated too
+        page = await storage.scan_documents(
+            limit=100, cursor=cursor, fields=("id", "chunks_indexed")
+        )
+        for item in page["items"]:
+            document_id = str(item["id"])
+            embeddings = await store.migrate_document(
+                document_id, int(item.get("chunks_indexed", 0))
+            )
+            if embeddings:
+                # Legacy documents also need a centroid for corpus search
+                await vector_service.upsert_centroid(document_id, embeddings)
+                logger.info(
+                    f"Moved {len(embeddings)} vectors of document "
+                    f"{document_id}"
+                )
+            moved += len(embeddings)
+        cursor = page["next_cursor"]
+        if not cursor:
+            return moved
+
+
+async def main() -> None:
+    moved = await migrate_to_namespaces()
+    logger.info(f"Migration finished, {moved} vectors moved")
+    await storage.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    asyncio.run(main())
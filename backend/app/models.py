@@ -1,18 +1,30 @@
 from datetime import datetime
 from enum import Enum
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional
 from uuid import UUID, uuid4
 
 from pydantic import BaseModel, Field
 
+# Constant partition key for the index listing all documents by upload date
+RECORD_TYPE = "DOCUMENT"
+
 
 class ProcessingStatus(str, Enum):
     PENDING = "PENDING"
     PROCESSING = "PROCESSING"
+    INDEXED = "INDEXED"  # Searchable, analysis still running
     COMPLETED = "COMPLETED"
     FAILED = "FAILED"
 
 
+class ProcessingStage(str, Enum):
+    FETCH = "fetch"
+    OCR = "ocr"
+    PERSIST_TEXT = "persist_text"
+    LLM = "llm"
+    INDEX = "index"
+
+
 class DocumentType(str, Enum):
     RESEARCH_PAPER = "RESEARCH_PAPER"
     ARTICLE = "ARTICLE"
@@ -30,7 +42,11 @@ class Document(BaseModel):
     status: ProcessingStatus = ProcessingStatus.PENDING
     pdf_key: str  # S3 key for PDF file
     raw_text_key: Optional[str] = None  # S3 key for extracted text
+    content_hash: Optional[str] = None  # SHA-256 of the PDF bytes
     tags: List[str] = []
+    # Where the title came from: "user", "filename" or "extracted"
+    title_source: str = "user"
+    record_type: str = RECORD_TYPE
 
     class Config:
         use_enum_values = True
@@ -48,11 +64,22 @@ class DocumentMetadata(BaseModel):
     summary: Optional[str] = None
     page_count: Optional[int] = None
     file_size: Optional[int] = None  # in bytes
+    # Pages extracted from the text layer (local) and by OCR (remote)
+    ocr_pages: Optional[Dict[str, int]] = None
+    stages: Dict[str, Dict[str, Any]] = {}  # Checkpoint per ProcessingStage
+
+
+class DocumentPage(BaseModel):
+    items: List[DocumentMetadata]
+    next_cursor: Optional[str] = None
+
+
+CONTENT_FIELDS = ("raw_text", "summary", "insights", "opportunities")
 
 
 class DocumentContent(BaseModel):
     id: UUID
-    raw_text: str
+    raw_text: Optional[str] = None
     summary: Optional[str] = None
     insights: Optional[str] = None
     opportunities: Optional[str] = None
@@ -70,6 +97,19 @@ class DocumentSummary(BaseModel):
 
 class DocumentQuestion(BaseModel):
     question: str
+    # Chunk retrieval, the configured default when not set
+    retrieval: Optional[Literal["hybrid", "vector", "lexical"]] = None
+
+
+class BatchQuestion(BaseModel):
+    document_id: UUID
+    question: str
+
+
+class DocumentQuestionBatch(BaseModel):
+    questions: List[BatchQuestion] = Field(..., min_length=1, max_length=1000)
+    # Chunk retrieval of every question, the configured default when not set
+    retrieval: Optional[Literal["hybrid", "vector", "lexical"]] = None
 
 
 class DocumentAnswer(BaseModel):
@@ -78,6 +118,32 @@ class DocumentAnswer(BaseModel):
     sources: List[Dict[str, str]] = []
 
 
+class DocumentSearch(BaseModel):
+    query: str
+    top_k: int = Field(10, ge=1, le=50)  # Snippets returned
+    top_documents: int = Field(5, ge=1, le=20)  # Documents searched
+    tags: List[str] = []  # Documents must have all of these tags
+    uploaded_after: Optional[datetime] = None
+    uploaded_before: Optional[datetime] = None
+
+
+class SearchSnippet(BaseModel):
+    chunk_id: int
+    text: str
+    score: float
+
+
+class SearchResult(BaseModel):
+    document_id: UUID
+    title: str
+    score: float  # Best snippet score
+    snippets: List[SearchSnippet]
+
+
+class SearchResults(BaseModel):
+    results: List[SearchResult]
+
+
 class DocumentUpload(BaseModel):
     title: Optional[str] = None
     document_type: DocumentType = DocumentType.RESEARCH_PAPER
@@ -0,0 +1,392 @@
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List
+
+from .config import get_settings
+from .database import storage
+from .models import ProcessingStage, ProcessingStatus
+from .services.answer_cache import answer_cache
+from .services.llm_service import llm_service
+from .services.ocr_service import ocr_service
+from .services.queue_service import processing_metrics
+from .services.vector_service import vector_service
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Pipeline stages in execution order
+STAGES: List[ProcessingStage] = list(ProcessingStage)
+# Stages that only need the persisted text, run as concurrent branches
+PARALLEL_STAGES = [ProcessingStage.LLM, ProcessingStage.INDEX]
+SEQUENTIAL_STAGES = [s for s in STAGES if s not in PARALLEL_STAGES]
+
+
+def stage_completed(metadata: Dict[str, Any], stage: ProcessingStage) -> bool:
+    """Whether the metadata records a completed run of a stage"""
+    record = metadata.get("stages", {}).get(stage.value, {})
+    return record.get("status") == ProcessingStatus.COMPLETED
+
+
+def dependent_stages(stage: ProcessingStage) -> List[ProcessingStage]:
+    """A stage and every stage that consumes its output"""
+    if stage in PARALLEL_STAGES:
+        return [stage]
+    return SEQUENTIAL_STAGES[SEQUENTIAL_STAGES.index(stage) :] + list(
+        PARALLEL_STAGES
+    )
+
+
+def pending_stages(metadata: Dict[str, Any]) -> List[ProcessingStage]:
+    """Stages a retry has to run, empty if processing is complete"""
+    for stage in SEQUENTIAL_STAGES:
+        if not stage_completed(metadata, stage):
+            return dependent_stages(stage)
+    return [s for s in PARALLEL_STAGES if not stage_completed(metadata, s)]
+
+
+def reset_stages(
+    metadata: Dict[str, Any], from_stage: ProcessingStage
+) -> None:
+    """Drop the checkpoints of from_stage and every dependent stage"""
+    stages = metadata.setdefault("stages", {})
+    for stage in dependent_stages(from_stage):
+        stages.pop(stage.value, None)
+
+
+def processing_is_stale(metadata: Dict[str, Any]) -> bool:
+    """
+    Whether a document marked as processing has made no progress for
+    processing_stale_after seconds, so its job most likely crashed
+    """
+    updated_at = metadata.get("updated_at")
+    if not updated_at:
+        # Saved before progress was recorded
+        return True
+    idle = datetime.utcnow() - datetime.fromisoformat(updated_at)
+    return idle.total_seconds() > settings.processing_stale_after
+
+
+async def save_progress(metadata: Dict[str, Any]) -> None:
+    """Save the metadata of a document being processed"""
+    metadata["updated_at"] = datetime.utcnow().isoformat()
+    await storage.save_document_metadata(metadata)
+
+
+def index_version(metadata: Dict[str, Any]) -> str:
+    """Changes whenever the document is indexed again"""
+    record = metadata.get("stages", {}).get(ProcessingStage.INDEX.value, {})
+    return record.get("completed_at", "")
+
+
+def can_answer_questions(metadata: Dict[str, Any]) -> bool:
+    """Whether the document is indexed, so questions can be answered"""
+    return metadata.get("status") in (
+        ProcessingStatus.INDEXED,
+        ProcessingStatus.COMPLETED,
+    ) or stage_completed(metadata, ProcessingStage.INDEX)
+
+
+def apply_paper_metadata(
+    metadata: Dict[str, Any], paper_metadata: Dict[str, Any]
+) -> None:
+    """Fill document fields from the metadata extracted from its text"""
+    # Titles given at upload, or stored before titles had a source, are kept
+    if paper_metadata["title"] and metadata.get("title_source") in (
+        "filename",
+        "extracted",
+    ):
+        metadata["title"] = paper_metadata["title"]
+        metadata["title_source"] = "extracted"
+    if paper_metadata["authors"]:
+        metadata["authors"] = paper_metadata["authors"]
+    if paper_metadata["publication_date"]:
+        metadata["publication_date"] = paper_metadata["publication_date"]
+    tags = metadata.setdefault("tags", [])
+    known = {tag.lower() for tag in tags}
+    for keyword in paper_metadata["keywords"]:
+        if keyword.lower() not in known:
+            known.add(keyword.lower())
+            tags.append(keyword.lower())
+
+
+async def _pdf_content(
+    metadata: Dict[str, Any], state: Dict[str, Any]
+) -> bytes:
+    if "pdf_content" not in state:
+        pdf_content = await storage.get_pdf(metadata["pdf_key"])
+        if not pdf_content:
+            raise RuntimeError("PDF could not be read from storage")
+        state["pdf_content"] = pdf_content
+    return state["pdf_content"]
+
+
+async def _extracted_text(
+    metadata: Dict[str, Any], state: Dict[str, Any]
+) -> str:
+    if "text" not in state:
+        if metadata.get("raw_text_key"):
+            text = await storage.get_text(metadata["raw_text_key"])
+        else:
+            # OCR results are cached by content, so this is normally cheap
+            text = await ocr_service.process_pdf(
+                await _pdf_content(metadata, state)
+            )
+        if not text:
+            raise RuntimeError("No text could be extracted from the PDF")
+        state["text"] = text
+    return state["text"]
+
+
+def _chunks(state: Dict[str, Any]) -> List[str]:
+    if "chunks" not in state:
+        state["chunks"] = vector_service.text_splitter.split_text(
+            state["text"]
+        )
+    return state["chunks"]
+
+
+async def fetch_stage(metadata: Dict[str, Any], state: Dict[str, Any]):
+    """Read the uploaded PDF"""
+    await _pdf_content(metadata, state)
+    return metadata["pdf_key"]
+
+
+async def ocr_stage(metadata: Dict[str, Any], state: Dict[str, Any]):
+    """
+    Extract text from the PDF, checkpointed in the OCR result cache
+    Pages stream into the S3 text upload as they are extracted, so the
+    upload does not wait for the whole document.
+    """
+    metadata.pop("raw_text_key", None)
+    pdf_content = await _pdf_content(metadata, state)
+    page_stats: Dict[str, int] = {}
+    pages: List[str] = []
+
+    async def page_texts():
+        async for text in ocr_service.iter_pages(pdf_content, page_stats):
+            pages.append(text)
+            yield text
+
+    raw_text_key = await storage.upload_text_stream(
+        metadata["id"], page_texts(), "raw_text"
+    )
+    if not pages:
+        raise RuntimeError("No text could be extracted from the PDF")
+    if not raw_text_key:
+        raise RuntimeError("Extracted text could not be saved")
+    # Split once on the whole text, as split_text is not incremental; the
+    # pages are released first so they are not held alongside the chunks
+    state["text"] = "".join(pages)
+    pages.clear()
+    _chunks(state)
+    metadata["raw_text_key"] = raw_text_key
+    # Counters are only reported when the text was not cached
+    if page_stats:
+        metadata["ocr_pages"] = page_stats
+        metadata["page_count"] = sum(page_stats.values())
+    return raw_text_key
+
+
+async def persist_text_stage(metadata: Dict[str, Any], state: Dict[str, Any]):
+    """Upload the extracted text to S3, unless OCR streamed it there"""
+    if metadata.get("raw_text_key"):
+        return metadata["raw_text_key"]
+    text = await _extracted_text(metadata, state)
+    raw_text_key = await storage.upload_text(metadata["id"], text, "raw_text")
+    if not raw_text_key:
+        raise RuntimeError("Extracted text could not be saved")
+    metadata["raw_text_key"] = raw_text_key
+    return raw_text_key
+
+
+async def llm_stage(metadata: Dict[str, Any], state: Dict[str, Any]):
+    """Generate and upload summary, insights and opportunities"""
+    text = await _extracted_text(metadata, state)
+    start = time.perf_counter()
+
+    async def timed(coroutine):
+        result = await coroutine
+        return result, time.perf_counter() - start
+
+    # Metadata extraction runs alongside the analysis, started first so it
+    # gets an LLM slot before the map calls of a long paper
+    (paper_metadata, metadata_seconds), (
+        llm_results,
+        llm_seconds,
+    ) = await asyncio.gather(
+        timed(llm_service.extract_metadata(text)),
+        # Map-reduce long papers over the same chunks used for indexing
+        timed(llm_service.process_document(text, _chunks(state))),
+    )
+    apply_paper_metadata(metadata, paper_metadata)
+    metadata["llm_metrics"] = {
+        **llm_results["metrics"],
+        "metadata_ms": int(metadata_seconds * 1000),
+        # Latency metadata extraction added to the stage
+        "metadata_added_ms": int(
+            max(0.0, metadata_seconds - llm_seconds) * 1000
+        ),
+    }
+    artifacts = {}
+    # Upload processed results to S3 (failed generations are skipped)
+    for result_type, prefix in (
+        ("summary", "summaries"),
+        ("insights", "insights"),
+        ("opportunities", "opportunities"),
+    ):
+        metadata.pop(f"{result_type}_key", None)
+        if llm_results[result_type] is not None:
+            key = await storage.upload_text(
+                metadata["id"], llm_results[result_type], prefix
+            )
+            metadata[f"{result_type}_key"] = key
+            artifacts[result_type] = key
+    metadata.pop("llm_errors", None)
+    if llm_results["errors"]:
+        metadata["llm_errors"] = llm_results["errors"]
+    summary = llm_results["summary"]
+    if summary is not None:
+        metadata["summary"] = (
+            summary[:500] + "..." if len(summary) > 500 else summary
+        )
+    return artifacts
+
+
+async def index_stage(metadata: Dict[str, Any], state: Dict[str, Any]):
+    """Embed and index the text chunks for vector search"""
+    text = await _extracted_text(metadata, state)
+    chunks_indexed = await vector_service.index_document(
+        uuid.UUID(metadata["id"]), text, _chunks(state)
+    )
+    metadata["chunks_indexed"] = chunks_indexed
+    # Answers from the previous index may no longer hold
+    answer_cache.invalidate(metadata["id"])
+    return chunks_indexed
+
+
+STAGE_HANDLERS = {
+    ProcessingStage.FETCH: fetch_stage,
+    ProcessingStage.OCR: ocr_stage,
+    ProcessingStage.PERSIST_TEXT: persist_text_stage,
+    ProcessingStage.LLM: llm_stage,
+    ProcessingStage.INDEX: index_stage,
+}
+
+
+async def process_document_task(document_id: uuid.UUID):
+    """
+    Process a document, run by the queue worker
+    Text extraction runs first, then LLM analysis and indexing run as
+    concurrent branches; the document becomes INDEXED, and answerable, as
+    soon as indexing finishes. Each stage is checkpointed in the document
+    metadata, so a retry only runs the stages that have not completed.
+    Raises on failure after marking the document FAILED, so the worker can
+    retry it.
+    """
+    failed_stages: List[str] = []
+    try:
+        # Update status to PROCESSING
+        metadata = await storage.get_document_metadata(document_id)
+        if not metadata:
+            print(f"Document {document_id} not found")
+            return
+        stages = metadata.setdefault("stages", {})
+        pending = pending_stages(metadata)
+        if not pending:
+            # Every stage completed already, e.g. a redelivered job
+            metadata["status"] = ProcessingStatus.COMPLETED
+            await save_progress(metadata)
+            return
+        # Checkpoints of stages that will rerun are stale
+        for stage in pending:
+            stages.pop(stage.value, None)
+        skipped = [s for s in STAGES if s not in pending]
+        if skipped:
+            saved_ms = sum(stages[s.value]["duration_ms"] for s in skipped)
+            metadata["resume_savings"] = {
+                "skipped_stages": [s.value for s in skipped],
+                "saved_ms": saved_ms,
+            }
+            logger.info(
+                f"Resuming document {document_id} at "
+                f"{', '.join(s.value for s in pending)}, "
+                f"skipping {len(skipped)} stages (~{saved_ms}ms)"
+            )
+        metadata["status"] = ProcessingStatus.PROCESSING
+        metadata.pop("error", None)
+        metadata.pop("failed_stage", None)
+        await save_progress(metadata)
+        state: Dict[str, Any] = {}
+        pipeline_start = time.perf_counter()
+        # Branches share the metadata, so saves are serialized to keep the
+        # newest snapshot last
+        save_lock = asyncio.Lock()
+
+        async def run_stage(stage: ProcessingStage) -> None:
+            start = time.perf_counter()
+            try:
+                async with processing_metrics.time_stage(stage.value):
+                    artifact = await STAGE_HANDLERS[stage](metadata, state)
+            except Exception:
+                failed_stages.append(stage.value)
+                raise
+            stages[stage.value] = {
+                "status": ProcessingStatus.COMPLETED,
+                "artifact": artifact,
+                "duration_ms": int((time.perf_counter() - start) * 1000),
+                "completed_at": datetime.utcnow().isoformat(),
+            }
+            if stage == ProcessingStage.INDEX and not stage_completed(
+                metadata, ProcessingStage.LLM
+            ):
+                # Questions can be answered before the analysis is ready
+                metadata["status"] = ProcessingStatus.INDEXED
+                metadata["time_to_indexed_ms"] = int(
+                    (time.perf_counter() - pipeline_start) * 1000
+                )
+            # Checkpoint the stage before moving on
+            async with save_lock:
+                await save_progress(metadata)
+
+        for stage in pending:
+            if stage in SEQUENTIAL_STAGES:
+                await run_stage(stage)
+        # Load the text once for both branches
+        await _extracted_text(metadata, state)
+        outcomes = await asyncio.gather(
+            *(run_stage(s) for s in pending if s in PARALLEL_STAGES),
+            return_exceptions=True,
+        )
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                raise outcome
+        wall_ms = int((time.perf_counter() - pipeline_start) * 1000)
+        processing_metrics.record("pipeline", wall_ms / 1000)
+        # Wall time against the time the same stages take back to back
+        metadata["timings"] = {
+            "wall_ms": wall_ms,
+            "stage_sum_ms": sum(
+                stages[s.value]["duration_ms"] for s in pending
+            ),
+        }
+        # Update status to COMPLETED
+        metadata["status"] = ProcessingStatus.COMPLETED
+        metadata["processed_at"] = datetime.utcnow().isoformat()
+        await save_progress(metadata)
+    except Exception as e:
+        print(f"Error processing document {document_id}: {e}")
+        # Update status to FAILED, keeping completed stage checkpoints
+        try:
+            metadata = await storage.get_document_metadata(document_id)
+            if metadata:
+                metadata["status"] = ProcessingStatus.FAILED
+                metadata["error"] = str(e)
+                if failed_stages:
+                    metadata["failed_stage"] = ", ".join(failed_stages)
+                await save_progress(metadata)
+        except Exception as inner_e:
+            print(f"Error updating failure status: {inner_e}")
+        raise
@@ -1,110 +1,109 @@
+import asyncio
+import json
+import time
 import uuid
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 from fastapi import (
     APIRouter,
-    BackgroundTasks,
     File,
     Form,
+    Header,
     HTTPException,
+    Query,
     UploadFile,
     status,
 )
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
-from ..database import storage
+from ..config import get_settings
+from ..database import STREAM_CHUNK_SIZE, UploadTooLargeError, storage
 from ..models import (
+    CONTENT_FIELDS,
+    BatchQuestion,
     Document,
     DocumentAnswer,
     DocumentContent,
     DocumentMetadata,
+    DocumentPage,
     DocumentQuestion,
+    DocumentQuestionBatch,
+    DocumentSearch,
     DocumentType,
+    ProcessingStage,
     ProcessingStatus,
+    SearchResult,
+    SearchResults,
+    SearchSnippet,
 )
+from ..pipeline import (
+    STAGES,
+    can_answer_questions,
+    index_version,
+    pending_stages,
+    processing_is_stale,
+    reset_stages,
+)
+from ..services.answer_cache import answer_cache
+from ..services.cache_service import MemoryCache
 from ..services.llm_service import llm_service
-from ..services.ocr_service import ocr_service
+from ..services.queue_service import ProcessingMetrics, processing_queue
 from ..services.vector_service import vector_service
 
+settings = get_settings()
+
+# Characters of a chunk returned as a search snippet
+SNIPPET_CHARS = 300
+
+NO_ANSWER = "I don't have enough information to answer this question."
+
+# Chunks sent as context before it was packed within a token budget
+UNPACKED_CONTEXT_CHUNKS = 5
+
+# Question answering latency, streamed and not
+ask_metrics = ProcessingMetrics()
+
+# Prompt context tokens of answered questions, with the tokens the top
+# UNPACKED_CONTEXT_CHUNKS chunks would have taken
+context_stats = {"questions": 0, "tokens": 0, "unpacked_tokens": 0}
+
+# Document metadata shared by the read endpoints for a few seconds
+metadata_cache = MemoryCache(
+    settings.metadata_cache_entries, settings.metadata_cache_ttl
+)
+
 router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
 
-async def process_document_task(document_id: uuid.UUID):
-    """Background task to process a document"""
-    try:
-        # Update status to PROCESSING
+async def cached_document_metadata(
+    document_id: uuid.UUID,
+) -> Optional[Dict[str, Any]]:
+    """
+    Document metadata, reused across read endpoints for up to
+    METADATA_CACHE_TTL seconds. Endpoints that change a document read it
+    from storage and invalidate the cached copy.
+    """
+    if not settings.metadata_cache_ttl:
+        return await storage.get_document_metadata(document_id)
+    metadata = await metadata_cache.get(str(document_id))
+    if metadata is None:
         metadata = await storage.get_document_metadata(document_id)
-        if not metadata:
-            print(f"Document {document_id} not found")
-            return
-        metadata["status"] = ProcessingStatus.PROCESSING
-        await storage.save_document_metadata(metadata)
-        # Get PDF content
-        pdf_content = await storage.get_pdf(metadata["pdf_key"])
-        if not pdf_content:
-            metadata["status"] = ProcessingStatus.FAILED
-            await storage.save_document_metadata(metadata)
-            return
-        # Extract text with OCR
-        extracted_text = await ocr_service.process_pdf(pdf_content)
-        if not extracted_text:
-            metadata["status"] = ProcessingStatus.FAILED
-            await storage.save_document_metadata(metadata)
-            return
-        # Upload extracted text to S3
-        raw_text_key = await storage.upload_text(
-            document_id, extracted_text, "raw_text"
-        )
-        if not raw_text_key:
-            metadata["status"] = ProcessingStatus.FAILED
-            await storage.save_document_metadata(metadata)
-            return
-        # Update metadata with raw text key
-        metadata["raw_text_key"] = raw_text_key
-        # Process document with LLM
-        llm_results = await llm_service.process_document(extracted_text)
-        # Upload processed results to S3
-        summary_key = await storage.upload_text(
-            document_id, llm_results["summary"], "summaries"
-        )
-        insights_key = await storage.upload_text(
-            document_id, llm_results["insights"], "insights"
-        )
-        opportunities_key = await storage.upload_text(
-            document_id, llm_results["opportunities"], "opportunities"
-        )
-        # Add keys to metadata
-        metadata["summary_key"] = summary_key
-        metadata["insights_key"] = insights_key
-        metadata["opportunities_key"] = opportunities_key
-        metadata["summary"] = (
-            llm_results["summary"][:500] + "..."
-            if len(llm_results["summary"]) > 500
-            else llm_results["summary"]
-        )
-        # Index document for vector search
-        chunks_indexed = await vector_service.index_document(
-            document_id, extracted_text
-        )
-        metadata["chunks_indexed"] = chunks_indexed
-        # Update status to COMPLETED
-        metadata["status"] = ProcessingStatus.COMPLETED
-        metadata["processed_at"] = datetime.utcnow().isoformat()
-        await storage.save_document_metadata(metadata)
-    except Exception as e:
-        print(f"Error processing document {document_id}: {e}")
-        # Update status to FAILED
-        try:
-            metadata = await storage.get_document_metadata(document_id)
-            if metadata:
-                metadata["status"] = ProcessingStatus.FAILED
-                metadata["error"] = str(e)
-                await storage.save_document_metadata(metadata)
-        except Exception as inner_e:
-            print(f"Error updating failure status: {inner_e}")
+        if metadata:
+            await metadata_cache.set(str(document_id), metadata)
+    return metadata
+
+
+async def read_upload_chunks(file: UploadFile):
+    """Yield an uploaded file in chunks without reading it all at once"""
+    while True:
+        chunk = await file.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
 
 
 @router.post(
@@ -113,7 +112,6 @@ async def process_document_task(document_id: uuid.UUID):
     status_code=status.HTTP_202_ACCEPTED,
 )
 async def upload_document(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     title: Optional[str] = Form(None),
     document_type: DocumentType = Form(DocumentType.RESEARCH_PAPER),
@@ -138,40 +136,66 @@ async def upload_document(
             tags_list = []
     except Exception:
         tags_list = []
+    # Reject oversized uploads before sending anything to S3
+    if file.size is not None and file.size > settings.max_upload_size:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"PDF exceeds {settings.max_upload_size} bytes",
+        )
     try:
-        # Read file content
-        file_content = await file.read()
-        file_size = len(file_content)
         # Create document ID
         document_id = uuid.uuid4()
-        # Generate title from filename if not provided
+        # Generate title from filename if not provided, replaced by the
+        # title extracted during processing
+        title_source = "user"
         if not title:
             title = file.filename.replace(".pdf", "").replace("_", " ").title()
-        # Upload PDF to S3
-        pdf_key = await storage.upload_pdf(document_id, file_content)
-        if not pdf_key:
+            title_source = "filename"
+        # Stream PDF to S3, hashing it on the way
+        upload = await storage.upload_pdf_stream(
+            document_id, read_upload_chunks(file), settings.max_upload_size
+        )
+        if not upload:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to upload PDF",
             )
+        pdf_key = upload["key"]
+        file_size = upload["size"]
+        content_hash = upload["sha256"]
+        # Reuse the existing document if this exact PDF was uploaded before
+        existing_id = await storage.find_document_by_hash(content_hash)
+        if existing_id:
+            existing = await storage.get_document_metadata(existing_id)
+            if existing and existing.get("status") != ProcessingStatus.FAILED:
+                await storage.delete_object(pdf_key)
+                existing["file_size"] = file_size
+                return DocumentMetadata(**existing)
         # Create document metadata
         document = Document(
             id=document_id,
             title=title,
+            title_source=title_source,
             document_type=document_type,
             pdf_key=pdf_key,
+            content_hash=content_hash,
             tags=tags_list,
         )
         # Save metadata to DynamoDB
         metadata_dict = document.model_dump()
         await storage.save_document_metadata(metadata_dict)
-        # Start background processing task
-        background_tasks.add_task(process_document_task, document_id)
+        # Queue the document for processing by a worker
+        await processing_queue.enqueue(document_id)
         # Add additional metadata for response
         metadata_dict["file_size"] = file_size
         return DocumentMetadata(**metadata_dict)
     except HTTPException:
         raise
+    except UploadTooLargeError:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"PDF exceeds {settings.max_upload_size} bytes",
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -179,12 +203,37 @@ async def upload_document(
         )
 
 
-@router.get("/", response_model=List[DocumentMetadata])
-async def list_documents():
-    """List all documents"""
+@router.get("/", response_model=DocumentPage)
+async def list_documents(
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = None,
+    status_filter: Optional[ProcessingStatus] = Query(None, alias="status"),
+    tag: Optional[str] = None,
+    uploaded_after: Optional[datetime] = None,
+    uploaded_before: Optional[datetime] = None,
+):
+    """
+    List documents newest first
+    Pass next_cursor from the response as cursor to fetch the next page
+    """
     try:
-        documents = await storage.list_documents()
-        return documents
+        return await storage.list_documents(
+            limit=limit,
+            cursor=cursor,
+            status=status_filter.value if status_filter else None,
+            tag=tag,
+            uploaded_after=(
+                uploaded_after.isoformat() if uploaded_after else None
+            ),
+            uploaded_before=(
+                uploaded_before.isoformat() if uploaded_before else None
+            ),
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -192,11 +241,80 @@ async def list_documents():
         )
 
 
+def matches_search_filters(
+    metadata: Dict[str, Any], search: DocumentSearch
+) -> bool:
+    """Whether a document passes the tag and upload date filters"""
+    if not set(search.tags) <= set(metadata.get("tags", [])):
+        return False
+    upload_date = metadata.get("upload_date", "")
+    if search.uploaded_after and upload_date < (
+        search.uploaded_after.isoformat()
+    ):
+        return False
+    if search.uploaded_before and upload_date > (
+        search.uploaded_before.isoformat()
+    ):
+        return False
+    return True
+
+
+@router.post("/search", response_model=SearchResults)
+async def search_documents(search: DocumentSearch):
+    """
+    Semantic search across all documents
+    The closest documents are found by their centroid embeddings first,
+    then only their chunks are ranked.
+    """
+    try:
+        documents: Dict[str, Dict[str, Any]] = {}
+
+        async def document_filter(document_ids: List[str]) -> List[str]:
+            items = await asyncio.gather(
+                *(cached_document_metadata(d) for d in document_ids)
+            )
+            for document_id, item in zip(document_ids, items):
+                if item and matches_search_filters(item, search):
+                    documents[document_id] = item
+            return list(documents)
+
+        matches = await vector_service.search(
+            search.query,
+            top_k=search.top_k,
+            top_documents=search.top_documents,
+            document_filter=document_filter,
+        )
+        # Group snippets by document, best document first
+        results: Dict[str, SearchResult] = {}
+        for match in matches:
+            document_id = match["document_id"]
+            if document_id not in results:
+                results[document_id] = SearchResult(
+                    document_id=document_id,
+                    title=documents[document_id]["title"],
+                    score=match["score"],
+                    snippets=[],
+                )
+            results[document_id].snippets.append(
+                SearchSnippet(
+                    chunk_id=match["chunk_id"],
+                    text=match["text"][:SNIPPET_CHARS],
+                    score=match["score"],
+                )
+            )
+        return SearchResults(results=list(results.values()))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error searching documents: {str(e)}",
+        )
+
+
 @router.get("/{document_id}", response_model=DocumentMetadata)
 async def get_document(document_id: uuid.UUID):
     """Get document metadata by ID"""
     try:
-        document = await storage.get_document_metadata(document_id)
+        document = await cached_document_metadata(document_id)
         if not document:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -218,6 +336,8 @@ async def delete_document(document_id: uuid.UUID):
     try:
         # Delete from vector store first (if exists)
         await vector_service.delete_document(document_id)
+        answer_cache.invalidate(str(document_id))
+        await metadata_cache.delete(str(document_id))
         # Then delete from storage
         success = await storage.delete_document(document_id)
         if not success:
@@ -235,12 +355,85 @@ async def delete_document(document_id: uuid.UUID):
         )
 
 
+@router.post(
+    "/{document_id}/reprocess",
+    response_model=DocumentMetadata,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def reprocess_document(
+    document_id: uuid.UUID, from_stage: Optional[ProcessingStage] = None
+):
+    """
+    Queue a document for processing again
+    Without from_stage, only stages that have not completed are run, or
+    everything if all completed. With from_stage, that stage and every
+    stage depending on it are rerun.
+    """
+    try:
+        metadata = await storage.get_document_metadata(document_id)
+        if not metadata:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Document not found",
+            )
+        current_status = metadata.get("status")
+        if current_status == ProcessingStatus.PENDING:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Document is already queued for processing",
+            )
+        # Unless its job crashed, the pipeline is still running
+        if current_status in (
+            ProcessingStatus.PROCESSING,
+            ProcessingStatus.INDEXED,
+        ) and not processing_is_stale(metadata):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Document is already being processed",
+            )
+        if from_stage is None and not pending_stages(metadata):
+            from_stage = STAGES[0]
+        if from_stage is not None:
+            reset_stages(metadata, from_stage)
+        metadata["status"] = ProcessingStatus.PENDING
+        await storage.save_document_metadata(metadata)
+        answer_cache.invalidate(str(document_id))
+        await metadata_cache.delete(str(document_id))
+        await processing_queue.enqueue(document_id)
+        return DocumentMetadata(**metadata)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error reprocessing document: {str(e)}",
+        )
+
+
 @router.get("/{document_id}/content", response_model=DocumentContent)
-async def get_document_content(document_id: uuid.UUID):
+async def get_document_content(
+    document_id: uuid.UUID,
+    fields: Optional[str] = Query(
+        None,
+        description="Comma-separated subset of "
+        "raw_text, summary, insights, opportunities",
+    ),
+):
     """Get document content (raw text and summaries)"""
+    requested = (
+        [field.strip() for field in fields.split(",") if field.strip()]
+        if fields
+        else list(CONTENT_FIELDS)
+    )
+    unknown = set(requested) - set(CONTENT_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}",
+        )
     try:
         # Get metadata
-        metadata = await storage.get_document_metadata(document_id)
+        metadata = await cached_document_metadata(document_id)
         if not metadata:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -252,84 +445,329 @@ async def get_document_content(document_id: uuid.UUID):
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Document is not ready. Current status: {metadata.get('status')}",
             )
-        # Get content from S3
-        raw_text = await storage.get_text(metadata.get("raw_text_key"))
-        summary = (
-            await storage.get_text(metadata.get("summary_key"))
-            if "summary_key" in metadata
-            else None
+        # Get the requested content from S3 concurrently
+        content = await storage.get_texts(
+            {field: metadata.get(f"{field}_key") for field in requested}
         )
-        insights = (
-            await storage.get_text(metadata.get("insights_key"))
-            if "insights_key" in metadata
-            else None
+        return DocumentContent(id=document_id, **content)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error getting document content: {str(e)}",
         )
-        opportunities = (
-            await storage.get_text(metadata.get("opportunities_key"))
-            if "opportunities_key" in metadata
-            else None
+
+
+@router.get("/{document_id}/text")
+async def stream_document_text(
+    document_id: uuid.UUID,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Stream the extracted raw text
+    Supports Range requests and If-None-Match using the S3 ETag
+    """
+    try:
+        metadata = await cached_document_metadata(document_id)
+        if not metadata or not metadata.get("raw_text_key"):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Document text not found",
+            )
+        result = await storage.stream_object(
+            metadata["raw_text_key"], range_header, if_none_match
         )
-        return DocumentContent(
-            id=document_id,
-            raw_text=raw_text,
-            summary=summary,
-            insights=insights,
-            opportunities=opportunities,
+        if result is None:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Error reading document text",
+            )
+        if result["body"] is None:
+            return Response(
+                status_code=result["status_code"], headers=result["headers"]
+            )
+        return StreamingResponse(
+            result["body"],
+            status_code=result["status_code"],
+            headers=result["headers"],
+            media_type="text/plain; charset=utf-8",
         )
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error getting document content: {str(e)}",
+            detail=f"Error streaming document text: {str(e)}",
         )
 
 
-@router.post("/{document_id}/ask", response_model=DocumentAnswer)
-async def ask_question(document_id: uuid.UUID, question: DocumentQuestion):
-    """Ask a question about a specific document"""
+@asynccontextmanager
+async def timed(timings: Dict[str, float], stage: str):
+    """Time the wrapped block as one stage of answering a question"""
+    start = time.perf_counter()
     try:
-        # Get metadata
-        metadata = await storage.get_document_metadata(document_id)
+        yield
+    finally:
+        timings[stage] = time.perf_counter() - start
+        ask_metrics.record(f"ask_{stage}", timings[stage])
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    """Server-Timing header value of a request's stage timings"""
+    return ", ".join(
+        f"{stage};dur={seconds * 1000:.1f}"
+        for stage, seconds in timings.items()
+    )
+
+
+async def prepare_answer(
+    document_id: uuid.UUID,
+    question: DocumentQuestion,
+    timings: Dict[str, float],
+) -> Dict[str, Any]:
+    """
+    Check a document can answer questions, then look for a cached answer
+    and, on a miss, retrieve the chunks to answer from. The query is
+    embedded while the document metadata is fetched.
+    Args:
+        document_id: Document the question is about
+        question: The question
+        timings: Seconds per stage, updated for profiling
+    Returns:
+        Dictionary with the document's index "version", the "cached"
+        answer (None on a miss), the query "embedding" (None without
+        vector retrieval), the retrieved "matches" and the "context"
+        passages and their "sources" to answer from
+    """
+    start = time.perf_counter()
+    mode = question.retrieval or settings.retrieval_mode
+    variant = answer_variant(mode)
+
+    async def get_metadata() -> Optional[Dict[str, Any]]:
+        async with timed(timings, "metadata"):
+            return await cached_document_metadata(document_id)
+
+    async def embed_query() -> Optional[List[float]]:
+        if mode == "lexical":
+            return None
+        async with timed(timings, "embedding"):
+            embeddings = await llm_service.create_embeddings(
+                [question.question]
+            )
+        return embeddings[0]
+
+    embedding_task = asyncio.create_task(embed_query())
+    try:
+        metadata = await get_metadata()
         if not metadata:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Document not found",
             )
-        # Check if document has been processed
-        if metadata.get("status") != ProcessingStatus.COMPLETED:
+        # Check if document has been indexed
+        if not can_answer_questions(metadata):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Document is not ready. Current status: {metadata.get('status')}",
             )
-        # Query vector store
-        query_results = await vector_service.query_document(
-            document_id, question.question, top_k=5
+        version = index_version(metadata)
+        cached = answer_cache.lookup(
+            str(document_id), version, question.question, variant=variant
         )
-        if not query_results:
-            return DocumentAnswer(
-                answer="I don't have enough information to answer this question.",
-                context=[],
-                sources=[],
+        similar = False
+        if cached is not None:
+            embedding_task.cancel()
+            embedding = None
+        else:
+            embedding = await embedding_task
+            if embedding is not None:
+                cached = answer_cache.lookup(
+                    str(document_id),
+                    version,
+                    question.question,
+                    embedding,
+                    variant,
+                )
+                similar = cached is not None
+    except BaseException:
+        embedding_task.cancel()
+        raise
+    answer_cache.record(cached, similar, time.perf_counter() - start)
+    prepared = {
+        "version": version,
+        "variant": variant,
+        "cached": cached.answer if cached else None,
+        "embedding": embedding,
+        "matches": [],
+        "context": [],
+        "sources": [],
+    }
+    if cached is None:
+        # Query vector store
+        async with timed(timings, "retrieval"):
+            prepared["matches"] = await vector_service.query_document(
+                document_id,
+                question.question,
+                top_k=settings.context_candidates,
+                mode=mode,
+                query_embedding=embedding,
             )
-        # Extract context chunks
-        context_chunks = [match["text"] for match in query_results]
-        # Generate answer with LLM
-        answer = await llm_service.answer_question(
-            question.question, context_chunks
-        )
-        # Prepare sources
-        sources = []
-        for i, match in enumerate(query_results):
-            sources.append(
-                {
-                    "chunk_id": match["chunk_id"],
-                    "relevance_score": f"{match['score']:.2f}",
-                }
+        if prepared["matches"]:
+            async with timed(timings, "context"):
+                prepared.update(
+                    await answer_context(document_id, prepared["matches"])
+                )
+    return prepared
+
+
+def answer_variant(mode: str) -> str:
+    """
+    Retrieval setup an answer depends on, so answers retrieved with
+    another mode or context budget are not reused
+    """
+    return (
+        f"{mode}:{settings.context_candidates}:"
+        f"{settings.context_token_budget}"
+    )
+
+
+def passage_source(passage: Dict[str, Any]) -> Dict[str, str]:
+    """Source of a context passage, a chunk ID or a run like 3-5"""
+    first, last = passage["chunk_ids"][0], passage["chunk_ids"][-1]
+    return {
+        "chunk_id": str(first) if first == last else f"{first}-{last}",
+        "relevance_score": f"{passage['score']:.2f}",
+    }
+
+
+async def answer_context(
+    document_id: uuid.UUID, matches: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    Context passages to answer from, packed within CONTEXT_TOKEN_BUDGET
+    with adjacent chunks merged, and their sources. Documents without a
+    chunk store use the top chunks as retrieved.
+    """
+    top = matches[:UNPACKED_CONTEXT_CHUNKS]
+    passages = await vector_service.build_context(
+        document_id, matches, settings.context_token_budget
+    )
+    if passages is None:
+        context = [match["text"] for match in top]
+        sources = answer_sources(top)
+    else:
+        context = [passage["text"] for passage in passages]
+        sources = [passage_source(passage) for passage in passages]
+    context_stats["questions"] += 1
+    context_stats["tokens"] += sum(map(llm_service.count_tokens, context))
+    context_stats["unpacked_tokens"] += sum(
+        llm_service.count_tokens(match["text"]) for match in top
+    )
+    return {"context": context, "sources": sources}
+
+
+def cache_answer(
+    document_id: uuid.UUID,
+    question: DocumentQuestion,
+    prepared: Dict[str, Any],
+    answer: DocumentAnswer,
+    seconds: float,
+) -> None:
+    """Cache an answer with the seconds it took to produce"""
+    answer_cache.put(
+        str(document_id),
+        prepared["version"],
+        question.question,
+        prepared["embedding"],
+        answer.model_dump(),
+        seconds,
+        prepared["variant"],
+    )
+
+
+def answer_sources(query_results: List[Dict[str, Any]]) -> List[Dict]:
+    """Chunk IDs and relevance of the chunks an answer is based on"""
+    return [
+        {
+            "chunk_id": str(match["chunk_id"]),
+            "relevance_score": f"{match['score']:.2f}",
+        }
+        for match in query_results
+    ]
+
+
+@router.post("/{document_id}/ask", response_model=DocumentAnswer)
+async def ask_question(
+    document_id: uuid.UUID, question: DocumentQuestion, response: Response
+):
+    """
+    Ask a question about a specific document
+    The time spent per stage is returned in the Server-Timing header.
+    """
+    timings: Dict[str, float] = {}
+    try:
+        async with timed(timings, "total"):
+            prepared = await prepare_answer(document_id, question, timings)
+            if prepared["cached"] is not None:
+                answer = DocumentAnswer(**prepared["cached"])
+            elif not prepared["context"]:
+                answer = DocumentAnswer(
+                    answer=NO_ANSWER,
+                    context=[],
+                    sources=[],
+                )
+            else:
+                # Generate answer with LLM
+                async with timed(timings, "llm"):
+                    text = await llm_service.answer_question(
+                        question.question, prepared["context"]
+                    )
+                answer = DocumentAnswer(
+                    answer=text,
+                    context=prepared["context"],
+                    sources=prepared["sources"],
+                )
+        if prepared["cached"] is None:
+            cache_answer(
+                document_id, question, prepared, answer, timings["total"]
             )
-        return DocumentAnswer(
-            answer=answer, context=context_chunks, sources=sources
+        response.headers["Server-Timing"] = server_timing(timings)
+        return answer
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error processing question: {str(e)}",
         )
+
+
+async def iter_tokens(tokens: List[str]):
+    for token in tokens:
+        yield token
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Format a Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/{document_id}/ask/stream")
+async def ask_question_stream(
+    document_id: uuid.UUID, question: DocumentQuestion
+):
+    """
+    Ask a question about a specific document, streamed as Server-Sent
+    Events: a "sources" event with the retrieved context, "token" events
+    as the answer is generated, then "done" with latency timings, or
+    "error" if generation fails
+    """
+    start = time.perf_counter()
+    timings: Dict[str, float] = {}
+    try:
+        prepared = await prepare_answer(document_id, question, timings)
     except HTTPException:
         raise
     except Exception as e:
@@ -337,6 +775,302 @@ async def ask_question(document_id: uuid.UUID, question: DocumentQuestion):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error processing question: {str(e)}",
         )
+    cached = prepared["cached"]
+    if cached is not None:
+        context_chunks = cached["context"]
+        sources = cached["sources"]
+        tokens = iter_tokens([cached["answer"]])
+    else:
+        context_chunks = prepared["context"]
+        sources = prepared["sources"]
+        if context_chunks:
+            tokens = llm_service.stream_answer(
+                question.question, context_chunks
+            )
+        else:
+            tokens = iter_tokens([NO_ANSWER])
+
+    async def events():
+        yield sse_event(
+            "sources", {"context": context_chunks, "sources": sources}
+        )
+        first_byte = time.perf_counter() - start
+        ask_metrics.record("stream_first_byte", first_byte)
+        first_token = None
+        answer = []
+        try:
+            async for token in tokens:
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                    ask_metrics.record("stream_first_token", first_token)
+                answer.append(token)
+                yield sse_event("token", {"token": token})
+        except Exception as e:
+            yield sse_event(
+                "error", {"detail": f"Error generating answer: {str(e)}"}
+            )
+            return
+        total = time.perf_counter() - start
+        ask_metrics.record("stream_total", total)
+        if cached is None:
+            cache_answer(
+                document_id,
+                question,
+                prepared,
+                DocumentAnswer(
+                    answer="".join(answer),
+                    context=context_chunks,
+                    sources=sources,
+                ),
+                total,
+            )
+        yield sse_event(
+            "done",
+            {
+                "first_byte_ms": int(first_byte * 1000),
+                "first_token_ms": int((first_token or total) * 1000),
+                "total_ms": int(total * 1000),
+            },
+        )
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Stop proxies from buffering the stream
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "Server-Timing": server_timing(timings),
+        },
+    )
+
+
+def batch_line(index: int, item: BatchQuestion, **fields: Any) -> str:
+    """NDJSON line with the outcome of a question of a batch"""
+    return (
+        json.dumps(
+            {
+                "index": index,
+                "document_id": str(item.document_id),
+                "question": item.question,
+                **fields,
+            }
+        )
+        + "\n"
+    )
+
+
+@router.post("/ask-batch")
+async def ask_batch(batch: DocumentQuestionBatch):
+    """
+    Answer many questions about one or many documents, streamed as NDJSON
+    as answers finish, not in request order. Each line has the question's
+    "index" in the request and its "answer" with "cached", or an "error"
+    with the "status" and "detail" /ask would have returned.
+    Questions are embedded in one request and retrieved together per
+    document, and at most ASK_BATCH_CONCURRENCY answers are generated at
+    once.
+    """
+    mode = batch.retrieval or settings.retrieval_mode
+    variant = answer_variant(mode)
+
+    async def results():
+        start = time.perf_counter()
+        timings: Dict[str, float] = {}
+        document_ids = list(
+            dict.fromkeys(item.document_id for item in batch.questions)
+        )
+        documents = dict(
+            zip(
+                document_ids,
+                await asyncio.gather(
+                    *map(cached_document_metadata, document_ids)
+                ),
+            )
+        )
+        # Questions with no cached answer, with their index version
+        pending = []
+        for index, item in enumerate(batch.questions):
+            metadata = documents[item.document_id]
+            if not metadata:
+                yield batch_line(
+                    index,
+                    item,
+                    error={"status": 404, "detail": "Document not found"},
+                )
+                continue
+            if not can_answer_questions(metadata):
+                yield batch_line(
+                    index,
+                    item,
+                    error={
+                        "status": 400,
+                        "detail": "Document is not ready. Current status: "
+                        f"{metadata.get('status')}",
+                    },
+                )
+                continue
+            version = index_version(metadata)
+            cached = answer_cache.lookup(
+                str(item.document_id), version, item.question, variant=variant
+            )
+            if cached is not None:
+                answer_cache.record(cached, False, time.perf_counter() - start)
+                yield batch_line(
+                    index, item, answer=cached.answer, cached=True
+                )
+                continue
+            pending.append((index, item, version))
+
+        embeddings: List[Optional[List[float]]] = [None] * len(pending)
+        if pending and mode != "lexical":
+            try:
+                async with timed(timings, "batch_embedding"):
+                    embeddings = await llm_service.create_embeddings(
+                        [item.question for _, item, _ in pending]
+                    )
+            except Exception as e:
+                for index, item, _ in pending:
+                    yield batch_line(
+                        index,
+                        item,
+                        error={
+                            "status": 500,
+                            "detail": f"Error processing question: {str(e)}",
+                        },
+                    )
+                return
+        groups: Dict[uuid.UUID, List[Dict[str, Any]]] = {}
+        for (index, item, version), embedding in zip(pending, embeddings):
+            cached = None
+            if embedding is not None:
+                cached = answer_cache.lookup(
+                    str(item.document_id),
+                    version,
+                    item.question,
+                    embedding,
+                    variant,
+                )
+            answer_cache.record(
+                cached, cached is not None, time.perf_counter() - start
+            )
+            if cached is not None:
+                yield batch_line(
+                    index, item, answer=cached.answer, cached=True
+                )
+                continue
+            groups.setdefault(item.document_id, []).append(
+                {
+                    "index": index,
+                    "item": item,
+                    "version": version,
+                    "embedding": embedding,
+                }
+            )
+
+        async def retrieve(
+            document_id: uuid.UUID, group: List[Dict[str, Any]]
+        ) -> List[Dict[str, Any]]:
+            async with timed(timings, "batch_retrieval"):
+                matches = await vector_service.query_document_batch(
+                    document_id,
+                    [entry["item"].question for entry in group],
+                    top_k=settings.context_candidates,
+                    mode=mode,
+                    query_embeddings=None
+                    if mode == "lexical"
+                    else [entry["embedding"] for entry in group],
+                )
+
+            async def context(
+                question_matches: List[Dict[str, Any]]
+            ) -> Dict[str, Any]:
+                if not question_matches:
+                    return {"context": [], "sources": []}
+                return await answer_context(document_id, question_matches)
+
+            return await asyncio.gather(*map(context, matches))
+
+        retrievals = {
+            document_id: asyncio.create_task(retrieve(document_id, group))
+            for document_id, group in groups.items()
+        }
+        semaphore = asyncio.Semaphore(settings.ask_batch_concurrency)
+
+        async def answer(position: int, entry: Dict[str, Any]) -> str:
+            item = entry["item"]
+            try:
+                context = (await retrievals[item.document_id])[position]
+                if not context["context"]:
+                    text = NO_ANSWER
+                else:
+                    async with semaphore:
+                        async with timed(timings, "batch_llm"):
+                            text = await llm_service.answer_question(
+                                item.question, context["context"]
+                            )
+                answer = DocumentAnswer(answer=text, **context)
+            except Exception as e:
+                return batch_line(
+                    entry["index"],
+                    item,
+                    error={
+                        "status": 500,
+                        "detail": f"Error processing question: {str(e)}",
+                    },
+                )
+            answer_cache.put(
+                str(item.document_id),
+                entry["version"],
+                item.question,
+                entry["embedding"],
+                answer.model_dump(),
+                time.perf_counter() - start,
+                variant,
+            )
+            return batch_line(
+                entry["index"], item, answer=answer.model_dump(), cached=False
+            )
+
+        tasks = [
+            asyncio.create_task(answer(position, entry))
+            for group in groups.values()
+            for position, entry in enumerate(group)
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            # The client may disconnect before every answer is sent
+            for task in [*tasks, *retrievals.values()]:
+                task.cancel()
+        ask_metrics.record("batch_total", time.perf_counter() - start)
+
+    return StreamingResponse(
+        results(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/ask/metrics")
+async def get_ask_metrics():
+    """
+    Mean and max latency of question answering in seconds, answer cache
+    hits, misses and seconds saved, and mean context tokens per question
+    before and after packing
+    """
+    questions = max(context_stats["questions"], 1)
+    return {
+        "latency": ask_metrics.snapshot()["stages"],
+        "answer_cache": answer_cache.snapshot(),
+        "context": {
+            "questions": context_stats["questions"],
+            "mean_tokens": context_stats["tokens"] / questions,
+            "mean_unpacked_tokens": context_stats["unpacked_tokens"]
+            / questions,
+        },
+    }
 
 
 @router.get("/{document_id}/pdf", response_class=JSONResponse)
@@ -344,7 +1078,7 @@ async def get_document_pdf_url(document_id: uuid.UUID):
     """Get a pre-signed URL for downloading the PDF"""
     try:
         # Get metadata
-        metadata = await storage.get_document_metadata(document_id)
+        metadata = await cached_document_metadata(document_id)
         if not metadata or "pdf_key" not in metadata:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -1,5 +1,11 @@
+from .cache_service import result_cache
 from .llm_service import llm_service
 from .ocr_service import ocr_service
 from .vector_service import vector_service
 
-__all__ = ["llm_service", "ocr_service", "vector_service"]
+__all__ = [
+    "llm_service",
+    "ocr_service",
+    "result_cache",
+    "vector_service",
+]
@@ -0,0 +1,192 @@
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from ..config import get_settings
+from .cache_service import content_key
+from .vector_store import normalize_rows
+
+settings = get_settings()
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase question with collapsed whitespace and no end punctuation"""
+    return re.sub(r"\s+", " ", question.lower()).strip(" ?!.")
+
+
+def answer_key(question: str, variant: str = "") -> str:
+    """Cache key of a question answered with one retrieval setup"""
+    return content_key(variant, normalize_question(question))
+
+
+@dataclass
+class CachedAnswer:
+    """An answer and what it cost to produce"""
+
+    answer: Dict[str, Any]
+    # Unit-length query embedding, None for lexical-only questions
+    embedding: Optional[np.ndarray]
+    seconds: float
+    # Retrieval setup the answer was produced with
+    variant: str = ""
+
+
+class DocumentAnswers:
+    """Cached answers of one document at one index version"""
+
+    def __init__(self, version: str):
+        self.version = version
+        self.entries: "OrderedDict[str, CachedAnswer]" = OrderedDict()
+
+    def similar(
+        self, embedding: np.ndarray, threshold: float, variant: str = ""
+    ) -> Optional[CachedAnswer]:
+        """
+        Entry with the most similar question above the threshold, answered
+        with the same retrieval setup
+        """
+        candidates = [
+            entry
+            for entry in self.entries.values()
+            if entry.embedding is not None and entry.variant == variant
+        ]
+        if not candidates:
+            return None
+        scores = np.stack([entry.embedding for entry in candidates]) @ (
+            embedding
+        )
+        best = int(np.argmax(scores))
+        return candidates[best] if scores[best] >= threshold else None
+
+
+class AnswerCache:
+    """
+    In-process cache of answers per document. Questions match exactly
+    after normalisation, or by cosine similarity of their embeddings above
+    a threshold. Entries belong to an index version of the document, so
+    reindexing, even in another process, invalidates them.
+    """
+
+    def __init__(self, max_documents: int, max_entries: int, threshold: float):
+        self.max_documents = max_documents
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.documents: "OrderedDict[str, DocumentAnswers]" = OrderedDict()
+        self.stats = {
+            "exact_hits": 0,
+            "similar_hits": 0,
+            "misses": 0,
+            "seconds_saved": 0.0,
+        }
+
+    def _document(
+        self, document_id: str, version: str
+    ) -> Optional[DocumentAnswers]:
+        answers = self.documents.get(document_id)
+        if answers is None:
+            return None
+        if answers.version != version:
+            # The document was reindexed since these answers
+            del self.documents[document_id]
+            return None
+        self.documents.move_to_end(document_id)
+        return answers
+
+    def lookup(
+        self,
+        document_id: str,
+        version: str,
+        question: str,
+        embedding: Optional[List[float]] = None,
+        variant: str = "",
+    ) -> Optional[CachedAnswer]:
+        """
+        Find a cached answer to a question
+        Args:
+            document_id: Document the question is about
+            version: Index version of the document
+            question: Question text, matched exactly after normalisation
+            embedding: Query embedding, to also match similar questions
+            variant: Retrieval setup, such as the mode and context budget,
+                that answers must have been produced with
+        Returns:
+            The cached answer, None on a miss
+        """
+        answers = self._document(document_id, version)
+        if answers is None:
+            return None
+        entry = answers.entries.get(answer_key(question, variant))
+        if entry is None and embedding is not None:
+            query = normalize_rows(np.array([embedding], np.float32))[0]
+            entry = answers.similar(query, self.threshold, variant)
+        return entry
+
+    def record(
+        self, entry: Optional[CachedAnswer], similar: bool, seconds: float
+    ) -> None:
+        """
+        Count a lookup
+        Args:
+            entry: Answer found, None for a miss
+            similar: Whether the answer was found by embedding similarity
+            seconds: Time spent on the lookup, including any embedding
+        """
+        if entry is None:
+            self.stats["misses"] += 1
+            return
+        self.stats["similar_hits" if similar else "exact_hits"] += 1
+        self.stats["seconds_saved"] += max(0.0, entry.seconds - seconds)
+
+    def put(
+        self,
+        document_id: str,
+        version: str,
+        question: str,
+        embedding: Optional[List[float]],
+        answer: Dict[str, Any],
+        seconds: float,
+        variant: str = "",
+    ) -> None:
+        """
+        Cache the answer to a question and the seconds it took, under the
+        retrieval setup (variant) it was produced with
+        """
+        answers = self._document(document_id, version)
+        if answers is None:
+            answers = self.documents[document_id] = DocumentAnswers(version)
+            while len(self.documents) > self.max_documents:
+                self.documents.popitem(last=False)
+        if embedding is not None:
+            embedding = normalize_rows(np.array([embedding], np.float32))[0]
+        key = answer_key(question, variant)
+        answers.entries[key] = CachedAnswer(
+            answer, embedding, seconds, variant
+        )
+        answers.entries.move_to_end(key)
+        while len(answers.entries) > self.max_entries:
+            answers.entries.popitem(last=False)
+
+    def invalidate(self, document_id: str) -> None:
+        """Drop every cached answer of a document"""
+        self.documents.pop(document_id, None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Hit and miss counts, hit rate and latency saved"""
+        hits = self.stats["exact_hits"] + self.stats["similar_hits"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "documents": len(self.documents),
+        }
+
+
+# Initialize answer cache singleton
+answer_cache = AnswerCache(
+    settings.answer_cache_documents,
+    settings.answer_cache_entries,
+    settings.answer_cache_similarity,
+)
@@ -0,0 +1,234 @@
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple, Union
+
+from ..config import get_settings
+from ..database import storage
+
+settings = get_settings()
+
+
+def content_key(*parts: Union[str, bytes]) -> str:
+    """
+    Build a content-addressed cache key from its parts
+    Args:
+        parts: Namespace, model, prompt and content the result depends on
+    Returns:
+        SHA-256 hex digest over the length-prefixed parts
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        digest.update(f"{len(part)}:".encode("ascii"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def pack_vector(vector: List[float]) -> str:
+    """Encode a vector as base64 float32 bytes for compact caching"""
+    return base64.b64encode(array("f", vector).tobytes()).decode("ascii")
+
+
+def unpack_vector(packed: str) -> List[float]:
+    """Decode a vector encoded by pack_vector"""
+    vector = array("f")
+    vector.frombytes(base64.b64decode(packed))
+    return vector.tolist()
+
+
+class ResultCache:
+    """Base cache backend, which stores nothing"""
+
+    def __init__(self, ttl: int = 0):
+        self.ttl = ttl
+
+    def _expires_at(self) -> Optional[float]:
+        return time.time() + self.ttl if self.ttl else None
+
+    @staticmethod
+    def _expired(expires_at: Optional[float]) -> bool:
+        return expires_at is not None and expires_at < time.time()
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Get a cached value, None on a miss or an expired entry"""
+        return None
+
+    async def set(self, key: str, value: Any) -> None:
+        """Cache a JSON-serializable value"""
+
+    async def delete(self, key: str) -> None:
+        """Remove a cached value"""
+
+
+class MemoryCache(ResultCache):
+    """In-process LRU cache bounded by the number of entries"""
+
+    def __init__(self, max_entries: int, ttl: int = 0):
+        super().__init__(ttl)
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Tuple[Optional[float], Any]]" = (
+            OrderedDict()
+        )
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if self._expired(expires_at):
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any) -> None:
+        self.entries[key] = (self._expires_at(), value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def delete(self, key: str) -> None:
+        self.entries.pop(key, None)
+
+
+class DiskCache(ResultCache):
+    """
+    Local disk cache evicting the least recently used files. Entries are
+    counted as they are written, and the directory is only scanned once
+    the count passes max_entries; eviction then trims to a tenth below
+    the limit, so scans are rare.
+    """
+
+    def __init__(self, directory: str, max_entries: int, ttl: int = 0):
+        super().__init__(ttl)
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # Upper bound on the entries on disk, exact after each scan
+        self._entries = len(self._files())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _files(self) -> List[os.DirEntry]:
+        return [
+            entry
+            for entry in os.scandir(self.directory)
+            if entry.name.endswith(".json")
+        ]
+
+    def _read(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self._expired(entry["expires_at"]):
+            self._remove(path)
+            return None
+        # Touch the file so eviction sees it as recently used
+        os.utime(path)
+        return entry["value"]
+
+    def _write(self, key: str, value: Any) -> None:
+        path = self._path(key)
+        added = not os.path.exists(path)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"expires_at": self._expires_at(), "value": value}, f)
+        os.replace(temp_path, path)
+        if added:
+            with self._lock:
+                self._entries += 1
+                if self._entries > self.max_entries:
+                    self._evict()
+
+    def _evict(self) -> None:
+        files = self._files()
+        keep = self.max_entries - self.max_entries // 10
+        if len(files) > keep:
+            files.sort(key=lambda entry: entry.stat().st_mtime)
+            for entry in files[: len(files) - keep]:
+                self._remove(entry.path)
+        self._entries = min(len(files), keep)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    async def get(self, key: str) -> Optional[Any]:
+        return await asyncio.to_thread(self._read, key)
+
+    async def set(self, key: str, value: Any) -> None:
+        await asyncio.to_thread(self._write, key, value)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._remove, self._path(key))
+
+
+class S3Cache(ResultCache):
+    """S3 cache under the cache/ prefix, expiring entries on read"""
+
+    def __init__(self, ttl: int = 0):
+        super().__init__(ttl)
+
+    async def get(self, key: str) -> Optional[Any]:
+        body = await storage.get_cache_entry(key)
+        if body is None:
+            return None
+        entry = json.loads(body)
+        if self._expired(entry["expires_at"]):
+            await storage.delete_cache_entry(key)
+            return None
+        return entry["value"]
+
+    async def set(self, key: str, value: Any) -> None:
+        body = json.dumps({"expires_at": self._expires_at(), "value": value})
+        await storage.put_cache_entry(key, body)
+
+    async def delete(self, key: str) -> None:
+        await storage.delete_cache_entry(key)
+
+
+def create_cache(
+    max_entries: int = settings.cache_max_entries, name: str = ""
+) -> ResultCache:
+    """
+    Create the cache backend selected in settings
+    Args:
+        max_entries: Entries kept by the memory and disk backends
+        name: Subdirectory of the disk backend, so caches evict separately
+    """
+    if settings.cache_backend == "memory":
+        return MemoryCache(max_entries, settings.cache_ttl)
+    if settings.cache_backend == "disk":
+        return DiskCache(
+            os.path.join(settings.cache_dir, name),
+            max_entries,
+            settings.cache_ttl,
+        )
+    if settings.cache_backend == "s3":
+        return S3Cache(settings.cache_ttl)
+    return ResultCache()
+
+
+# Initialize result cache singletons; chunk embeddings are far more
+# numerous than other results, so they get their own cache
+result_cache = create_cache()
+chunk_embedding_cache = create_cache(
+    settings.embedding_cache_entries, "embeddings"
+)
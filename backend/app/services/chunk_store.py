@@ -0,0 +1,153 @@
+import io
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+
+def pack_strings(strings: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Concatenate strings as UTF-8 bytes with their end offsets"""
+    encoded = [s.encode("utf-8") for s in strings]
+    ends = np.cumsum([len(e) for e in encoded], dtype=np.int64)
+    return np.frombuffer(b"".join(encoded), np.uint8), ends
+
+
+def unpack_strings(data: np.ndarray, ends: np.ndarray) -> List[str]:
+    """Split bytes packed by pack_strings back into strings"""
+    raw = data.tobytes()
+    starts = [0, *ends.tolist()]
+    return [
+        raw[start:end].decode("utf-8")
+        for start, end in zip(starts, starts[1:])
+    ]
+
+
+class ChunkStore:
+    """
+    Full text of a document's chunks, with where each chunk starts in the
+    document text, so overlapping neighbours can be merged without
+    repeating the overlap
+    """
+
+    def __init__(self, texts: List[str], starts: np.ndarray):
+        self.texts = texts
+        # Character offset of each chunk in the document, -1 if unknown
+        self.starts = starts
+
+    @classmethod
+    def build(cls, text: str, chunks: List[str]) -> "ChunkStore":
+        """Locate chunks, split from text in order, in the text"""
+        starts = np.full(len(chunks), -1, np.int64)
+        position = 0
+        for i, chunk in enumerate(chunks):
+            start = text.find(chunk, position)
+            if start >= 0:
+                starts[i] = start
+                # The next chunk starts after this one does
+                position = start + 1
+        return cls(list(chunks), starts)
+
+    def to_bytes(self) -> bytes:
+        """Serialize the chunks as a compressed .npz archive"""
+        texts, texts_ends = pack_strings(self.texts)
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer, texts=texts, texts_ends=texts_ends, starts=self.starts
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ChunkStore":
+        """Load chunks serialized by to_bytes"""
+        with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+            return cls(
+                unpack_strings(arrays["texts"], arrays["texts_ends"]),
+                arrays["starts"],
+            )
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def merge(self, first: int, last: int) -> str:
+        """Text of the consecutive chunks first to last, overlap removed"""
+        parts = [self.texts[first]]
+        end = int(self.starts[first]) + len(self.texts[first])
+        for i in range(first + 1, last + 1):
+            start = int(self.starts[i])
+            if start >= 0 and self.starts[i - 1] >= 0 and start <= end:
+                parts.append(self.texts[i][end - start :])
+            else:
+                # Separated by whitespace the splitter dropped, or unknown
+                parts.append("\n" + self.texts[i])
+            end = max(end, start + len(self.texts[i]))
+        return "".join(parts)
+
+
+def pack_context(
+    store: ChunkStore,
+    matches: List[Tuple[int, float]],
+    budget: int,
+    count_tokens: Callable[[str], int],
+) -> List[Dict[str, Any]]:
+    """
+    Choose the context for a question within a token budget. Chunks are
+    added best score first; adjacent or overlapping chunks are merged
+    into one passage, so overlap is sent once. Leftover budget is filled
+    with the neighbours of the chosen passages, best passage first.
+    Args:
+        store: Chunks of the document
+        matches: (chunk ID, score) pairs of the retrieved chunks
+        budget: Maximum tokens of context
+        count_tokens: Tokenizer of the answering model
+    Returns:
+        Passages with their "text", "chunk_ids" and best "score", best
+        first
+    """
+    scores: Dict[int, float] = {}
+    token_counts: Dict[Tuple[int, int], int] = {}
+
+    def passages() -> List[Dict[str, Any]]:
+        runs: List[List[int]] = []
+        for chunk_id in sorted(scores):
+            if runs and chunk_id == runs[-1][-1] + 1:
+                runs[-1].append(chunk_id)
+            else:
+                runs.append([chunk_id])
+        return [
+            {
+                "chunk_ids": run,
+                "text": store.merge(run[0], run[-1]),
+                "score": max(scores[chunk_id] for chunk_id in run),
+            }
+            for run in runs
+        ]
+
+    def tokens(passage: Dict[str, Any]) -> int:
+        key = (passage["chunk_ids"][0], passage["chunk_ids"][-1])
+        if key not in token_counts:
+            token_counts[key] = count_tokens(passage["text"])
+        return token_counts[key]
+
+    def try_add(chunk_id: int, score: float) -> bool:
+        if chunk_id in scores or not 0 <= chunk_id < len(store):
+            return False
+        scores[chunk_id] = score
+        if sum(map(tokens, passages())) <= budget:
+            return True
+        del scores[chunk_id]
+        return False
+
+    for chunk_id, score in matches:
+        try_add(chunk_id, score)
+    added = True
+    while added:
+        added = False
+        for passage in sorted(passages(), key=lambda p: -p["score"]):
+            # Neighbours rank below every retrieved chunk
+            for neighbour in (
+                passage["chunk_ids"][0] - 1,
+                passage["chunk_ids"][-1] + 1,
+            ):
+                added = try_add(neighbour, 0.0) or added
+            if added:
+                break
+    return sorted(passages(), key=lambda p: -p["score"])
@@ -0,0 +1,158 @@
+import io
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .chunk_store import pack_strings, unpack_strings
+
+# Identifiers keep inner dots and hyphens ("gpt-4", "resnet-50", "3.2")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-][a-z0-9]+)*")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how in is it "
+    "its of on or that the their this to was were what when where which "
+    "who why with".split()
+)
+
+# BM25 parameters, the usual defaults
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase terms of a text, without stopwords"""
+    return [
+        token
+        for token in TOKEN_PATTERN.findall(text.lower())
+        if token not in STOPWORDS
+    ]
+
+
+def _smallest_uint(max_value: int) -> np.dtype:
+    return np.min_scalar_type(max(max_value, 0))
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over a document's chunks, held in flat arrays:
+    the postings of term t are chunk_ids[offsets[t]:offsets[t + 1]], with
+    matching term frequencies, so nothing is stored per posting object.
+    Chunk texts live in the document's ChunkStore.
+    """
+
+    def __init__(
+        self,
+        terms: List[str],
+        offsets: np.ndarray,
+        chunk_ids: np.ndarray,
+        term_freqs: np.ndarray,
+        chunk_lengths: np.ndarray,
+    ):
+        self.terms = terms
+        self.term_ids: Dict[str, int] = {t: i for i, t in enumerate(terms)}
+        self.offsets = offsets
+        self.chunk_ids = chunk_ids
+        self.term_freqs = term_freqs
+        self.chunk_lengths = chunk_lengths.astype(np.float32)
+        self.average_length = (
+            float(self.chunk_lengths.mean()) if len(chunk_lengths) else 0.0
+        )
+
+    @classmethod
+    def build(cls, chunks: List[str]) -> "LexicalIndex":
+        """Index chunks by position, the chunk IDs of the vector store"""
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        lengths = []
+        for chunk_id, chunk in enumerate(chunks):
+            counts = Counter(tokenize(chunk))
+            lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                postings.setdefault(term, []).append((chunk_id, count))
+        terms = sorted(postings)
+        sizes = [len(postings[term]) for term in terms]
+        offsets = np.zeros(len(terms) + 1, np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+        # Postings of each term are in chunk order, as chunks are visited
+        # in order, so the arrays are a plain concatenation
+        pairs = [pair for term in terms for pair in postings[term]]
+        ids = np.array([p[0] for p in pairs], np.int64)
+        freqs = np.array([p[1] for p in pairs], np.int64)
+        return cls(
+            terms,
+            offsets,
+            ids.astype(_smallest_uint(len(chunks))),
+            freqs.astype(_smallest_uint(int(freqs.max(initial=0)))),
+            np.array(lengths, _smallest_uint(max(lengths, default=0))),
+        )
+
+    def to_bytes(self) -> bytes:
+        """Serialize the arrays as a compressed .npz archive"""
+        vocabulary, vocabulary_ends = pack_strings(self.terms)
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            vocabulary=vocabulary,
+            vocabulary_ends=vocabulary_ends,
+            offsets=self.offsets,
+            chunk_ids=self.chunk_ids,
+            term_freqs=self.term_freqs,
+            chunk_lengths=self.chunk_lengths.astype(
+                _smallest_uint(int(self.chunk_lengths.max(initial=0)))
+            ),
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "LexicalIndex":
+        """Load an index serialized by to_bytes"""
+        with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+            return cls(
+                unpack_strings(
+                    arrays["vocabulary"], arrays["vocabulary_ends"]
+                ),
+                arrays["offsets"],
+                arrays["chunk_ids"],
+                arrays["term_freqs"],
+                arrays["chunk_lengths"],
+            )
+
+    def search(self, query: str, top_k: int) -> List[Tuple[int, float]]:
+        """
+        Rank chunks by BM25 score for a query
+        Args:
+            query: Query text
+            top_k: Number of chunks to return
+        Returns:
+            (chunk ID, score) pairs of chunks sharing a term with the
+            query, best first
+        """
+        term_ids = {
+            self.term_ids[term]
+            for term in tokenize(query)
+            if term in self.term_ids
+        }
+        if not term_ids:
+            return []
+        chunk_count = len(self.chunk_lengths)
+        scores = np.zeros(chunk_count, np.float32)
+        for term_id in term_ids:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            ids = self.chunk_ids[start:end]
+            freqs = self.term_freqs[start:end].astype(np.float32)
+            frequency = end - start
+            idf = math.log(
+                1 + (chunk_count - frequency + 0.5) / (frequency + 0.5)
+            )
+            norms = BM25_K1 * (
+                1
+                - BM25_B
+                + BM25_B * self.chunk_lengths[ids] / self.average_length
+            )
+            # Chunk IDs are unique within a term's postings
+            scores[ids] += idf * freqs * (BM25_K1 + 1) / (freqs + norms)
+        matched = np.flatnonzero(scores)
+        best = matched[np.argsort(-scores[matched], kind="stable")[:top_k]]
+        return [(int(i), float(scores[i])) for i in best]
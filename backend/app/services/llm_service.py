@@ -1,22 +1,72 @@
+import asyncio
 import logging
-from typing import Dict, List
+from collections.abc import AsyncIterator, Awaitable, Callable
+from datetime import date
+from typing import Any, Dict, List, Optional
 
 import mistralai.client
-from langchain_core.output_parsers import StrOutputParser
+from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
 from langchain_core.prompts import PromptTemplate
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 
 from ..config import get_settings
+from .cache_service import (
+    ResultCache,
+    chunk_embedding_cache,
+    content_key,
+    pack_vector,
+    result_cache,
+    unpack_vector,
+)
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Front matter of a paper sent for metadata extraction
+METADATA_TEXT_CHARS = 4000
+# Rounds of section summaries before the text is truncated to fit
+MAX_MAP_LEVELS = 4
+
+
+def _clean_str(value: Any) -> Optional[str]:
+    """Stripped string, None if the value is not a non-empty string"""
+    return (value.strip() or None) if isinstance(value, str) else None
+
+
+def _clean_list(value: Any) -> List[str]:
+    """Stripped non-empty strings from a list or comma separated string"""
+    if isinstance(value, str):
+        value = value.split(",")
+    if not isinstance(value, list):
+        return []
+    return [
+        item.strip()
+        for item in value
+        if isinstance(item, str) and item.strip()
+    ]
+
+
+def _clean_date(value: Any) -> Optional[str]:
+    """ISO date from a YYYY-MM-DD string, None if it is not one"""
+    try:
+        return date.fromisoformat(str(value)[:10]).isoformat()
+    except ValueError:
+        return None
+
 
 class LLMService:
-    def __init__(self):
+    def __init__(
+        self,
+        llm: Any = None,
+        embeddings: Any = None,
+        cache: Optional[ResultCache] = None,
+        embedding_cache: Optional[ResultCache] = None,
+    ):
         settings = get_settings()
         # Initialize OpenAI if API key is available
-        if settings.openai_api_key:
+        if llm is not None:
+            self.llm = llm
+        elif settings.openai_api_key:
             self.llm = ChatOpenAI(
                 model="gpt-3.5-turbo",
                 temperature=0,
@@ -33,12 +83,33 @@ class LLMService:
         else:
             logger.warning("Mistral API key not found in settings.")
             self.mistral_client = None
-        self.embeddings = OpenAIEmbeddings(
+        self.embeddings = embeddings or OpenAIEmbeddings(
             api_key=settings.openai_api_key,
             model="text-embedding-3-small",  # Most cost-effective embedding model
             dimensions=settings.embedding_dimension,
         )
+        self.cache = cache if cache is not None else result_cache
+        self.embedding_cache = (
+            embedding_cache
+            if embedding_cache is not None
+            else chunk_embedding_cache
+        )
+        # Cumulative chunk embedding cache statistics
+        self.embedding_stats = {"hits": 0, "misses": 0, "bytes_saved": 0}
+        # Shared cap on in-flight chain calls across all documents
+        self.semaphore = asyncio.Semaphore(settings.llm_max_concurrency)
+        # Query embeddings must not wait behind long chain calls
+        self.embedding_semaphore = asyncio.Semaphore(
+            settings.embedding_max_concurrency
+        )
         # Setup prompts
+        self.chunk_summary_prompt = PromptTemplate.from_template(
+            """You are an expert in summarizing academic research papers.
+            Summarize the following section of a research paper.
+            Keep its contributions, methods, results and limitations.
+            {text}
+            Section summary:"""
+        )
         self.summary_prompt = PromptTemplate.from_template(
             """You are an expert in summarizing academic research papers.
             Create a concise but comprehensive summary of the following research paper.
@@ -64,7 +135,31 @@ class LLMService:
             {text}
             Opportunities:"""
         )
+        self.metadata_prompt = PromptTemplate.from_template(
+            """Extract the following information from the start of this
+            research paper:
+            - Title
+            - Authors (as a list)
+            - Publication date (YYYY-MM-DD format, null if not available)
+            - Keywords or topics (as a list of at most 8)
+            Return only a JSON object with these exact keys:
+            "title", "authors", "publication_date", "keywords"
+            {text}
+            JSON:"""
+        )
+        self.qa_prompt = PromptTemplate.from_template(
+            """You are an AI assistant helping to answer questions about research papers.
+            Use the following context to answer the question. If you don't know the answer
+            based on the context, say "I don't have enough information to answer this question."
+            Context:
+            {context}
+            Question: {question}
+            Answer:"""
+        )
         # Setup chains
+        self.chunk_summary_chain = (
+            self.chunk_summary_prompt | self.llm | StrOutputParser()
+        )
         self.summary_chain = self.summary_prompt | self.llm | StrOutputParser()
         self.insights_chain = (
             self.insights_prompt | self.llm | StrOutputParser()
@@ -72,36 +167,330 @@ class LLMService:
         self.opportunities_chain = (
             self.opportunities_prompt | self.llm | StrOutputParser()
         )
+        self.metadata_chain = (
+            self.metadata_prompt | self.llm | JsonOutputParser()
+        )
+        self.qa_chain = self.qa_prompt | self.llm | StrOutputParser()
+
+    @property
+    def model_name(self) -> str:
+        """Name of the chat model, part of every LLM cache key"""
+        return getattr(self.llm, "model_name", type(self.llm).__name__)
+
+    async def _invoke_cached(
+        self, chain: Any, prompt: PromptTemplate, text: str
+    ) -> str:
+        """Invoke a chain, reusing the result for the same prompt and text"""
+        key = content_key("llm", self.model_name, prompt.template, text)
+        result = await self.cache.get(key)
+        if result is None:
+            result = await chain.ainvoke({"text": text})
+            await self.cache.set(key, result)
+        return result
+
+    async def generate_chunk_summary(self, text: str) -> str:
+        """Generate a summary of one section of the document text"""
+        return await self._invoke_cached(
+            self.chunk_summary_chain, self.chunk_summary_prompt, text
+        )
 
     async def generate_summary(self, text: str) -> str:
         """Generate a summary of the document text"""
-        return await self.summary_chain.ainvoke({"text": text})
+        return await self._invoke_cached(
+            self.summary_chain, self.summary_prompt, text
+        )
 
     async def generate_insights(self, text: str) -> str:
         """Generate insights from the document text"""
-        return await self.insights_chain.ainvoke({"text": text})
+        return await self._invoke_cached(
+            self.insights_chain, self.insights_prompt, text
+        )
 
     async def generate_opportunities(self, text: str) -> str:
         """Generate opportunities from the document text"""
-        return await self.opportunities_chain.ainvoke({"text": text})
-
-    async def process_document(self, text: str) -> Dict[str, str]:
-        """Process document text to generate summary, insights and opportunities"""
-        # Truncate text if too large (OpenAI has context limits)
-        if len(text) > 25000:  # Arbitrary limit to fit in context window
-            text = text[:25000]
-        summary = await self.generate_summary(text)
-        insights = await self.generate_insights(text)
-        opportunities = await self.generate_opportunities(text)
+        return await self._invoke_cached(
+            self.opportunities_chain, self.opportunities_prompt, text
+        )
+
+    async def generate_metadata(self, text: str) -> Any:
+        """Generate the JSON metadata of the document text"""
+        return await self._invoke_cached(
+            self.metadata_chain, self.metadata_prompt, text
+        )
+
+    async def extract_metadata(self, text: str) -> Dict[str, Any]:
+        """
+        Extract bibliographic metadata from the start of the document text
+        Args:
+            text: Full document text
+        Returns:
+            Dictionary with "title", "authors", "publication_date" and
+            "keywords". Fields that could not be extracted are None or
+            empty, and a failed call only logs a warning.
+        """
+        try:
+            result = await self._run_chain(
+                self.generate_metadata, text[:METADATA_TEXT_CHARS]
+            )
+        except Exception as e:
+            logger.warning(f"LLM metadata extraction failed: {e}")
+            result = {}
+        if not isinstance(result, dict):
+            result = {}
         return {
-            "summary": summary,
-            "insights": insights,
-            "opportunities": opportunities,
+            "title": _clean_str(result.get("title")),
+            "authors": _clean_list(result.get("authors")),
+            "publication_date": _clean_date(result.get("publication_date")),
+            "keywords": _clean_list(result.get("keywords")),
+        }
+
+    async def _run_chain(
+        self, generate: Callable[[str], Awaitable[str]], text: str
+    ) -> str:
+        """Run a single generation under the concurrency cap and timeout"""
+        async with self.semaphore:
+            timeout = settings.llm_call_timeout or None
+            return await asyncio.wait_for(generate(text), timeout=timeout)
+
+    def count_tokens(self, text: str) -> int:
+        """Count model tokens in text, estimating without a tokenizer"""
+        try:
+            return self.llm.get_num_tokens(text)
+        except Exception:
+            return len(text) // 4 + 1
+
+    def pack_chunks(self, chunks: List[str], budget: int) -> List[str]:
+        """Greedily join consecutive chunks into texts of budget tokens"""
+        packed = []
+        current: List[str] = []
+        current_tokens = 0
+        for chunk in chunks:
+            tokens = self.count_tokens(chunk)
+            if current and current_tokens + tokens > budget:
+                packed.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(chunk)
+            current_tokens += tokens
+        if current:
+            packed.append("\n\n".join(current))
+        return packed
+
+    async def condense(
+        self, text: str, chunks: List[str], metrics: Dict[str, int]
+    ) -> str:
+        """
+        Map-reduce text until it fits into a single call's token budget
+        Args:
+            text: Full document text
+            chunks: Document text split into chunks
+            metrics: Counters updated with map calls and tokens sent
+        Returns:
+            The text itself if it fits, otherwise joined section summaries
+        """
+        budget = settings.llm_max_input_tokens
+        previous_groups = None
+        for _ in range(MAX_MAP_LEVELS):
+            if self.count_tokens(text) <= budget:
+                return text
+            groups = self.pack_chunks(chunks, budget)
+            if previous_groups is not None and len(groups) >= previous_groups:
+                # Summaries are as long as their sections, so another round
+                # would not shrink the text
+                break
+            previous_groups = len(groups)
+            metrics["map_levels"] += 1
+            metrics["map_calls"] += len(groups)
+            metrics["tokens_sent"] += sum(map(self.count_tokens, groups))
+            outcomes = await asyncio.gather(
+                *(
+                    self._run_chain(self.generate_chunk_summary, group)
+                    for group in groups
+                ),
+                return_exceptions=True,
+            )
+            chunks = []
+            for outcome in outcomes:
+                if isinstance(outcome, BaseException):
+                    logger.warning(f"LLM section summary failed: {outcome}")
+                else:
+                    chunks.append(outcome)
+            if not chunks:
+                raise RuntimeError("All LLM section summaries failed")
+            text = "\n\n".join(chunks)
+        if self.count_tokens(text) > budget:
+            logger.warning(
+                "Section summaries do not fit the token budget, truncating"
+            )
+            text = self.truncate(text, budget)
+        return text
+
+    def truncate(self, text: str, budget: int) -> str:
+        """Cut text to at most budget tokens"""
+        while text and self.count_tokens(text) > budget:
+            # Shrink in proportion to the excess, slightly past it
+            ratio = budget / self.count_tokens(text)
+            text = text[: int(len(text) * ratio * 0.95)]
+        return text
+
+    async def process_document(
+        self,
+        text: str,
+        chunks: Optional[List[str]] = None,
+        concurrent: Optional[bool] = None,
+    ) -> Dict[str, Any]:
+        """
+        Process document text to generate summary, insights and opportunities
+        Args:
+            text: Full document text
+            chunks: Document text split into chunks, normally by
+                VectorService.text_splitter. Used when the text is too
+                long for one call; defaults to fixed-size windows.
+            concurrent: Run the three chains together (defaults to settings)
+        Returns:
+            Dictionary with the three results, an "errors" mapping and
+            token "metrics". A chain that fails or times out is None in
+            the results, so one failure does not discard the others.
+        """
+        if chunks is None:
+            chunks = [text[i : i + 4000] for i in range(0, len(text), 4000)]
+        metrics = {
+            "map_levels": 0,
+            "map_calls": 0,
+            "tokens_sent": 0,
+            # Tokens the previous text[:25000] truncation sent to three chains
+            "truncation_tokens": 3 * self.count_tokens(text[:25000]),
         }
+        text = await self.condense(text, chunks, metrics)
+        metrics["tokens_sent"] += 3 * self.count_tokens(text)
+        if concurrent is None:
+            concurrent = settings.llm_concurrent_mode
+        generators = {
+            "summary": self.generate_summary,
+            "insights": self.generate_insights,
+            "opportunities": self.generate_opportunities,
+        }
+        if concurrent:
+            outcomes = await asyncio.gather(
+                *(
+                    self._run_chain(generate, text)
+                    for generate in generators.values()
+                ),
+                return_exceptions=True,
+            )
+        else:
+            outcomes = []
+            for generate in generators.values():
+                try:
+                    outcomes.append(await self._run_chain(generate, text))
+                except Exception as e:
+                    outcomes.append(e)
+        results: Dict[str, Any] = {"errors": {}, "metrics": metrics}
+        for name, outcome in zip(generators, outcomes):
+            if isinstance(outcome, BaseException):
+                if isinstance(outcome, asyncio.TimeoutError):
+                    outcome = "timed out"
+                logger.warning(f"LLM {name} generation failed: {outcome}")
+                results[name] = None
+                results["errors"][name] = str(outcome)
+            else:
+                results[name] = outcome
+        if len(results["errors"]) == len(generators):
+            raise RuntimeError(
+                f"All LLM generations failed: {results['errors']}"
+            )
+        return results
 
-    async def create_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Create embeddings for text chunks"""
-        return await self.embeddings.aembed_documents(texts)
+    def _embedding_key(self, text: str) -> str:
+        return content_key(
+            "embedding",
+            getattr(self.embeddings, "model", ""),
+            str(settings.embedding_dimension),
+            text,
+        )
+
+    def _batch_texts(self, texts: List[str]) -> List[List[str]]:
+        """Split texts into requests bounded by chunk count and tokens"""
+        batches: List[List[str]] = []
+        batch: List[str] = []
+        batch_tokens = 0
+        for text in texts:
+            tokens = self.count_tokens(text)
+            if batch and (
+                len(batch) >= settings.embedding_batch_size
+                or batch_tokens + tokens > settings.embedding_batch_tokens
+            ):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        async with self.embedding_semaphore:
+            return await self.embeddings.aembed_documents(texts)
+
+    async def create_embeddings(
+        self, texts: List[str], stats: Optional[Dict[str, int]] = None
+    ) -> List[List[float]]:
+        """
+        Create embeddings for text chunks, reusing cached chunk embeddings
+        Args:
+            texts: Text chunks to embed
+            stats: Optional counters updated with hits, misses and the
+                bytes of chunk text that were not sent to the provider
+        Returns:
+            One embedding per text, in order
+        """
+        keys = [self._embedding_key(text) for text in texts]
+        cached = await asyncio.gather(
+            *(self.embedding_cache.get(key) for key in keys)
+        )
+        embeddings: List[Optional[List[float]]] = [
+            unpack_vector(packed) if packed is not None else None
+            for packed in cached
+        ]
+        # Embed each distinct missing text once, in concurrent batches
+        missing = list(
+            dict.fromkeys(
+                text
+                for text, embedding in zip(texts, embeddings)
+                if embedding is None
+            )
+        )
+        batches = self._batch_texts(missing)
+        batch_results = await asyncio.gather(
+            *(self._embed_batch(batch) for batch in batches)
+        )
+        fetched = {}
+        for batch, vectors in zip(batches, batch_results):
+            fetched.update(zip(batch, vectors))
+        await asyncio.gather(
+            *(
+                self.embedding_cache.set(
+                    self._embedding_key(text), pack_vector(vector)
+                )
+                for text, vector in fetched.items()
+            )
+        )
+        hits = 0
+        bytes_saved = 0
+        for i, text in enumerate(texts):
+            if embeddings[i] is None:
+                embeddings[i] = fetched[text]
+            else:
+                hits += 1
+                bytes_saved += len(text.encode("utf-8"))
+        for counters in (self.embedding_stats, stats):
+            if counters is None:
+                continue
+            counters["hits"] = counters.get("hits", 0) + hits
+            counters["misses"] = counters.get("misses", 0) + len(missing)
+            counters["bytes_saved"] = (
+                counters.get("bytes_saved", 0) + bytes_saved
+            )
+        return embeddings
 
     async def answer_question(
         self, question: str, context_chunks: List[str]
@@ -109,20 +498,21 @@ class LLMService:
         """Answer a question using retrieved context chunks"""
         # Combine context chunks
         context = "\n\n".join(context_chunks)
-        qa_prompt = PromptTemplate.from_template(
-            """You are an AI assistant helping to answer questions about research papers.
-            Use the following context to answer the question. If you don't know the answer
-            based on the context, say "I don't have enough information to answer this question."
-            Context:
-            {context}
-            Question: {question}
-            Answer:"""
-        )
-        qa_chain = qa_prompt | self.llm | StrOutputParser()
-        return await qa_chain.ainvoke(
+        return await self.qa_chain.ainvoke(
             {"context": context, "question": question}
         )
 
+    async def stream_answer(
+        self, question: str, context_chunks: List[str]
+    ) -> AsyncIterator[str]:
+        """Answer a question, yielding tokens as the model produces them"""
+        context = "\n\n".join(context_chunks)
+        async for token in self.qa_chain.astream(
+            {"context": context, "question": question}
+        ):
+            if token:
+                yield token
+
 
 # Initialize LLM service singleton
 llm_service = LLMService()
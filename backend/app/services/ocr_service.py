@@ -1,114 +1,320 @@
+import asyncio
 import base64
-import tempfile
-from typing import Dict, Optional
+import hashlib
+import io
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 from mistralai import Mistral
+from PyPDF2 import PdfReader, PdfWriter
 
 from ..config import get_settings
+from .cache_service import ResultCache, content_key, create_cache, result_cache
 
+logger = logging.getLogger(__name__)
 settings = get_settings()
 
 
+OCR_MODEL = "mistral-ocr-latest"
+
+
+# Characters expected in the text layer of a page of prose
+PRINTABLE_PUNCTUATION = set(".,;:!?'\"()[]{}-+=*/<>%$&@#_|~^")
+
+
+def extract_text_layer(pdf_content: bytes) -> List[str]:
+    """
+    Extract the embedded text layer of each page, run in a process pool
+    Args:
+        pdf_content: Binary PDF content
+    Returns:
+        Text of each page, empty for pages without a text layer
+    """
+    reader = PdfReader(io.BytesIO(pdf_content))
+    page_texts = []
+    for page in reader.pages:
+        try:
+            page_texts.append(page.extract_text() or "")
+        except Exception:
+            page_texts.append("")
+    return page_texts
+
+
+def count_pages(pdf_content: bytes) -> int:
+    """Number of pages in a PDF"""
+    return len(PdfReader(io.BytesIO(pdf_content)).pages)
+
+
+def score_page_text(text: str) -> float:
+    """
+    Score the quality of a page's text layer
+    Args:
+        text: Text extracted from the page
+    Returns:
+        Score between 0 and 1, the character density relative to
+        settings.ocr_local_min_chars times the share of non-garbage characters
+    """
+    characters = [c for c in text if not c.isspace()]
+    if not characters:
+        return 0.0
+    # Unmapped glyphs come out as (cid:NN), replacement or control characters
+    garbage = text.count("(cid:") * 8 + sum(
+        1
+        for c in characters
+        if not (c.isalnum() or c in PRINTABLE_PUNCTUATION)
+    )
+    garbage_ratio = min(1.0, garbage / len(characters))
+    density = min(1.0, len(characters) / settings.ocr_local_min_chars)
+    return density * (1.0 - garbage_ratio)
+
+
+def split_pdf(
+    pdf_content: bytes, pages: List[int], pages_per_range: int
+) -> List[Tuple[List[int], bytes]]:
+    """
+    Split pages of a PDF into standalone PDFs of consecutive pages
+    Args:
+        pdf_content: Binary PDF content
+        pages: Sorted indexes of the pages to include
+        pages_per_range: Maximum pages in each part
+    Returns:
+        List of (page indexes, part PDF content), in page order.
+        A PDF that fits in one range is returned unchanged.
+    """
+    reader = PdfReader(io.BytesIO(pdf_content))
+    if len(pages) == len(reader.pages) <= pages_per_range:
+        return [(pages, pdf_content)]
+    groups: List[List[int]] = []
+    for index in pages:
+        group = groups[-1] if groups else None
+        if group and group[-1] == index - 1 and len(group) < pages_per_range:
+            group.append(index)
+        else:
+            groups.append([index])
+    ranges = []
+    for group in groups:
+        writer = PdfWriter()
+        for index in group:
+            writer.add_page(reader.pages[index])
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        ranges.append((group, buffer.getvalue()))
+    return ranges
+
+
 class OCRService:
-    def __init__(self):
-        self.client = Mistral(api_key=settings.mistral_api_key)
+    def __init__(
+        self,
+        client: Any = None,
+        cache: Optional[ResultCache] = None,
+        page_cache: Optional[ResultCache] = None,
+    ):
+        self.client = client or Mistral(api_key=settings.mistral_api_key)
+        self.cache = cache if cache is not None else result_cache
+        # Pages of unfinished documents, kept apart so they never evict
+        # whole results
+        if page_cache is None:
+            page_cache = create_cache(
+                settings.ocr_page_cache_entries, "ocr-pages"
+            )
+        self.page_cache = page_cache
+        # Rate limit on concurrent OCR requests across all documents
+        self.semaphore = asyncio.Semaphore(settings.ocr_max_concurrency)
+        self._local_pool: Optional[ProcessPoolExecutor] = None
+        # Pages extracted from the text layer and by remote OCR
+        self.page_stats = {"local_pages": 0, "remote_pages": 0}
+
+    async def close(self) -> None:
+        """Shut down the text layer process pool"""
+        if self._local_pool is not None:
+            pool, self._local_pool = self._local_pool, None
+            await asyncio.to_thread(pool.shutdown)
+
+    async def _extract_text_layer(self, pdf_content: bytes) -> List[str]:
+        """Extract the text layer in the process pool, off the event loop"""
+        if self._local_pool is None:
+            self._local_pool = ProcessPoolExecutor(
+                max_workers=settings.ocr_local_workers
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._local_pool, extract_text_layer, pdf_content
+        )
+
+    @staticmethod
+    def _page_key(pdf_hash: str, index: int) -> str:
+        return content_key("ocr-page", OCR_MODEL, pdf_hash, str(index))
 
-    async def process_pdf(self, pdf_content: bytes) -> Optional[str]:
+    async def _ocr_range(
+        self, pdf_hash: str, pages: List[int], range_pdf: bytes
+    ) -> List[str]:
         """
-        Process PDF using Mistral OCR API
+        OCR one page range, caching each page so a failed range can be
+        retried without redoing the others
+        """
+        keys = [self._page_key(pdf_hash, index) for index in pages]
+        cached = await asyncio.gather(
+            *(self.page_cache.get(key) for key in keys)
+        )
+        if all(text is not None for text in cached):
+            return cached
+        document = {
+            "type": "document_base64",
+            "document_base64": base64.b64encode(range_pdf).decode("utf-8"),
+        }
+        for attempt in range(settings.ocr_max_retries + 1):
+            try:
+                async with self.semaphore:
+                    ocr_response = await self.client.ocr.process_async(
+                        model=OCR_MODEL,
+                        document=document,
+                        include_image_base64=False,
+                    )
+                if len(ocr_response.pages) != len(pages):
+                    raise ValueError(
+                        f"OCR of pages {pages[0]}-{pages[-1]} returned "
+                        f"{len(ocr_response.pages)} pages"
+                    )
+                break
+            except Exception as e:
+                if attempt == settings.ocr_max_retries:
+                    raise
+                logger.warning(
+                    f"OCR of pages {pages[0]}-{pages[-1]} "
+                    f"failed, retrying: {e}"
+                )
+                await asyncio.sleep(2**attempt)
+        page_texts = [
+            "".join(block.text + "\n" for block in page.blocks)
+            for page in ocr_response.pages
+        ]
+        await asyncio.gather(
+            *(
+                self.page_cache.set(key, text)
+                for key, text in zip(keys, page_texts)
+            )
+        )
+        return page_texts
+
+    async def iter_pages(
+        self, pdf_content: bytes, stats: Optional[Dict[str, int]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream the text of a PDF page by page, in page order
+        Pages with a good embedded text layer are extracted locally; the
+        rest are split into page ranges that are OCRed concurrently. Each
+        page is yielded as soon as every earlier page is ready. The text is
+        stripped of leading and trailing whitespace.
         Args:
             pdf_content: Binary PDF content
-        Returns:
-            Extracted text as string or None if processing failed
+            stats: Optional dict receiving local_pages and remote_pages
+        Yields:
+            Text of consecutive pages
         """
+        # Identical PDFs reuse the previous OCR result
+        cache_key = content_key("ocr", OCR_MODEL, pdf_content)
+        cached_text = await self.cache.get(cache_key)
+        if cached_text is not None:
+            if cached_text:
+                yield cached_text
+            return
+        pdf_hash = hashlib.sha256(pdf_content).hexdigest()
+        if settings.ocr_local_text:
+            page_texts = await self._extract_text_layer(pdf_content)
+        else:
+            page_texts = [""] * await asyncio.to_thread(
+                count_pages, pdf_content
+            )
+        remote_pages = [
+            index
+            for index, text in enumerate(page_texts)
+            if score_page_text(text) < settings.ocr_local_min_quality
+        ]
+        ranges = []
+        if remote_pages:
+            ranges = await asyncio.to_thread(
+                split_pdf,
+                pdf_content,
+                remote_pages,
+                settings.ocr_pages_per_range,
+            )
+        tasks = [
+            asyncio.create_task(self._ocr_range(pdf_hash, pages, range_pdf))
+            for pages, range_pdf in ranges
+        ]
+        # Range task and position in the range of each remote page
+        remote = {
+            index: (task, position)
+            for task, (pages, _) in zip(tasks, ranges)
+            for position, index in enumerate(pages)
+        }
+        pieces: List[str] = []
+        # Trailing whitespace is held back until more text follows
+        pending = ""
         try:
-            # Create a temporary file for the PDF
-            with tempfile.NamedTemporaryFile(
-                suffix=".pdf", delete=False
-            ) as temp_pdf:
-                temp_pdf.write(pdf_content)
-                temp_pdf_path = temp_pdf.name
-            # Convert PDF to base64
-            with open(temp_pdf_path, "rb") as pdf_file:
-                pdf_base64 = base64.b64encode(pdf_file.read()).decode("utf-8")
-            # Process with Mistral OCR
-            ocr_response = self.client.ocr.process(
-                model="mistral-ocr-latest",
-                document={
-                    "type": "document_base64",
-                    "document_base64": pdf_base64,
-                },
-                include_image_base64=False,
+            for index, text in enumerate(page_texts):
+                if index in remote:
+                    task, position = remote[index]
+                    range_texts = await task
+                    text, range_texts[position] = range_texts[position], ""
+                else:
+                    # Match the line ending OCR gives each block
+                    text = text.rstrip() + "\n"
+                # Release pages as they are yielded
+                page_texts[index] = ""
+                if not pieces:
+                    text = text.lstrip()
+                body = text.rstrip()
+                if not body:
+                    pending += text
+                    continue
+                pieces.append(pending + body)
+                pending = text[len(body) :]
+                yield pieces[-1]
+        except Exception:
+            # Let the other ranges finish, so a retry only redoes this one
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            for task in tasks:
+                task.cancel()
+        counts = {
+            "local_pages": len(page_texts) - len(remote_pages),
+            "remote_pages": len(remote_pages),
+        }
+        for counters in (self.page_stats, stats):
+            if counters is not None:
+                for name, count in counts.items():
+                    counters[name] = counters.get(name, 0) + count
+        if pieces:
+            await self.cache.set(cache_key, "".join(pieces))
+        # The whole text is cached, so the pages are no longer needed
+        await asyncio.gather(
+            *(
+                self.page_cache.delete(self._page_key(pdf_hash, index))
+                for index in remote_pages
             )
-            # Extract text from response
-            extracted_text = ""
-            for page in ocr_response.pages:
-                for block in page.blocks:
-                    extracted_text += block.text + "\n"
-            return extracted_text.strip()
-        except Exception as e:
-            print(f"PDF processing error: {e}")
-            return None
+        )
 
-    async def extract_metadata(self, text: str) -> Dict:
+    async def process_pdf(
+        self, pdf_content: bytes, stats: Optional[Dict[str, int]] = None
+    ) -> Optional[str]:
         """
-        Extract metadata from the OCR text using Mistral AI
+        Process PDF using Mistral OCR API
         Args:
-            text: OCRed text from PDF
+            pdf_content: Binary PDF content
+            stats: Optional dict receiving local_pages and remote_pages
         Returns:
-            Dictionary with extracted metadata
+            Extracted text as string or None if processing failed
         """
         try:
-            # Use Mistral to extract metadata from text
-            prompt = f"""
-            Extract the following information from this research paper text:
-            - Title
-            - Authors (as a list)
-            - Publication date (YYYY-MM-DD format if available)
-            - Abstract summary (first 200 words)
-            - Keywords or topics
-            Return the information in JSON format with these exact keys:
-            "title", "authors", "publication_date", "abstract", "keywords"
-            Here is the text:
-            {text[:2000]}  # Using first 2000 chars as that's usually enough for metadata
-            """
-            response = self.client.chat(
-                model="mistral-large-latest",
-                messages=[{"role": "user", "content": prompt}],
-            )
-            extracted_text = response.choices[0].message.content
-            # Parse the JSON response
-            import json
-            import re
-
-            # Find JSON block in the response
-            json_match = re.search(
-                r"```json\n(.*?)\n```", extracted_text, re.DOTALL
+            return "".join(
+                [text async for text in self.iter_pages(pdf_content, stats)]
             )
-            if json_match:
-                json_str = json_match.group(1)
-            else:
-                json_str = extracted_text
-            # Clean up any non-JSON content
-            json_str = re.sub(r"^[^{\[]+", "", json_str)
-            json_str = re.sub(r"[^}\]]+$", "", json_str)
-            metadata = json.loads(json_str)
-            # Ensure required fields exist
-            metadata.setdefault("title", "Untitled Document")
-            metadata.setdefault("authors", [])
-            metadata.setdefault("publication_date", None)
-            metadata.setdefault("abstract", "")
-            metadata.setdefault("keywords", [])
-            return metadata
         except Exception as e:
-            print(f"Metadata extraction error: {e}")
-            return {
-                "title": "Untitled Document",
-                "authors": [],
-                "publication_date": None,
-                "abstract": "",
-                "keywords": [],
-            }
+            print(f"PDF processing error: {e}")
+            return None
 
 
 # Initialize OCR service singleton
@@ -0,0 +1,271 @@
+import abc
+import asyncio
+import json
+import logging
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
+from uuid import UUID
+
+import aioboto3
+
+from ..config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+@dataclass
+class Job:
+    """A document waiting to be processed"""
+
+    document_id: str
+    attempts: int = 1
+    enqueued_at: float = 0.0
+    # Backend handle used to acknowledge or retry the job
+    receipt: Any = None
+
+
+class ProcessingMetrics:
+    """In-process counters for queue depth and per-stage latency"""
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.queue_depth = 0
+
+    def record(self, stage: str, seconds: float) -> None:
+        """Record one timing for a stage"""
+        stats = self.stages.setdefault(
+            stage, {"count": 0, "total": 0.0, "max": 0.0}
+        )
+        stats["count"] += 1
+        stats["total"] += seconds
+        stats["max"] = max(stats["max"], seconds)
+
+    @asynccontextmanager
+    async def time_stage(self, stage: str) -> AsyncIterator[None]:
+        """Time the wrapped block as one run of a stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current queue depth and mean/max latency per stage"""
+        return {
+            "queue_depth": self.queue_depth,
+            "stages": {
+                stage: {
+                    "count": int(stats["count"]),
+                    "mean": stats["total"] / stats["count"],
+                    "max": stats["max"],
+                }
+                for stage, stats in self.stages.items()
+            },
+        }
+
+
+class ProcessingQueue(abc.ABC):
+    """Interface shared by the queue backends"""
+
+    @abc.abstractmethod
+    async def enqueue(self, document_id: UUID) -> None:
+        """Add a document to the queue"""
+
+    @abc.abstractmethod
+    async def receive(self, wait_seconds: int = 20) -> List[Job]:
+        """Wait up to wait_seconds for jobs, hiding them from other workers"""
+
+    @abc.abstractmethod
+    async def ack(self, job: Job) -> None:
+        """Remove a successfully processed job"""
+
+    @abc.abstractmethod
+    async def retry(self, job: Job, delay: int) -> None:
+        """Make a failed job visible again after delay seconds"""
+
+    @abc.abstractmethod
+    async def extend(self, job: Job, seconds: int) -> None:
+        """Keep a job that is still being processed hidden for seconds"""
+
+    @abc.abstractmethod
+    async def dead_letter(self, job: Job, error: str) -> None:
+        """Move a job that keeps failing out of the queue"""
+
+    @abc.abstractmethod
+    async def depth(self) -> int:
+        """Number of jobs waiting or in flight"""
+
+    async def close(self) -> None:
+        """Release client resources"""
+
+
+class InMemoryQueue(ProcessingQueue):
+    """
+    Queue held in the API process, for local development. Jobs are lost if
+    the process exits.
+    """
+
+    def __init__(self):
+        self.queue: "asyncio.Queue[Job]" = asyncio.Queue()
+        self.in_flight = 0
+        self.dead_letters: List[Dict[str, Any]] = []
+
+    async def enqueue(self, document_id: UUID) -> None:
+        await self.queue.put(Job(str(document_id), enqueued_at=time.time()))
+
+    async def receive(self, wait_seconds: int = 20) -> List[Job]:
+        try:
+            job = await asyncio.wait_for(self.queue.get(), wait_seconds)
+        except asyncio.TimeoutError:
+            return []
+        self.in_flight += 1
+        return [job]
+
+    async def ack(self, job: Job) -> None:
+        self.in_flight -= 1
+
+    async def retry(self, job: Job, delay: int) -> None:
+        self.in_flight -= 1
+        retried = Job(job.document_id, job.attempts + 1, job.enqueued_at)
+        asyncio.get_running_loop().call_later(
+            delay, self.queue.put_nowait, retried
+        )
+
+    async def extend(self, job: Job, seconds: int) -> None:
+        # Received jobs are never redelivered while the process is alive
+        pass
+
+    async def dead_letter(self, job: Job, error: str) -> None:
+        self.in_flight -= 1
+        self.dead_letters.append(
+            {"document_id": job.document_id, "error": error}
+        )
+
+    async def depth(self) -> int:
+        return self.queue.qsize() + self.in_flight
+
+
+class SQSQueue(ProcessingQueue):
+    """
+    Durable queue on SQS. A received job stays hidden for the visibility
+    timeout, so work from a crashed worker is redelivered automatically.
+    """
+
+    def __init__(self, queue_url: str, dead_letter_queue_url: str = ""):
+        self.queue_url = queue_url
+        self.dead_letter_queue_url = dead_letter_queue_url
+        self.session = aioboto3.Session()
+        self._exit_stack: Optional[AsyncExitStack] = None
+        self._sqs = None
+        self._client_lock = asyncio.Lock()
+
+    async def _client(self):
+        """Open the shared SQS client on first use"""
+        async with self._client_lock:
+            if self._exit_stack is None:
+                kwargs = {
+                    "region_name": settings.aws_region,
+                    "aws_access_key_id": settings.aws_access_key_id,
+                    "aws_secret_access_key": settings.aws_secret_access_key,
+                }
+                if settings.dev_mode and settings.sqs_endpoint:
+                    kwargs["endpoint_url"] = settings.sqs_endpoint
+                exit_stack = AsyncExitStack()
+                self._sqs = await exit_stack.enter_async_context(
+                    self.session.client("sqs", **kwargs)
+                )
+                self._exit_stack = exit_stack
+        return self._sqs
+
+    async def enqueue(self, document_id: UUID) -> None:
+        sqs = await self._client()
+        await sqs.send_message(
+            QueueUrl=self.queue_url,
+            MessageBody=json.dumps({"document_id": str(document_id)}),
+        )
+
+    async def receive(self, wait_seconds: int = 20) -> List[Job]:
+        sqs = await self._client()
+        response = await sqs.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=1,
+            WaitTimeSeconds=wait_seconds,
+            VisibilityTimeout=settings.queue_visibility_timeout,
+            AttributeNames=["ApproximateReceiveCount", "SentTimestamp"],
+        )
+        return [
+            Job(
+                document_id=json.loads(message["Body"])["document_id"],
+                attempts=int(message["Attributes"]["ApproximateReceiveCount"]),
+                enqueued_at=int(message["Attributes"]["SentTimestamp"]) / 1000,
+                receipt=message["ReceiptHandle"],
+            )
+            for message in response.get("Messages", [])
+        ]
+
+    async def ack(self, job: Job) -> None:
+        sqs = await self._client()
+        await sqs.delete_message(
+            QueueUrl=self.queue_url, ReceiptHandle=job.receipt
+        )
+
+    async def retry(self, job: Job, delay: int) -> None:
+        sqs = await self._client()
+        # SQS caps the visibility timeout at 12 hours
+        await sqs.change_message_visibility(
+            QueueUrl=self.queue_url,
+            ReceiptHandle=job.receipt,
+            VisibilityTimeout=min(delay, 43200),
+        )
+
+    async def extend(self, job: Job, seconds: int) -> None:
+        sqs = await self._client()
+        await sqs.change_message_visibility(
+            QueueUrl=self.queue_url,
+            ReceiptHandle=job.receipt,
+            VisibilityTimeout=min(seconds, 43200),
+        )
+
+    async def dead_letter(self, job: Job, error: str) -> None:
+        sqs = await self._client()
+        if self.dead_letter_queue_url:
+            await sqs.send_message(
+                QueueUrl=self.dead_letter_queue_url,
+                MessageBody=json.dumps(
+                    {"document_id": job.document_id, "error": error}
+                ),
+            )
+        await self.ack(job)
+
+    async def depth(self) -> int:
+        sqs = await self._client()
+        response = await sqs.get_queue_attributes(
+            QueueUrl=self.queue_url,
+            AttributeNames=[
+                "ApproximateNumberOfMessages",
+                "ApproximateNumberOfMessagesNotVisible",
+            ],
+        )
+        return sum(int(value) for value in response["Attributes"].values())
+
+    async def close(self) -> None:
+        if self._exit_stack is not None:
+            await self._exit_stack.aclose()
+            self._exit_stack = None
+
+
+def create_queue() -> ProcessingQueue:
+    """Create the queue backend selected in settings"""
+    if settings.queue_backend == "sqs":
+        return SQSQueue(
+            settings.sqs_queue_url, settings.sqs_dead_letter_queue_url
+        )
+    return InMemoryQueue()
+
+
+# Initialize processing queue and metrics singletons
+processing_queue = create_queue()
+processing_metrics = ProcessingMetrics()
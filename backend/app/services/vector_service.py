@@ -1,77 +1,298 @@
+import asyncio
+import logging
 import uuid
-from typing import Dict, List
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
-import pinecone
+import numpy as np
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 from ..config import get_settings
+from ..database import storage
+from . import vector_store
+from .cache_service import MemoryCache
+from .chunk_store import ChunkStore, pack_context
+from .lexical_index import LexicalIndex
 from .llm_service import llm_service
 
+logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Namespace holding one centroid vector per document for corpus search
+CENTROIDS_NAMESPACE = "centroids"
+
+# Characters of chunk text stored in vector metadata and returned
+CHUNK_TEXT_CHARS = 1000
+
+# S3 prefixes of the per-document indexes
+LEXICAL_INDEX = "indexes"
+CHUNK_STORE = "chunks"
+
+
+def centroid(embeddings: List[List[float]]) -> List[float]:
+    """Mean direction of a document's chunk embeddings"""
+    matrix = vector_store.normalize_rows(np.array(embeddings, np.float32))
+    return matrix.mean(axis=0).tolist()
+
+
+def reciprocal_rank_fusion(
+    rankings: List[List[int]], k: int
+) -> List[Tuple[int, float]]:
+    """
+    Fuse rankings by reciprocal rank, which needs no score calibration
+    between retrievers
+    Args:
+        rankings: Chunk IDs of each retriever, best first
+        k: Damping constant, larger values flatten the rank weights
+    Returns:
+        (chunk ID, score) pairs, best first. Scores are scaled so a chunk
+        ranked first by every retriever scores 1.0.
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1 / (k + rank + 1)
+    best = len(rankings) / (k + 1)
+    fused = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    return [(chunk_id, score / best) for chunk_id, score in fused]
+
 
 class VectorService:
-    def __init__(self):
-        # Initialize Pinecone
-        self._initialize_pinecone()
+    def __init__(self, store: Optional[vector_store.VectorStore] = None):
+        # Initialize the vector store selected in settings
+        self.store = store or vector_store.create_vector_store()
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000, chunk_overlap=200
         )
-
-    def _initialize_pinecone(self):
-        """Initialize Pinecone client and index"""
-        pinecone.init(
-            api_key=settings.pinecone_api_key,
-            environment=settings.pinecone_environment,
+        # Lexical indexes and chunk stores loaded from S3, by document ID
+        self.lexical_indexes = MemoryCache(
+            settings.lexical_index_cache_size,
+            settings.lexical_index_cache_ttl,
+        )
+        self.chunk_stores = MemoryCache(
+            settings.lexical_index_cache_size,
+            settings.lexical_index_cache_ttl,
         )
-        # Create index if it doesn't exist
-        if settings.pinecone_index_name not in pinecone.list_indexes():
-            pinecone.create_index(
-                name=settings.pinecone_index_name,
-                dimension=settings.embedding_dimension,
-                metric="cosine",
-            )
-        self.index = pinecone.Index(settings.pinecone_index_name)
 
-    async def index_document(self, document_id: uuid.UUID, text: str) -> int:
+    async def index_document(
+        self,
+        document_id: uuid.UUID,
+        text: str,
+        chunks: Optional[List[str]] = None,
+    ) -> int:
         """
-        Split document text into chunks, create embeddings, and index in Pinecone
+        Split document text into chunks, create embeddings, and index them
         Args:
             document_id: UUID of the document
             text: Full text content of the document
+            chunks: Text already split by text_splitter, to avoid re-splitting
         Returns:
             Number of chunks indexed
         """
         # Split text into chunks
-        chunks = self.text_splitter.split_text(text)
-        # Create embeddings for chunks
-        embeddings = await llm_service.create_embeddings(chunks)
-        # Prepare vectors for Pinecone
+        if chunks is None:
+            chunks = self.text_splitter.split_text(text)
+        # Create embeddings for chunks, reusing cached chunk embeddings,
+        # while the lexical index and chunk store are built and stored
+        stats: Dict[str, int] = {}
+        embeddings, _, _ = await asyncio.gather(
+            llm_service.create_embeddings(chunks, stats),
+            self.save_lexical_index(document_id, chunks),
+            self.save_chunk_store(document_id, text, chunks),
+        )
+        if chunks:
+            logger.info(
+                f"Embedding cache for {document_id}: "
+                f"{stats['hits'] / len(chunks):.0%} hit rate, "
+                f"{stats['bytes_saved']} bytes not re-embedded"
+            )
+        # Prepare vectors for the vector store
         vectors = []
         for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            chunk_id = f"{document_id}_{i}"
             vectors.append(
                 {
-                    "id": chunk_id,
+                    "id": vector_store.vector_id(str(document_id), i),
                     "values": embedding,
                     "metadata": {
                         "document_id": str(document_id),
                         "chunk_id": i,
-                        "chunk_text": chunk[
-                            :1000
-                        ],  # Store first 1000 chars of text in metadata
+                        "chunk_text": chunk[:CHUNK_TEXT_CHARS],
                     },
                 }
             )
-        # Insert vectors in batches (Pinecone has limits)
-        batch_size = 100
-        for i in range(0, len(vectors), batch_size):
-            batch = vectors[i : i + batch_size]
-            self.index.upsert(vectors=batch)
+        # Each document has its own namespace, replaced whole so vectors of
+        # chunks beyond a shorter re-index do not linger
+        await self.store.replace(str(document_id), vectors)
+        await self.upsert_centroid(str(document_id), embeddings)
         return len(chunks)
 
+    async def upsert_centroid(
+        self, document_id: str, embeddings: List[List[float]]
+    ) -> None:
+        """Store the centroid used to find the document in corpus search"""
+        if not embeddings:
+            return
+        await self.store.upsert(
+            CENTROIDS_NAMESPACE,
+            [
+                {
+                    "id": document_id,
+                    "values": centroid(embeddings),
+                    "metadata": {"document_id": document_id},
+                }
+            ],
+        )
+
+    async def _save_index(
+        self,
+        cache: MemoryCache,
+        document_id: uuid.UUID,
+        index_type: str,
+        index: Any,
+    ) -> bool:
+        body = await asyncio.to_thread(index.to_bytes)
+        if not await storage.upload_document_index(
+            document_id, body, index_type
+        ):
+            await cache.delete(str(document_id))
+            return False
+        await cache.set(str(document_id), index)
+        return True
+
+    async def _load_index(
+        self,
+        cache: MemoryCache,
+        document_id: uuid.UUID,
+        index_type: str,
+        from_bytes: Callable[[bytes], Any],
+    ) -> Any:
+        index = await cache.get(str(document_id))
+        if index is None:
+            body = await storage.get_document_index(document_id, index_type)
+            if body is None:
+                return None
+            index = await asyncio.to_thread(from_bytes, body)
+            await cache.set(str(document_id), index)
+        return index
+
+    async def save_lexical_index(
+        self, document_id: uuid.UUID, chunks: List[str]
+    ) -> Optional[LexicalIndex]:
+        """
+        Build the BM25 index of a document's chunks and store it in S3
+        Returns:
+            The index, None if it could not be stored, in which case
+            questions fall back to vector retrieval
+        """
+        index = await asyncio.to_thread(LexicalIndex.build, chunks)
+        saved = await self._save_index(
+            self.lexical_indexes, document_id, LEXICAL_INDEX, index
+        )
+        return index if saved else None
+
+    async def save_chunk_store(
+        self, document_id: uuid.UUID, text: str, chunks: List[str]
+    ) -> Optional[ChunkStore]:
+        """
+        Store the full text of a document's chunks in S3
+        Returns:
+            The chunk store, None if it could not be stored, in which case
+            answers use the chunk text of the vector store
+        """
+        store = await asyncio.to_thread(ChunkStore.build, text, chunks)
+        saved = await self._save_index(
+            self.chunk_stores, document_id, CHUNK_STORE, store
+        )
+        return store if saved else None
+
+    async def lexical_index(
+        self, document_id: uuid.UUID
+    ) -> Optional[LexicalIndex]:
+        """Lexical index of a document, None if it has not been built"""
+        return await self._load_index(
+            self.lexical_indexes,
+            document_id,
+            LEXICAL_INDEX,
+            LexicalIndex.from_bytes,
+        )
+
+    async def chunk_store(
+        self, document_id: uuid.UUID
+    ) -> Optional[ChunkStore]:
+        """Chunk store of a document, None if it has not been built"""
+        return await self._load_index(
+            self.chunk_stores, document_id, CHUNK_STORE, ChunkStore.from_bytes
+        )
+
+    async def _lexical_matches(
+        self, document_id: uuid.UUID, queries: List[str], top_k: int
+    ) -> Optional[List[List[Dict[str, Any]]]]:
+        index, chunks = await asyncio.gather(
+            self.lexical_index(document_id), self.chunk_store(document_id)
+        )
+        if index is None or chunks is None:
+            return None
+        return [
+            [
+                {
+                    "score": score,
+                    "chunk_id": chunk_id,
+                    "text": chunks.texts[chunk_id][:CHUNK_TEXT_CHARS],
+                    "document_id": str(document_id),
+                }
+                for chunk_id, score in index.search(query, top_k)
+            ]
+            for query in queries
+        ]
+
+    async def _vector_matches(
+        self,
+        document_id: uuid.UUID,
+        queries: List[str],
+        top_k: int,
+        query_embeddings: Optional[List[List[float]]] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        # Create embeddings for the queries, in one request
+        if query_embeddings is None:
+            query_embeddings = await llm_service.create_embeddings(queries)
+        # Query the vector store
+        results = await self.store.query_many(
+            query_embeddings, top_k, namespace=str(document_id)
+        )
+        return [
+            [self._chunk_match(match) for match in matches]
+            for matches in results
+        ]
+
+    @staticmethod
+    def _fuse(
+        lexical: List[Dict[str, Any]],
+        vector: List[Dict[str, Any]],
+        top_k: int,
+    ) -> List[Dict[str, Any]]:
+        if not lexical:
+            return vector[:top_k]
+        matches = {match["chunk_id"]: match for match in lexical}
+        # Matches of either retriever carry the same chunk text
+        matches.update((match["chunk_id"], match) for match in vector)
+        fused = reciprocal_rank_fusion(
+            [
+                [match["chunk_id"] for match in lexical],
+                [match["chunk_id"] for match in vector],
+            ],
+            settings.rrf_k,
+        )
+        return [
+            {**matches[chunk_id], "score": score}
+            for chunk_id, score in fused[:top_k]
+        ]
+
     async def query_document(
-        self, document_id: uuid.UUID, query: str, top_k: int = 5
+        self,
+        document_id: uuid.UUID,
+        query: str,
+        top_k: int = 5,
+        mode: Optional[str] = None,
+        query_embedding: Optional[List[float]] = None,
     ) -> List[Dict]:
         """
         Query the document with a specific question
@@ -79,42 +300,170 @@ class VectorService:
             document_id: UUID of the document to query
             query: Query text
             top_k: Number of results to return
+            mode: "vector", "lexical" (BM25, no embedding call) or
+                "hybrid" (both fused by reciprocal rank), defaults to
+                settings.retrieval_mode. Documents without a lexical index
+                use vector retrieval.
+            query_embedding: Embedding of the query, if already created
         Returns:
             List of retrieved chunks with metadata
         """
-        # Create embedding for query
-        query_embedding = await llm_service.create_embeddings([query])
-        # Query Pinecone
-        results = self.index.query(
-            vector=query_embedding[0],
-            filter={"document_id": str(document_id)},
-            top_k=top_k,
-            include_metadata=True,
-        )
-        # Extract matches
-        matches = []
-        for match in results["matches"]:
-            matches.append(
-                {
-                    "score": match["score"],
-                    "chunk_id": match["metadata"]["chunk_id"],
-                    "text": match["metadata"]["chunk_text"],
-                    "document_id": match["metadata"]["document_id"],
-                }
+        results = await self.query_document_batch(
+            document_id,
+            [query],
+            top_k,
+            mode,
+            None if query_embedding is None else [query_embedding],
+        )
+        return results[0]
+
+    async def query_document_batch(
+        self,
+        document_id: uuid.UUID,
+        queries: List[str],
+        top_k: int = 5,
+        mode: Optional[str] = None,
+        query_embeddings: Optional[List[List[float]]] = None,
+    ) -> List[List[Dict]]:
+        """
+        Query one document with several questions, loading its indexes
+        once and ranking every query in one vector store request
+        Args:
+            document_id: UUID of the document to query
+            queries: Query texts
+            top_k: Number of results to return per query
+            mode: Retrieval mode, as in query_document
+            query_embeddings: Embeddings of the queries, if already created
+        Returns:
+            Retrieved chunks with metadata of each query, in order
+        """
+        mode = mode or settings.retrieval_mode
+        if mode == "lexical":
+            lexical = await self._lexical_matches(document_id, queries, top_k)
+            if lexical is not None:
+                return lexical
+        if mode != "hybrid":
+            return await self._vector_matches(
+                document_id, queries, top_k, query_embeddings
             )
-        return matches
+        candidates = max(top_k, settings.retrieval_candidates)
+        lexical, vector = await asyncio.gather(
+            self._lexical_matches(document_id, queries, candidates),
+            self._vector_matches(
+                document_id, queries, candidates, query_embeddings
+            ),
+        )
+        if lexical is None:
+            return [matches[:top_k] for matches in vector]
+        return [
+            self._fuse(lexical_matches, vector_matches, top_k)
+            for lexical_matches, vector_matches in zip(lexical, vector)
+        ]
+
+    async def build_context(
+        self,
+        document_id: uuid.UUID,
+        matches: List[Dict[str, Any]],
+        budget: int,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Pack retrieved chunks into context passages within a token budget,
+        merging adjacent chunks and dropping their repeated overlap
+        Args:
+            document_id: UUID of the document
+            matches: Chunks from query_document, best first
+            budget: Maximum tokens of context
+        Returns:
+            Passages with "text", "chunk_ids" and "score", best first,
+            None if the document has no chunk store
+        """
+        chunks = await self.chunk_store(document_id)
+        if chunks is None:
+            return None
+        return await asyncio.to_thread(
+            pack_context,
+            chunks,
+            [(int(match["chunk_id"]), match["score"]) for match in matches],
+            budget,
+            llm_service.count_tokens,
+        )
+
+    @staticmethod
+    def _chunk_match(match: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "score": match["score"],
+            "chunk_id": match["metadata"]["chunk_id"],
+            "text": match["metadata"]["chunk_text"],
+            "document_id": match["metadata"]["document_id"],
+        }
+
+    async def search(
+        self,
+        query: str,
+        top_k: int = 10,
+        top_documents: int = 5,
+        document_filter: Optional[
+            Callable[[List[str]], Awaitable[List[str]]]
+        ] = None,
+    ) -> List[Dict]:
+        """
+        Search chunks across all documents in two stages: document
+        centroids select the closest documents, then only those documents'
+        chunks are ranked, so the cost grows with top_documents rather
+        than with the corpus
+        Args:
+            query: Query text
+            top_k: Number of chunks to return
+            top_documents: Number of documents whose chunks are ranked
+            document_filter: Optional coroutine taking candidate document
+                IDs and returning the ones that may be searched
+        Returns:
+            Retrieved chunks with metadata, best first
+        """
+        query_embedding = (await llm_service.create_embeddings([query]))[0]
+        # Over-fetch candidates so filtered out documents can be replaced
+        candidates = await self.store.query(
+            query_embedding,
+            top_documents * settings.search_candidate_factor,
+            namespace=CENTROIDS_NAMESPACE,
+        )
+        document_ids = [match["id"] for match in candidates]
+        if document_filter is not None and document_ids:
+            allowed = set(await document_filter(document_ids))
+            document_ids = [d for d in document_ids if d in allowed]
+        results = await asyncio.gather(
+            *(
+                self.store.query(query_embedding, top_k, namespace=d)
+                for d in document_ids[:top_documents]
+            )
+        )
+        matches = [
+            self._chunk_match(match)
+            for document_matches in results
+            for match in document_matches
+        ]
+        matches.sort(key=lambda match: match["score"], reverse=True)
+        return matches[:top_k]
 
     async def delete_document(self, document_id: uuid.UUID) -> bool:
         """
-        Delete all vectors for a document from Pinecone
+        Delete all vectors for a document from the vector store
         Args:
             document_id: UUID of the document
         Returns:
             Success status
         """
         try:
-            # Delete by metadata filter
-            self.index.delete(filter={"document_id": str(document_id)})
+            await asyncio.gather(
+                self.store.delete(str(document_id)),
+                self.store.delete_vectors(
+                    CENTROIDS_NAMESPACE, [str(document_id)]
+                ),
+                storage.delete_document_index(document_id, LEXICAL_INDEX),
+                storage.delete_document_index(document_id, CHUNK_STORE),
+                self.lexical_indexes.delete(str(document_id)),
+                self.chunk_stores.delete(str(document_id)),
+            )
             return True
         except Exception as e:
             print(f"Error deleting vectors: {e}")
@@ -0,0 +1,460 @@
+import abc
+import asyncio
+import json
+import logging
+import os
+import tempfile
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pinecone
+
+from ..config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+def vector_id(document_id: str, index: int) -> str:
+    """Deterministic ID of a document's chunk vector"""
+    return f"{document_id}_{index}"
+
+
+class VectorStore(abc.ABC):
+    """Interface shared by the vector store backends"""
+
+    @abc.abstractmethod
+    async def upsert(
+        self, namespace: str, vectors: List[Dict[str, Any]]
+    ) -> None:
+        """
+        Insert or replace vectors in a namespace
+        Args:
+            namespace: Partition of the vectors, the document ID for chunks
+            vectors: Dictionaries with "id", "values" and "metadata"
+        """
+
+    @abc.abstractmethod
+    async def query(
+        self,
+        vector: List[float],
+        top_k: int,
+        namespace: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Find the vectors most similar to a query vector by cosine similarity
+        Args:
+            vector: Query vector
+            top_k: Number of matches to return
+            namespace: Namespace to search. None searches every namespace
+                where the backend supports it, else the default namespace.
+        Returns:
+            Matches with "id", "score" and "metadata", best first
+        """
+
+    async def query_many(
+        self,
+        vectors: List[List[float]],
+        top_k: int,
+        namespace: Optional[str] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Run several queries against one namespace, by default as
+        concurrent single queries
+        Returns:
+            Matches of each query vector, in order
+        """
+        return list(
+            await asyncio.gather(
+                *(self.query(vector, top_k, namespace) for vector in vectors)
+            )
+        )
+
+    @abc.abstractmethod
+    async def delete(self, namespace: str) -> None:
+        """Delete all vectors in a namespace"""
+
+    async def replace(
+        self, namespace: str, vectors: List[Dict[str, Any]]
+    ) -> None:
+        """Replace every vector in a namespace, dropping the ones not given"""
+        await self.delete(namespace)
+        await self.upsert(namespace, vectors)
+
+    @abc.abstractmethod
+    async def delete_vectors(self, namespace: str, ids: List[str]) -> None:
+        """Delete vectors by ID from a namespace"""
+
+
+class PineconeVectorStore(VectorStore):
+    """
+    Vectors in a Pinecone index, one namespace per document, so queries
+    and deletes never filter the whole index
+    """
+
+    # Pinecone limits the vectors per upsert request
+    batch_size = 100
+
+    def __init__(self, index: Any = None):
+        if index is not None:
+            self.index = index
+            return
+        pinecone.init(
+            api_key=settings.pinecone_api_key,
+            environment=settings.pinecone_environment,
+        )
+        # Create index if it doesn't exist
+        if settings.pinecone_index_name not in pinecone.list_indexes():
+            pinecone.create_index(
+                name=settings.pinecone_index_name,
+                dimension=settings.embedding_dimension,
+                metric="cosine",
+            )
+        self.index = pinecone.Index(settings.pinecone_index_name)
+
+    async def upsert(
+        self, namespace: str, vectors: List[Dict[str, Any]]
+    ) -> None:
+        for i in range(0, len(vectors), self.batch_size):
+            await asyncio.to_thread(
+                self.index.upsert,
+                vectors=vectors[i : i + self.batch_size],
+                namespace=namespace,
+            )
+
+    async def query(
+        self,
+        vector: List[float],
+        top_k: int,
+        namespace: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        results = await asyncio.to_thread(
+            self.index.query,
+            vector=vector,
+            top_k=top_k,
+            include_metadata=True,
+            namespace=namespace or "",
+        )
+        return [
+            {
+                "id": match["id"],
+                "score": match["score"],
+                "metadata": match["metadata"],
+            }
+            for match in results["matches"]
+        ]
+
+    async def delete(self, namespace: str) -> None:
+        await asyncio.to_thread(
+            self.index.delete, delete_all=True, namespace=namespace
+        )
+
+    async def delete_vectors(self, namespace: str, ids: List[str]) -> None:
+        await asyncio.to_thread(
+            self.index.delete, ids=ids, namespace=namespace
+        )
+
+    async def migrate_document(
+        self, document_id: str, chunk_count: int = 0
+    ) -> List[List[float]]:
+        """
+        Move a document's vectors from the default namespace, where they
+        were filtered by metadata, to the document's namespace. Their IDs
+        are rebuilt from the chunk positions, as pinecone-client 2 cannot
+        list IDs by prefix. Batches are fetched until one past chunk_count
+        comes back empty, so documents indexed before the count was stored
+        are moved too.
+        Args:
+            document_id: Document whose vectors are moved
+            chunk_count: Chunks indexed for the document, 0 if unknown
+        Returns:
+            Values of the vectors moved
+        """
+        moved = []
+        start = 0
+        while True:
+            ids = [
+                vector_id(document_id, i)
+                for i in range(start, start + self.batch_size)
+            ]
+            fetched = await asyncio.to_thread(self.index.fetch, ids=ids)
+            vectors = [
+                {
+                    "id": vector["id"],
+                    "values": vector["values"],
+                    "metadata": vector.get("metadata", {}),
+                }
+                for vector in fetched["vectors"].values()
+            ]
+            if not vectors and start >= chunk_count:
+                return moved
+            if vectors:
+                await self.upsert(document_id, vectors)
+                # Deletes go by ID, as filter deletes are not always
+                # supported
+                await asyncio.to_thread(
+                    self.index.delete, ids=[v["id"] for v in vectors]
+                )
+                moved.extend(vector["values"] for vector in vectors)
+            start += self.batch_size
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length, so dot products are cosine similarities"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Indices of the top_k highest scores, best first"""
+    if top_k < len(scores):
+        # Partial selection is linear, only the top_k are sorted
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Vectors in memory-mapped float32 matrices on local disk, one per
+    namespace, searched exactly with vectorised cosine similarity. For
+    development and offline use; not shared between processes.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        # Unit-length matrix and records ("id", "metadata") per namespace
+        self.namespaces: Dict[
+            str, Tuple[np.ndarray, List[Dict[str, Any]]]
+        ] = {}
+        self._loaded = False
+        # Serializes the read-modify-write of each namespace's files
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _lock(self, namespace: str) -> asyncio.Lock:
+        return self._locks.setdefault(namespace, asyncio.Lock())
+
+    def _replace(self, path: str, write) -> None:
+        # Write to a unique temporary file and swap, so readers never see
+        # a partial file
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def _paths(self, namespace: str) -> Tuple[str, str]:
+        base = os.path.join(self.directory, namespace)
+        return f"{base}.npy", f"{base}.json"
+
+    def _read(self, namespace: str) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+        matrix_path, records_path = self._paths(namespace)
+        with open(records_path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+        return np.load(matrix_path, mmap_mode="r"), records
+
+    def _load_all(
+        self,
+    ) -> Dict[str, Tuple[np.ndarray, List[Dict[str, Any]]]]:
+        namespaces = {}
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                namespace = name[: -len(".json")]
+                try:
+                    namespaces[namespace] = self._read(namespace)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Skipping vectors of {namespace}: {e}")
+        return namespaces
+
+    async def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            loaded = await asyncio.to_thread(self._load_all)
+            # Namespaces written since the scan started are newer
+            self.namespaces = {**loaded, **self.namespaces}
+            self._loaded = True
+
+    def _write(
+        self,
+        namespace: str,
+        existing: Optional[Tuple[np.ndarray, List[Dict[str, Any]]]],
+        vectors: List[Dict[str, Any]],
+        deleted_ids: Sequence[str] = (),
+    ) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+        dropped_ids = {vector["id"] for vector in vectors}
+        dropped_ids.update(deleted_ids)
+        rows: List[np.ndarray] = []
+        records: List[Dict[str, Any]] = []
+        if existing is not None:
+            # Keep the existing vectors that are not replaced or deleted
+            matrix, old_records = existing
+            keep = [
+                i
+                for i, record in enumerate(old_records)
+                if record["id"] not in dropped_ids
+            ]
+            rows.append(np.asarray(matrix[keep]))
+            records.extend(old_records[i] for i in keep)
+        if vectors:
+            rows.append(
+                normalize_rows(
+                    np.array([v["values"] for v in vectors], np.float32)
+                )
+            )
+        records.extend(
+            {"id": v["id"], "metadata": v.get("metadata", {})} for v in vectors
+        )
+        matrix = (
+            np.concatenate(rows)
+            if rows
+            else np.zeros((0, settings.embedding_dimension), np.float32)
+        )
+        matrix_path, records_path = self._paths(namespace)
+        self._replace(matrix_path, lambda f: np.save(f, matrix))
+        self._replace(
+            records_path,
+            lambda f: f.write(json.dumps(records).encode("utf-8")),
+        )
+        return self._read(namespace)
+
+    def _remove(self, namespace: str) -> None:
+        for path in self._paths(namespace):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _search_many(
+        partition: Tuple[np.ndarray, List[Dict[str, Any]]],
+        vectors: List[List[float]],
+        top_k: int,
+    ) -> List[List[Dict[str, Any]]]:
+        matrix, records = partition
+        if not len(matrix):
+            return [[] for _ in vectors]
+        queries = normalize_rows(np.array(vectors, np.float32))
+        # One pass over the namespace scores every query
+        scores = queries @ matrix.T
+        return [
+            [
+                {
+                    "id": records[i]["id"],
+                    "score": float(row[i]),
+                    "metadata": records[i]["metadata"],
+                }
+                for i in top_k_indices(row, top_k)
+            ]
+            for row in scores
+        ]
+
+    @staticmethod
+    def _search(
+        partitions: List[Tuple[np.ndarray, List[Dict[str, Any]]]],
+        vector: List[float],
+        top_k: int,
+    ) -> List[Dict[str, Any]]:
+        query = normalize_rows(np.array([vector], np.float32))[0]
+        scores = []
+        refs: List[Tuple[int, int]] = []
+        for position, (matrix, _) in enumerate(partitions):
+            if not len(matrix):
+                continue
+            partition_scores = matrix @ query
+            best = top_k_indices(partition_scores, top_k)
+            scores.append(partition_scores[best])
+            refs.extend((position, int(i)) for i in best)
+        if not scores:
+            return []
+        all_scores = np.concatenate(scores)
+        matches = []
+        for i in top_k_indices(all_scores, top_k):
+            position, row = refs[i]
+            record = partitions[position][1][row]
+            matches.append(
+                {
+                    "id": record["id"],
+                    "score": float(all_scores[i]),
+                    "metadata": record["metadata"],
+                }
+            )
+        return matches
+
+    async def upsert(
+        self, namespace: str, vectors: List[Dict[str, Any]]
+    ) -> None:
+        await self._ensure_loaded()
+        async with self._lock(namespace):
+            self.namespaces[namespace] = await asyncio.to_thread(
+                self._write,
+                namespace,
+                self.namespaces.get(namespace),
+                vectors,
+            )
+
+    async def replace(
+        self, namespace: str, vectors: List[Dict[str, Any]]
+    ) -> None:
+        await self._ensure_loaded()
+        async with self._lock(namespace):
+            # Written from scratch in one swap, so queries never see the
+            # namespace empty
+            self.namespaces[namespace] = await asyncio.to_thread(
+                self._write, namespace, None, vectors
+            )
+
+    async def query(
+        self,
+        vector: List[float],
+        top_k: int,
+        namespace: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        await self._ensure_loaded()
+        if namespace is not None:
+            partition = self.namespaces.get(namespace)
+            partitions = [partition] if partition is not None else []
+        else:
+            partitions = list(self.namespaces.values())
+        return await asyncio.to_thread(self._search, partitions, vector, top_k)
+
+    async def query_many(
+        self,
+        vectors: List[List[float]],
+        top_k: int,
+        namespace: Optional[str] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        await self._ensure_loaded()
+        partition = self.namespaces.get(namespace)
+        if namespace is None or partition is None or not vectors:
+            return await super().query_many(vectors, top_k, namespace)
+        return await asyncio.to_thread(
+            self._search_many, partition, vectors, top_k
+        )
+
+    async def delete(self, namespace: str) -> None:
+        await self._ensure_loaded()
+        async with self._lock(namespace):
+            self.namespaces.pop(namespace, None)
+            await asyncio.to_thread(self._remove, namespace)
+
+    async def delete_vectors(self, namespace: str, ids: List[str]) -> None:
+        await self._ensure_loaded()
+        async with self._lock(namespace):
+            if namespace in self.namespaces:
+                self.namespaces[namespace] = await asyncio.to_thread(
+                    self._write, namespace, self.namespaces[namespace], [], ids
+                )
+
+
+def create_vector_store() -> VectorStore:
+    """Create the vector store backend selected in settings"""
+    if settings.vector_db == "local":
+        return LocalVectorStore(settings.local_vector_dir)
+    if settings.vector_db == "pinecone":
+        return PineconeVectorStore()
+    raise ValueError(f"Unsupported VECTOR_DB: {settings.vector_db}")
@@ -0,0 +1,205 @@
+import asyncio
+import json
+import logging
+import signal
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from uuid import UUID
+
+from .config import get_settings
+from .services.queue_service import (
+    Job,
+    ProcessingMetrics,
+    ProcessingQueue,
+    processing_metrics,
+    processing_queue,
+)
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class Worker:
+    """Pool of consumers processing documents from a queue"""
+
+    def __init__(
+        self,
+        queue: ProcessingQueue,
+        handler: Callable[[UUID], Awaitable[None]],
+        concurrency: int = settings.worker_concurrency,
+        metrics: ProcessingMetrics = processing_metrics,
+        heartbeat_interval: float = settings.queue_visibility_timeout / 3,
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = concurrency
+        self.metrics = metrics
+        # Seconds between visibility extensions of a job being processed
+        self.heartbeat_interval = heartbeat_interval
+        self._stopping = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        """Start the consumers and metrics reporter as background tasks"""
+        self._tasks = [
+            asyncio.create_task(self._consume())
+            for _ in range(self.concurrency)
+        ]
+        self._tasks.append(asyncio.create_task(self._report_metrics()))
+
+    async def run(self) -> None:
+        """Process jobs until stop() is called"""
+        self.start()
+        await self._stopping.wait()
+        await self.shutdown()
+
+    def stop(self) -> None:
+        """Ask the consumers to finish their current job and exit"""
+        self._stopping.set()
+
+    async def shutdown(self) -> None:
+        """Stop and wait for the background tasks"""
+        self.stop()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.queue.close()
+
+    async def _consume(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                jobs = await self.queue.receive(wait_seconds=5)
+            except Exception as e:
+                logger.error(f"Error receiving jobs: {e}")
+                await asyncio.sleep(5)
+                continue
+            for job in jobs:
+                await self.handle(job)
+
+    async def handle(self, job: Job) -> None:
+        """Process one job, then ack, retry with backoff or dead-letter it"""
+        if job.enqueued_at and job.attempts == 1:
+            self.metrics.record("queue_wait", time.time() - job.enqueued_at)
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            async with self.metrics.time_stage("total"):
+                await self.handler(UUID(job.document_id))
+        except Exception as e:
+            heartbeat.cancel()
+            if job.attempts >= settings.queue_max_attempts:
+                logger.error(
+                    f"Dead-lettering document {job.document_id} after "
+                    f"{job.attempts} attempts: {e}"
+                )
+                await self.queue.dead_letter(job, str(e))
+            else:
+                delay = settings.queue_retry_backoff * 2 ** (job.attempts - 1)
+                logger.warning(
+                    f"Retrying document {job.document_id} in {delay}s "
+                    f"(attempt {job.attempts}): {e}"
+                )
+                await self.queue.retry(job, delay)
+            return
+        heartbeat.cancel()
+        await self.queue.ack(job)
+
+    async def _heartbeat(self, job: Job) -> None:
+        # Keep a long job hidden so it is not redelivered to another worker
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.queue.extend(job, settings.queue_visibility_timeout)
+            except Exception as e:
+                logger.warning(
+                    f"Error extending visibility of document "
+                    f"{job.document_id}: {e}"
+                )
+
+    async def _report_metrics(self, interval: int = 60) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                self.metrics.queue_depth = await self.queue.depth()
+            except Exception as e:
+                logger.warning(f"Error reading queue depth: {e}")
+            logger.info(f"Processing metrics: {self.metrics.snapshot()}")
+
+
+def create_worker(concurrency: Optional[int] = None) -> Worker:
+    """Create a worker running the document processing pipeline"""
+    # Imported here so Worker can be used without the API services
+    from .pipeline import process_document_task
+
+    return Worker(
+        processing_queue,
+        process_document_task,
+        concurrency or settings.worker_concurrency,
+    )
+
+
+async def handle_records(
+    records: List[Dict[str, Any]],
+    handler: Callable[[UUID], Awaitable[None]],
+    metrics: ProcessingMetrics = processing_metrics,
+) -> Dict[str, Any]:
+    """
+    Process the records of an SQS event, one document each
+    Args:
+        records: SQS messages as delivered to a Lambda event source
+        handler: Processes one document
+        metrics: Receives the processing latency
+    Returns:
+        Partial batch response naming the records that failed, so only
+        those are redelivered and dead-lettered by the queue
+    """
+    failures = []
+    for record in records:
+        try:
+            document_id = UUID(json.loads(record["body"])["document_id"])
+            async with metrics.time_stage("total"):
+                await handler(document_id)
+        except Exception as e:
+            logger.error(
+                f"Error processing message {record['messageId']}: {e}"
+            )
+            failures.append({"itemIdentifier": record["messageId"]})
+    return {"batchItemFailures": failures}
+
+
+_lambda_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """AWS Lambda entry point consuming the processing queue"""
+    global _lambda_loop
+    from .pipeline import process_document_task
+
+    # Reused across warm invocations, which keep the pooled clients
+    if _lambda_loop is None:
+        _lambda_loop = asyncio.new_event_loop()
+    return _lambda_loop.run_until_complete(
+        handle_records(event.get("Records", []), process_document_task)
+    )
+
+
+async def main() -> None:
+    from .services.ocr_service import ocr_service
+
+    worker = create_worker()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    logger.info(f"Worker started with concurrency {worker.concurrency}")
+    try:
+        await worker.run()
+    finally:
+        await ocr_service.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+import os
+
+import boto3
+import pytest
+from moto.server import ThreadedMotoServer
+
+# Keep service singletons offline; must be set before settings are read
+os.environ.setdefault("VECTOR_DB", "local")
+
+from app.config import get_settings  # noqa: E402
+from app.database import (  # noqa: E402
+    CONTENT_HASH_INDEX,
+    STATUS_INDEX,
+    UPLOAD_DATE_INDEX,
+)
+
+settings = get_settings()
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "benchmark: timing benchmark, set RUN_BENCHMARKS=1 to run"
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    if os.environ.get("RUN_BENCHMARKS"):
+        return
+    skip = pytest.mark.skip(reason="set RUN_BENCHMARKS=1")
+    for item in items:
+        if item.get_closest_marker("benchmark"):
+            item.add_marker(skip)
+
+
+def date_index(name: str, hash_key: str) -> dict:
+    return {
+        "IndexName": name,
+        "KeySchema": [
+            {"AttributeName": hash_key, "KeyType": "HASH"},
+            {"AttributeName": "upload_date", "KeyType": "RANGE"},
+        ],
+        "Projection": {"ProjectionType": "ALL"},
+    }
+
+
+@pytest.fixture(scope="session")
+def moto_endpoint():
+    """
+    Stand-in DynamoDB and S3 served over HTTP, so both boto3 and aioboto3
+    clients can reach it. Mirrors the resources in init-localstack.sh.
+    """
+    server = ThreadedMotoServer(port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    endpoint = f"http://{host}:{port}"
+    client_kwargs = {
+        "endpoint_url": endpoint,
+        "region_name": settings.aws_region,
+        "aws_access_key_id": "test",
+        "aws_secret_access_key": "test",
+    }
+    boto3.resource("dynamodb", **client_kwargs).create_table(
+        TableName=settings.dynamodb_table,
+        KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
+        AttributeDefinitions=[
+            {"AttributeName": name, "AttributeType": "S"}
+            for name in (
+                "id",
+                "status",
+                "record_type",
+                "upload_date",
+                "content_hash",
+            )
+        ],
+        GlobalSecondaryIndexes=[
+            date_index(STATUS_INDEX, "status"),
+            date_index(UPLOAD_DATE_INDEX, "record_type"),
+            {
+                "IndexName": CONTENT_HASH_INDEX,
+                "KeySchema": [
+                    {"AttributeName": "content_hash", "KeyType": "HASH"}
+                ],
+                "Projection": {
+                    "ProjectionType": "INCLUDE",
+                    "NonKeyAttributes": ["status"],
+                },
+            },
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    boto3.client("s3", **client_kwargs).create_bucket(
+        Bucket=settings.s3_bucket_name
+    )
+    yield endpoint
+    server.stop()
@@ -0,0 +1,83 @@
+import pytest
+
+from app.services.answer_cache import AnswerCache, normalize_question
+
+
+def answer(text: str) -> dict:
+    return {"answer": text, "context": [], "sources": []}
+
+
+def test_normalize_question():
+    assert (
+        normalize_question("  What is the MAIN\n contribution? ")
+        == "what is the main contribution"
+    )
+
+
+def test_matches_exact_and_similar_questions():
+    cache = AnswerCache(max_documents=2, max_entries=8, threshold=0.95)
+    cache.put(
+        "doc",
+        "v1",
+        "What is the main contribution?",
+        [1.0, 0.0],
+        answer("A"),
+        2.0,
+    )
+
+    exact = cache.lookup("doc", "v1", "what is the main contribution")
+    assert exact.answer["answer"] == "A"
+    cache.record(exact, False, 0.01)
+
+    similar = cache.lookup(
+        "doc", "v1", "What's the key contribution?", [0.99, 0.05]
+    )
+    assert similar.answer["answer"] == "A"
+    cache.record(similar, True, 0.2)
+
+    different = cache.lookup(
+        "doc", "v1", "Which datasets are used?", [0.0, 1.0]
+    )
+    assert different is None
+    cache.record(different, False, 0.2)
+    # Scoped by document
+    assert cache.lookup("other", "v1", "what is the main contribution") is None
+
+    stats = cache.snapshot()
+    assert stats["exact_hits"] == 1
+    assert stats["similar_hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == pytest.approx(2 / 3)
+    assert stats["seconds_saved"] == pytest.approx(1.99 + 1.8)
+
+
+def test_reindexing_and_invalidation_drop_answers():
+    cache = AnswerCache(max_documents=2, max_entries=2, threshold=0.95)
+    cache.put("doc", "v1", "q1", None, answer("A"), 1.0)
+    assert cache.lookup("doc", "v2", "q1") is None
+    # The stale answers were dropped with the old version
+    assert cache.lookup("doc", "v1", "q1") is None
+
+    cache.put("doc", "v2", "q1", None, answer("A"), 1.0)
+    cache.invalidate("doc")
+    assert cache.lookup("doc", "v2", "q1") is None
+
+    # Bounded per document and across documents
+    for question in ("q1", "q2", "q3"):
+        cache.put("doc", "v2", question, None, answer(question), 1.0)
+    assert cache.lookup("doc", "v2", "q1") is None
+    assert cache.lookup("doc", "v2", "q3") is not None
+    cache.put("b", "v1", "q", None, answer("B"), 1.0)
+    cache.put("c", "v1", "q", None, answer("C"), 1.0)
+    assert cache.lookup("doc", "v2", "q3") is None
+
+
+def test_answers_are_scoped_by_retrieval_variant():
+    cache = AnswerCache(max_documents=2, max_entries=8, threshold=0.95)
+    cache.put("doc", "v1", "q", [1.0, 0.0], answer("A"), 1.0, "vector:20:3000")
+
+    assert cache.lookup("doc", "v1", "q", variant="vector:20:3000")
+    # Another mode or context budget retrieves different context
+    for variant in ("lexical:20:3000", "vector:20:1000"):
+        assert cache.lookup("doc", "v1", "q", variant=variant) is None
+        assert cache.lookup("doc", "v1", "q", [1.0, 0.0], variant) is None
@@ -0,0 +1,332 @@
+import asyncio
+import json
+import time
+import uuid
+
+import pytest
+from fastapi import Response
+
+from app.models import BatchQuestion, DocumentQuestion, DocumentQuestionBatch
+from app.routers import documents
+from app.services.answer_cache import AnswerCache
+from app.services.cache_service import MemoryCache
+from app.services.queue_service import ProcessingMetrics
+
+# Simulated latency of each service on the /ask hot path
+METADATA_LATENCY = 0.02
+EMBEDDING_LATENCY = 0.03
+RETRIEVAL_LATENCY = 0.01
+LLM_LATENCY = 0.02
+SERIAL_LATENCY = (
+    METADATA_LATENCY + EMBEDDING_LATENCY + RETRIEVAL_LATENCY + LLM_LATENCY
+)
+
+
+# Document no stub service knows about
+MISSING_DOCUMENT = uuid.UUID(int=0)
+
+
+class StubStorage:
+    def __init__(self):
+        self.reads = 0
+
+    async def get_document_metadata(self, document_id):
+        self.reads += 1
+        await asyncio.sleep(METADATA_LATENCY)
+        if str(document_id) == str(MISSING_DOCUMENT):
+            return None
+        return {
+            "id": str(document_id),
+            "status": "COMPLETED",
+            "stages": {"index": {"completed_at": "2024-01-01T00:00:00"}},
+        }
+
+
+class StubLLMService:
+    def __init__(self):
+        self.embedding_calls = 0
+        self.embeddings_in_flight = 0
+        self.embedding_started = asyncio.Event()
+
+    async def create_embeddings(self, texts, stats=None):
+        self.embedding_calls += 1
+        self.embeddings_in_flight += 1
+        self.embedding_started.set()
+        await asyncio.sleep(EMBEDDING_LATENCY)
+        self.embeddings_in_flight -= 1
+        return [[float(len(text)), 1.0] for text in texts]
+
+    async def answer_question(self, question, context_chunks):
+        await asyncio.sleep(LLM_LATENCY)
+        return f"answer to {question}"
+
+    def count_tokens(self, text):
+        return len(text.split())
+
+
+class StubVectorService:
+    def __init__(self):
+        self.queries = 0
+
+    async def query_document(
+        self, document_id, query, top_k=5, mode=None, query_embedding=None
+    ):
+        assert query_embedding is not None
+        return (
+            await self.query_document_batch(
+                document_id, [query], top_k, mode, [query_embedding]
+            )
+        )[0]
+
+    async def query_document_batch(
+        self,
+        document_id,
+        queries,
+        top_k=5,
+        mode=None,
+        query_embeddings=None,
+    ):
+        assert len(query_embeddings) == len(queries)
+        self.queries += 1
+        await asyncio.sleep(RETRIEVAL_LATENCY)
+        return [
+            [
+                {
+                    "score": 0.9,
+                    "chunk_id": 0,
+                    "text": "context",
+                    "document_id": str(document_id),
+                }
+            ]
+            for _ in queries
+        ]
+
+    async def build_context(self, document_id, matches, budget):
+        return None
+
+
+async def ask_many(document_id, requests: int) -> float:
+    """Ask distinct questions, returning the mean seconds per request"""
+    start = time.perf_counter()
+    for i in range(requests):
+        response = Response()
+        answer = await documents.ask_question(
+            document_id,
+            DocumentQuestion(question=f"question {i}", retrieval="hybrid"),
+            response,
+        )
+        assert answer.answer == f"answer to question {i}"
+        assert "metadata;dur=" in response.headers["Server-Timing"]
+    return (time.perf_counter() - start) / requests
+
+
+@pytest.mark.asyncio
+async def test_ask_reads_metadata_alongside_the_query_embedding(monkeypatch):
+    llm = StubLLMService()
+    overlapped = []
+
+    class ProbedStorage(StubStorage):
+        async def get_document_metadata(self, document_id):
+            # Times out unless the embedding request starts meanwhile
+            await asyncio.wait_for(llm.embedding_started.wait(), 1)
+            llm.embedding_started.clear()
+            overlapped.append(llm.embeddings_in_flight)
+            return await super().get_document_metadata(document_id)
+
+    storage = ProbedStorage()
+    metrics = ProcessingMetrics()
+    monkeypatch.setattr(documents, "storage", storage)
+    monkeypatch.setattr(documents, "llm_service", llm)
+    monkeypatch.setattr(documents, "vector_service", StubVectorService())
+    monkeypatch.setattr(documents, "ask_metrics", metrics)
+    monkeypatch.setattr(documents, "metadata_cache", MemoryCache(16, 60))
+    # Questions never repeat, so every request runs the whole path
+    monkeypatch.setattr(
+        documents, "answer_cache", AnswerCache(16, 16, threshold=1.1)
+    )
+    document_id = uuid.uuid4()
+    requests = 3
+
+    monkeypatch.setattr(documents.settings, "metadata_cache_ttl", 0)
+    await ask_many(document_id, requests)
+    assert storage.reads == requests
+    assert overlapped == [1] * requests
+    monkeypatch.setattr(documents.settings, "metadata_cache_ttl", 60)
+    storage.reads = 0
+    await ask_many(document_id, requests)
+    # Metadata is read once, then shared until the cache entry expires
+    assert storage.reads == 1
+    assert set(metrics.snapshot()["stages"]) == {
+        "ask_metadata",
+        "ask_embedding",
+        "ask_retrieval",
+        "ask_context",
+        "ask_llm",
+        "ask_total",
+    }
+
+
+@pytest.mark.asyncio
+@pytest.mark.benchmark
+async def test_benchmark_ask_hot_path(monkeypatch):
+    metrics = ProcessingMetrics()
+    monkeypatch.setattr(documents, "storage", StubStorage())
+    monkeypatch.setattr(documents, "llm_service", StubLLMService())
+    monkeypatch.setattr(documents, "vector_service", StubVectorService())
+    monkeypatch.setattr(documents, "ask_metrics", metrics)
+    monkeypatch.setattr(documents, "metadata_cache", MemoryCache(16, 60))
+    monkeypatch.setattr(
+        documents, "answer_cache", AnswerCache(16, 16, threshold=1.1)
+    )
+    document_id = uuid.uuid4()
+    requests = 20
+
+    monkeypatch.setattr(documents.settings, "metadata_cache_ttl", 0)
+    uncached = await ask_many(document_id, requests)
+    monkeypatch.setattr(documents.settings, "metadata_cache_ttl", 60)
+    cached = await ask_many(document_id, requests)
+
+    for stage, stats in metrics.snapshot()["stages"].items():
+        print(f"{stage}: mean {stats['mean'] * 1000:.1f}ms")
+    print(
+        f"/ask mean {uncached * 1000:.1f}ms without metadata cache, "
+        f"{cached * 1000:.1f}ms with it, {SERIAL_LATENCY * 1000:.1f}ms "
+        "with the services called one after another"
+    )
+    # The metadata check overlaps the query embedding
+    assert uncached < SERIAL_LATENCY - METADATA_LATENCY / 2
+
+
+@pytest.mark.asyncio
+async def test_ask_reuses_answers_only_for_the_same_retrieval(monkeypatch):
+    vectors = StubVectorService()
+    monkeypatch.setattr(documents, "storage", StubStorage())
+    monkeypatch.setattr(documents, "llm_service", StubLLMService())
+    monkeypatch.setattr(documents, "vector_service", vectors)
+    monkeypatch.setattr(documents, "ask_metrics", ProcessingMetrics())
+    monkeypatch.setattr(documents, "metadata_cache", MemoryCache(16, 60))
+    monkeypatch.setattr(
+        documents, "answer_cache", AnswerCache(16, 16, threshold=0.95)
+    )
+    document_id = uuid.uuid4()
+
+    async def ask(retrieval):
+        await documents.ask_question(
+            document_id,
+            DocumentQuestion(question="question", retrieval=retrieval),
+            Response(),
+        )
+        return vectors.queries
+
+    assert await ask("hybrid") == 1
+    assert await ask("hybrid") == 1
+    # Another retrieval mode or context budget gives different context
+    assert await ask("vector") == 2
+    monkeypatch.setattr(
+        documents.settings,
+        "context_token_budget",
+        documents.settings.context_token_budget // 2,
+    )
+    assert await ask("hybrid") == 3
+    assert await ask("hybrid") == 3
+
+
+def patch_batch_services(monkeypatch):
+    """Install the stub services, returning the LLM and vector stubs"""
+    llm = StubLLMService()
+    vectors = StubVectorService()
+    monkeypatch.setattr(documents, "storage", StubStorage())
+    monkeypatch.setattr(documents, "llm_service", llm)
+    monkeypatch.setattr(documents, "vector_service", vectors)
+    monkeypatch.setattr(documents, "ask_metrics", ProcessingMetrics())
+    monkeypatch.setattr(documents, "metadata_cache", MemoryCache(16, 60))
+    monkeypatch.setattr(
+        documents, "answer_cache", AnswerCache(16, 16, threshold=1.1)
+    )
+    monkeypatch.setattr(documents.settings, "ask_batch_concurrency", 8)
+    return llm, vectors
+
+
+async def ask_one_at_a_time(questions):
+    """Ask batch questions through the single-question endpoint"""
+    for item in questions:
+        await documents.ask_question(
+            item.document_id,
+            DocumentQuestion(question=item.question, retrieval="hybrid"),
+            Response(),
+        )
+
+
+@pytest.mark.asyncio
+async def test_ask_batch_shares_embedding_and_retrieval(monkeypatch):
+    llm, vectors = patch_batch_services(monkeypatch)
+    papers = [uuid.uuid4() for _ in range(2)]
+    questions = [
+        BatchQuestion(document_id=papers[i % 2], question=f"question {i}")
+        for i in range(40)
+    ]
+    await ask_one_at_a_time(questions[-4:])
+
+    # The last questions, now cached, new ones and a missing document
+    batch = DocumentQuestionBatch(
+        questions=[
+            *questions[-4:],
+            *(
+                BatchQuestion(
+                    document_id=item.document_id, question=f"new {i}"
+                )
+                for i, item in enumerate(questions)
+            ),
+            BatchQuestion(document_id=MISSING_DOCUMENT, question="lost"),
+        ],
+        retrieval="hybrid",
+    )
+    llm.embedding_calls = vectors.queries = 0
+    response = await documents.ask_batch(batch)
+    lines = [json.loads(line) async for line in response.body_iterator]
+
+    assert response.media_type == "application/x-ndjson"
+    assert sorted(line["index"] for line in lines) == list(
+        range(len(batch.questions))
+    )
+    by_index = {line["index"]: line for line in lines}
+    assert all(by_index[i]["cached"] for i in range(4))
+    assert by_index[4]["answer"]["answer"] == "answer to new 0"
+    assert by_index[len(batch.questions) - 1]["error"]["status"] == 404
+    # One embedding request, one retrieval per document
+    assert llm.embedding_calls == 1
+    assert vectors.queries == len(papers)
+
+
+@pytest.mark.asyncio
+@pytest.mark.benchmark
+async def test_benchmark_ask_batch_throughput(monkeypatch):
+    patch_batch_services(monkeypatch)
+    papers = [uuid.uuid4() for _ in range(2)]
+    questions = [
+        BatchQuestion(document_id=papers[i % 2], question=f"question {i}")
+        for i in range(40)
+    ]
+    start = time.perf_counter()
+    await ask_one_at_a_time(questions)
+    one_at_a_time = time.perf_counter() - start
+
+    batch = DocumentQuestionBatch(
+        questions=[
+            BatchQuestion(document_id=item.document_id, question=f"new {i}")
+            for i, item in enumerate(questions)
+        ],
+        retrieval="hybrid",
+    )
+    start = time.perf_counter()
+    response = await documents.ask_batch(batch)
+    lines = [json.loads(line) async for line in response.body_iterator]
+    batched = time.perf_counter() - start
+
+    print(
+        f"{len(questions)} questions: {len(questions) / one_at_a_time:.0f} "
+        f"per second one at a time, {len(questions) / batched:.0f} per "
+        "second in a batch"
+    )
+    assert len(lines) == len(questions)
+    assert batched < one_at_a_time / 4
@@ -0,0 +1,66 @@
+import time
+
+import pytest
+
+from app.services.cache_service import DiskCache, MemoryCache, content_key
+
+
+def test_content_key_separates_parts():
+    assert content_key("ab", "c") != content_key("a", "bc")
+    assert content_key("pdf", b"bytes") == content_key("pdf", "bytes")
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(max_entries=2)
+    await cache.set("a", 1)
+    await cache.set("b", 2)
+    assert await cache.get("a") == 1
+    await cache.set("c", 3)
+    assert await cache.get("b") is None
+    assert await cache.get("a") == 1
+    assert await cache.get("c") == 3
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_expires_entries(monkeypatch):
+    cache = MemoryCache(max_entries=2, ttl=10)
+    await cache.set("a", "value")
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 11)
+    assert await cache.get("a") is None
+
+
+@pytest.mark.asyncio
+async def test_disk_cache_round_trip_and_eviction(tmp_path):
+    cache = DiskCache(str(tmp_path), max_entries=2)
+    await cache.set("a", [[0.1, 0.2]])
+    assert await cache.get("a") == [[0.1, 0.2]]
+    await cache.set("b", "b")
+    await cache.set("c", "c")
+    assert len(list(tmp_path.glob("*.json"))) == 2
+
+
+@pytest.mark.asyncio
+async def test_disk_cache_scans_directory_only_past_the_limit(tmp_path):
+    cache = DiskCache(str(tmp_path), max_entries=100)
+    scans = 0
+    files = cache._files
+
+    def counting_files():
+        nonlocal scans
+        scans += 1
+        return files()
+
+    cache._files = counting_files
+    for i in range(1000):
+        await cache.set(str(i), i)
+        # Recently read entries survive eviction
+        assert await cache.get("0") == 0
+        assert len(list(tmp_path.glob("*.json"))) <= 100
+    # One scan per tenth of the limit written, not one per write
+    assert scans <= 1000 // 10
+    # Overwriting an entry does not count as a new one
+    for _ in range(50):
+        await cache.set("0", 0)
+    assert scans <= 1000 // 10
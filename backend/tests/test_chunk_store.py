@@ -0,0 +1,85 @@
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.services.chunk_store import ChunkStore, pack_context
+
+# Chunks sent before packing, the top five as retrieved
+UNPACKED_CHUNKS = 5
+
+
+def count_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def paper_text(rng) -> str:
+    words = "model training data loss layer attention token batch".split()
+    paragraphs = []
+    for p in range(30):
+        # Longer than a chunk, so chunks overlap within a paragraph
+        sentences = [
+            " ".join(rng.choice(words, size=12)).capitalize() + f" ({p})."
+            for _ in range(24)
+        ]
+        paragraphs.append(" ".join(sentences))
+    return "\n\n".join(paragraphs)
+
+
+def test_merge_drops_overlap_and_round_trips():
+    text = paper_text(np.random.default_rng(0))
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1000, chunk_overlap=200
+    )
+    chunks = splitter.split_text(text)
+    store = ChunkStore.build(text, chunks)
+    assert (store.starts >= 0).all()
+
+    merged = store.merge(0, len(chunks) - 1)
+    # Overlap is sent once; only whitespace between paragraphs changes
+    assert merged.split() == text.split()
+    assert len(merged) < sum(map(len, chunks))
+
+    loaded = ChunkStore.from_bytes(store.to_bytes())
+    assert loaded.texts == chunks
+    assert loaded.merge(3, 5) == store.merge(3, 5)
+
+
+def test_pack_context_cuts_prompt_tokens():
+    rng = np.random.default_rng(1)
+    text = paper_text(rng)
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1000, chunk_overlap=200
+    )
+    chunks = splitter.split_text(text)
+    store = ChunkStore.build(text, chunks)
+
+    before = after = 0
+    questions = 50
+    for _ in range(questions):
+        # Relevant chunks cluster around a section of the paper
+        centre = int(rng.integers(2, len(chunks) - 8))
+        ids = centre + rng.permutation(6)
+        matches = [
+            (int(chunk_id), 1.0 / (rank + 1))
+            for rank, chunk_id in enumerate(ids)
+        ] + [(0, 0.05), (len(chunks) - 1, 0.04)]
+        top = [chunk_id for chunk_id, _ in matches[:UNPACKED_CHUNKS]]
+        unpacked = sum(count_tokens(chunks[i]) for i in top)
+        # The same chunks fit in fewer tokens once overlap is merged
+        ordered = np.sort(top)
+        runs = np.split(ordered, np.flatnonzero(np.diff(ordered) > 1) + 1)
+        merged = sum(
+            count_tokens(store.merge(run[0], run[-1])) for run in runs
+        )
+        passages = pack_context(
+            store, matches[:UNPACKED_CHUNKS], merged, count_tokens
+        )
+        packed_ids = {i for p in passages for i in p["chunk_ids"]}
+        assert packed_ids == set(top)
+        assert passages[0]["score"] == 1.0
+        before += unpacked
+        after += sum(count_tokens(p["text"]) for p in passages)
+        # With a tighter budget, the best chunks are kept, whole
+        passages = pack_context(store, matches, 600, count_tokens)
+        assert sum(count_tokens(p["text"]) for p in passages) <= 600
+        assert int(ids[0]) in passages[0]["chunk_ids"]
+    assert after < before * 0.95
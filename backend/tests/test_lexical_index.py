@@ -0,0 +1,40 @@
+import json
+
+from app.services.lexical_index import LexicalIndex, tokenize
+
+
+def test_tokenize_keeps_identifiers():
+    assert tokenize("The ResNet-50 model beats GPT-4 on MMLU (v1.2).") == [
+        "resnet-50",
+        "model",
+        "beats",
+        "gpt-4",
+        "mmlu",
+        "v1.2",
+    ]
+
+
+def test_search_ranks_exact_terms_and_round_trips():
+    chunks = [
+        f"Section {i} discusses training dynamics of transformer models."
+        for i in range(200)
+    ]
+    chunks[17] += " We fine-tune LLaMA-2 on the GSM8K benchmark."
+    chunks[42] += " GSM8K results are reported in Table 3."
+    index = LexicalIndex.build(chunks)
+
+    matches = index.search("How does LLaMA-2 do on GSM8K?", 5)
+    assert [chunk_id for chunk_id, _ in matches] == [17, 42]
+    assert index.search("unseen terms only", 5) == []
+
+    data = index.to_bytes()
+    loaded = LexicalIndex.from_bytes(data)
+    assert loaded.search("llama-2 gsm8k", 5) == index.search(
+        "llama-2 gsm8k", 5
+    )
+    # Flat postings arrays are smaller than the same postings as JSON
+    postings = {}
+    for chunk_id, chunk in enumerate(chunks):
+        for term in tokenize(chunk):
+            postings.setdefault(term, []).append(chunk_id)
+    assert len(data) < len(json.dumps(postings))
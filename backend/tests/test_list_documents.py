@@ -0,0 +1,127 @@
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import boto3
+import pytest
+
+from app.config import get_settings
+from app.database import Storage
+from app.models import RECORD_TYPE, ProcessingStatus
+
+settings = get_settings()
+BENCHMARK_ITEMS = int(os.environ.get("LIST_BENCHMARK_ITEMS", "100000"))
+
+
+def make_item(tag: str, index: int, status: str) -> dict:
+    upload_date = datetime(2025, 1, 1) + timedelta(minutes=index)
+    return {
+        "id": str(uuid.uuid4()),
+        "title": f"Paper {index}",
+        "document_type": "RESEARCH_PAPER",
+        "authors": [],
+        "upload_date": upload_date.isoformat(),
+        "status": status,
+        "tags": [tag],
+        "pdf_key": f"pdfs/{index}.pdf",
+        "record_type": RECORD_TYPE,
+    }
+
+
+def seed(endpoint: str, items: list) -> None:
+    table = boto3.resource(
+        "dynamodb",
+        endpoint_url=endpoint,
+        region_name=settings.aws_region,
+        aws_access_key_id="test",
+        aws_secret_access_key="test",
+    ).Table(settings.dynamodb_table)
+    with table.batch_writer() as batch:
+        for item in items:
+            batch.put_item(Item=item)
+
+
+@pytest.mark.asyncio
+async def test_list_documents_paginates_with_filters(moto_endpoint):
+    tag = uuid.uuid4().hex
+    statuses = [ProcessingStatus.COMPLETED, ProcessingStatus.FAILED]
+    seed(
+        moto_endpoint,
+        [make_item(tag, i, statuses[i % 2].value) for i in range(5)],
+    )
+    storage = Storage(moto_endpoint)
+    titles = []
+    cursor = None
+    while True:
+        page = await storage.list_documents(limit=2, cursor=cursor, tag=tag)
+        assert len(page["items"]) <= 2
+        assert all("pdf_key" not in item for item in page["items"])
+        titles.extend(item["title"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert titles == [f"Paper {i}" for i in reversed(range(5))]
+    failed = await storage.list_documents(
+        status=ProcessingStatus.FAILED.value, tag=tag
+    )
+    assert [item["title"] for item in failed["items"]] == [
+        "Paper 3",
+        "Paper 1",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_backfill_lists_documents_saved_without_record_type(
+    moto_endpoint, monkeypatch
+):
+    from app import backfill_record_type as module
+
+    tag = uuid.uuid4().hex
+    legacy = make_item(tag, 0, ProcessingStatus.COMPLETED.value)
+    del legacy["record_type"]
+    seed(moto_endpoint, [legacy])
+    storage = Storage(moto_endpoint)
+    listed = await storage.list_documents(tag=tag)
+    assert listed["items"] == []
+
+    monkeypatch.setattr(module, "storage", storage)
+    assert await module.backfill_record_type() >= 1
+    listed = await storage.list_documents(tag=tag)
+    assert [item["id"] for item in listed["items"]] == [legacy["id"]]
+    # Nothing is left to backfill on a rerun
+    assert await module.backfill_record_type() == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.benchmark
+async def test_benchmark_first_page_against_full_scan(moto_endpoint):
+    tag = uuid.uuid4().hex
+    seed(
+        moto_endpoint,
+        [
+            make_item(tag, i, ProcessingStatus.COMPLETED.value)
+            for i in range(BENCHMARK_ITEMS)
+        ],
+    )
+    storage = Storage(moto_endpoint)
+    start = time.perf_counter()
+    page = await storage.list_documents(limit=50)
+    page_time = time.perf_counter() - start
+    # Previous behaviour: scan every item and attribute
+    start = time.perf_counter()
+    scanned = 0
+    scan_kwargs = {}
+    while True:
+        response = storage.table.scan(**scan_kwargs)
+        scanned += len(response["Items"])
+        if "LastEvaluatedKey" not in response:
+            break
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    scan_time = time.perf_counter() - start
+    print(
+        f"{scanned} items: first page {page_time * 1000:.0f}ms, "
+        f"full scan {scan_time * 1000:.0f}ms"
+    )
+    assert len(page["items"]) == 50
+    assert page_time < scan_time
@@ -0,0 +1,337 @@
+import asyncio
+import importlib
+import os
+import time
+
+import pytest
+from langchain_core.runnables import RunnableGenerator, RunnableLambda
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from app.services.cache_service import MemoryCache, ResultCache  # noqa: E402
+from app.services.llm_service import LLMService  # noqa: E402
+
+LATENCY = 0.2
+
+
+def make_stub_llm(latency: float = LATENCY, fail_on: str = None):
+    """Stub chat model that sleeps to simulate a remote round trip"""
+
+    async def respond(prompt_value) -> str:
+        await asyncio.sleep(latency)
+        prompt = prompt_value.to_string()
+        if fail_on and fail_on in prompt:
+            raise ValueError("stub failure")
+        return prompt.strip().splitlines()[-1].strip()
+
+    return RunnableLambda(respond)
+
+
+@pytest.mark.asyncio
+async def test_process_document_runs_chains_concurrently():
+    in_flight = peak = 0
+
+    async def respond(prompt_value) -> str:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return prompt_value.to_string().strip().splitlines()[-1].strip()
+
+    service = LLMService(llm=RunnableLambda(respond), cache=ResultCache())
+    sequential = await service.process_document("paper", concurrent=False)
+    assert peak == 1
+    concurrent = await service.process_document("paper", concurrent=True)
+    assert peak == 3
+    assert sequential == concurrent
+
+
+@pytest.mark.asyncio
+@pytest.mark.benchmark
+async def test_benchmark_process_document_concurrent_against_sequential():
+    service = LLMService(llm=make_stub_llm(), cache=ResultCache())
+    start = time.perf_counter()
+    await service.process_document("paper", concurrent=False)
+    sequential_time = time.perf_counter() - start
+    start = time.perf_counter()
+    await service.process_document("paper", concurrent=True)
+    concurrent_time = time.perf_counter() - start
+    print(
+        f"sequential={sequential_time:.2f}s concurrent={concurrent_time:.2f}s"
+    )
+    assert concurrent_time < sequential_time / 2
+
+
+@pytest.mark.asyncio
+async def test_process_document_keeps_partial_results():
+    service = LLMService(
+        llm=make_stub_llm(fail_on="Analysis:"), cache=ResultCache()
+    )
+    results = await service.process_document("paper", concurrent=True)
+    assert results["summary"] == "Summary:"
+    assert results["opportunities"] == "Opportunities:"
+    assert results["insights"] is None
+    assert "insights" in results["errors"]
+
+
+@pytest.mark.asyncio
+async def test_process_document_map_reduces_long_text(monkeypatch):
+    module = importlib.import_module("app.services.llm_service")
+
+    monkeypatch.setattr(module.settings, "llm_max_input_tokens", 100)
+    service = LLMService(llm=make_stub_llm(latency=0), cache=ResultCache())
+    chunks = [f"section {i} " * 40 for i in range(10)]
+    results = await service.process_document("\n\n".join(chunks), chunks)
+    metrics = results["metrics"]
+    assert metrics["map_levels"] >= 1
+    assert metrics["map_calls"] >= len(chunks)
+    assert results["summary"] == "Summary:"
+
+
+@pytest.mark.asyncio
+async def test_condense_stops_when_summaries_do_not_shrink(monkeypatch):
+    module = importlib.import_module("app.services.llm_service")
+
+    monkeypatch.setattr(module.settings, "llm_max_input_tokens", 100)
+    calls = 0
+
+    async def verbose(prompt_value) -> str:
+        nonlocal calls
+        calls += 1
+        # Every "summary" is longer than the whole budget
+        return "summary " * 200
+
+    service = LLMService(llm=RunnableLambda(verbose), cache=ResultCache())
+    chunks = [f"section {i} " * 40 for i in range(10)]
+    metrics = {"map_levels": 0, "map_calls": 0, "tokens_sent": 0}
+    text = await asyncio.wait_for(
+        service.condense("\n\n".join(chunks), chunks, metrics), 5
+    )
+    assert service.count_tokens(text) <= 100
+    assert metrics["map_levels"] <= module.MAX_MAP_LEVELS
+    assert calls == metrics["map_calls"]
+
+
+@pytest.mark.asyncio
+async def test_generate_summary_reuses_cached_result():
+    calls = []
+
+    async def respond(prompt_value) -> str:
+        calls.append(prompt_value)
+        return "cached summary"
+
+    service = LLMService(llm=RunnableLambda(respond), cache=MemoryCache(8))
+    assert await service.generate_summary("paper") == "cached summary"
+    assert await service.generate_summary("paper") == "cached summary"
+    assert len(calls) == 1
+
+
+def make_metadata_llm(latency: float = LATENCY):
+    """Stub chat model answering the metadata prompt with JSON"""
+
+    async def respond(prompt_value) -> str:
+        await asyncio.sleep(latency)
+        prompt = prompt_value.to_string().strip()
+        if prompt.endswith("JSON:"):
+            return (
+                '```json\n{"title": " Attention Is All You Need ", '
+                '"authors": ["A. Vaswani", ""], '
+                '"publication_date": "2017-06-12T00:00:00", '
+                '"keywords": "transformers, attention"}\n```'
+            )
+        return prompt.splitlines()[-1]
+
+    return RunnableLambda(respond)
+
+
+@pytest.mark.asyncio
+async def test_extract_metadata_normalizes_fields():
+    service = LLMService(llm=make_metadata_llm(0), cache=ResultCache())
+    metadata = await service.extract_metadata("paper")
+    assert metadata == {
+        "title": "Attention Is All You Need",
+        "authors": ["A. Vaswani"],
+        "publication_date": "2017-06-12",
+        "keywords": ["transformers", "attention"],
+    }
+    failing = LLMService(
+        llm=make_stub_llm(latency=0, fail_on="JSON:"), cache=ResultCache()
+    )
+    assert (await failing.extract_metadata("paper"))["title"] is None
+
+
+@pytest.mark.asyncio
+async def test_extract_metadata_runs_alongside_analysis():
+    metadata_llm = make_metadata_llm(0.01)
+    in_flight = peak = 0
+
+    async def respond(prompt_value) -> str:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            return await metadata_llm.ainvoke(prompt_value)
+        finally:
+            in_flight -= 1
+
+    service = LLMService(llm=RunnableLambda(respond), cache=ResultCache())
+    metadata, results = await asyncio.gather(
+        service.extract_metadata("paper"),
+        service.process_document("paper", concurrent=True),
+    )
+    assert metadata["title"] == "Attention Is All You Need"
+    assert results["summary"].strip() == "Summary:"
+    assert peak == 4
+
+
+@pytest.mark.asyncio
+@pytest.mark.benchmark
+async def test_benchmark_extract_metadata_added_latency():
+    service = LLMService(llm=make_metadata_llm(), cache=ResultCache())
+    start = time.perf_counter()
+    await service.process_document("paper", concurrent=True)
+    analysis_time = time.perf_counter() - start
+    start = time.perf_counter()
+    await asyncio.gather(
+        service.extract_metadata("paper"),
+        service.process_document("paper", concurrent=True),
+    )
+    combined_time = time.perf_counter() - start
+    print(
+        f"analysis={analysis_time:.2f}s "
+        f"with metadata={combined_time:.2f}s "
+        f"added={combined_time - analysis_time:.2f}s"
+    )
+    assert combined_time - analysis_time < LATENCY / 2
+
+
+class StubEmbeddings:
+    model = "stub-embedding"
+
+    def __init__(self):
+        self.requests = []
+
+    async def aembed_documents(self, texts):
+        self.requests.append(list(texts))
+        return [[float(len(text)), 0.5] for text in texts]
+
+
+@pytest.mark.asyncio
+async def test_create_embeddings_batches_only_cache_misses(monkeypatch):
+    module = importlib.import_module("app.services.llm_service")
+
+    monkeypatch.setattr(module.settings, "embedding_batch_size", 2)
+    embeddings = StubEmbeddings()
+    results = MemoryCache(16)
+    service = LLMService(
+        llm=make_stub_llm(),
+        embeddings=embeddings,
+        cache=results,
+        embedding_cache=MemoryCache(16),
+    )
+    await service.create_embeddings(["a", "bb"])
+    stats = {}
+    texts = ["a", "ccc", "bb", "dddd"]
+    vectors = await service.create_embeddings(texts, stats)
+    assert vectors == [[1.0, 0.5], [3.0, 0.5], [2.0, 0.5], [4.0, 0.5]]
+    assert embeddings.requests == [["a", "bb"], ["ccc", "dddd"]]
+    assert stats == {"hits": 2, "misses": 2, "bytes_saved": 3}
+    # Chunk embeddings never evict cached LLM results
+    assert len(results.entries) == 0
+
+
+@pytest.mark.asyncio
+async def test_embeddings_do_not_wait_for_chain_slots():
+    module = importlib.import_module("app.services.llm_service")
+
+    started = []
+    release = asyncio.Event()
+
+    async def blocked(prompt_value) -> str:
+        started.append(prompt_value)
+        await release.wait()
+        return "done"
+
+    embeddings = StubEmbeddings()
+    service = LLMService(
+        llm=RunnableLambda(blocked),
+        embeddings=embeddings,
+        cache=ResultCache(),
+        embedding_cache=ResultCache(),
+    )
+    analysis = asyncio.gather(
+        service.process_document("paper", concurrent=True),
+        service.extract_metadata("paper"),
+    )
+
+    async def slots_taken():
+        while len(started) < module.settings.llm_max_concurrency:
+            await asyncio.sleep(0)
+
+    try:
+        await asyncio.wait_for(slots_taken(), 1)
+        assert service.semaphore.locked()
+        # A query embedding is served while every chain slot is taken
+        vectors = await asyncio.wait_for(
+            service.create_embeddings(["query"]), 1
+        )
+        assert vectors == [[5.0, 0.5]]
+    finally:
+        release.set()
+        await analysis
+
+
+TOKEN_LATENCY = 0.02
+
+
+def make_streaming_llm(tokens, produced=None):
+    """Stub chat model producing tokens one at a time"""
+
+    async def stream(prompt_values):
+        async for _ in prompt_values:
+            pass
+        for token in tokens:
+            await asyncio.sleep(TOKEN_LATENCY)
+            if produced is not None:
+                produced.append(token)
+            yield token
+
+    return RunnableGenerator(stream)
+
+
+@pytest.mark.asyncio
+async def test_stream_answer_forwards_each_token():
+    tokens = [f"token{i} " for i in range(20)]
+    produced = []
+    service = LLMService(
+        llm=make_streaming_llm(tokens, produced), cache=ResultCache()
+    )
+    streamed = []
+    seen = []
+    async for token in service.stream_answer("question?", ["context"]):
+        seen.append(len(produced))
+        streamed.append(token)
+    assert streamed == tokens
+    # Every token arrives before the model produces the next one
+    assert seen == list(range(1, len(tokens) + 1))
+    answer = await service.answer_question("question?", ["context"])
+    assert answer == "".join(tokens)
+
+
+@pytest.mark.asyncio
+@pytest.mark.benchmark
+async def test_benchmark_stream_answer_first_token():
+    tokens = [f"token{i} " for i in range(20)]
+    service = LLMService(llm=make_streaming_llm(tokens), cache=ResultCache())
+    start = time.perf_counter()
+    first_token = None
+    async for _ in service.stream_answer("question?", ["context"]):
+        if first_token is None:
+            first_token = time.perf_counter() - start
+    total = time.perf_counter() - start
+    print(
+        f"first token {first_token * 1000:.0f}ms, "
+        f"total {total * 1000:.0f}ms"
+    )
+    assert first_token < total / 5
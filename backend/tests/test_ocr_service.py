@@ -0,0 +1,324 @@
+import asyncio
+import base64
+import importlib
+import io
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import pytest
+from PyPDF2 import PageObject, PdfReader, PdfWriter
+from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+from app.services.cache_service import MemoryCache, ResultCache
+from app.services.ocr_service import OCRService, score_page_text
+
+LATENCY = 0.2
+
+
+def make_pdf(page_count: int, text_pages=()) -> bytes:
+    """
+    PDF whose page widths encode the page numbers, with a text layer on
+    text_pages
+    """
+    writer = PdfWriter()
+    font = DictionaryObject(
+        {
+            NameObject("/Type"): NameObject("/Font"),
+            NameObject("/Subtype"): NameObject("/Type1"),
+            NameObject("/BaseFont"): NameObject("/Helvetica"),
+        }
+    )
+    for i in range(page_count):
+        page = PageObject.create_blank_page(width=100 + i, height=800)
+        if i in text_pages:
+            lines = " ".join(
+                f"(Text layer of page {i}, line {line}) Tj T*"
+                for line in range(20)
+            )
+            stream = DecodedStreamObject()
+            stream.set_data(
+                f"BT /F1 10 Tf 12 TL 20 780 Td {lines} ET".encode()
+            )
+            page[NameObject("/Contents")] = writer._add_object(stream)
+            fonts = DictionaryObject({NameObject("/F1"): font})
+            page[NameObject("/Resources")] = DictionaryObject(
+                {NameObject("/Font"): fonts}
+            )
+        writer.add_page(page)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+class StubOCR:
+    """Stub OCR API that sleeps to simulate a remote round trip"""
+
+    def __init__(self, latency: float = LATENCY, fail_pages=(), drop_pages=()):
+        self.latency = latency
+        self.fail_pages = set(fail_pages)
+        # Pages left out of the response
+        self.drop_pages = set(drop_pages)
+        self.requested_pages = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def process_async(self, model, document, include_image_base64):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(self.latency)
+        self.in_flight -= 1
+        content = base64.b64decode(document["document_base64"])
+        pages = [
+            int(page.mediabox.width) - 100
+            for page in PdfReader(io.BytesIO(content)).pages
+        ]
+        self.requested_pages.append(pages)
+        if self.fail_pages & set(pages):
+            raise RuntimeError("stub failure")
+        return SimpleNamespace(
+            pages=[
+                SimpleNamespace(blocks=[SimpleNamespace(text=f"page {i}")])
+                for i in pages
+                if i not in self.drop_pages
+            ]
+        )
+
+
+def make_service(ocr: StubOCR, cache=None, page_cache=None) -> OCRService:
+    return OCRService(
+        client=SimpleNamespace(ocr=ocr),
+        cache=cache if cache is not None else ResultCache(),
+        page_cache=page_cache if page_cache is not None else ResultCache(),
+    )
+
+
+@pytest.mark.asyncio
+async def test_process_pdf_ranges_are_concurrent_and_ordered(monkeypatch):
+    module = importlib.import_module("app.services.ocr_service")
+
+    monkeypatch.setattr(module.settings, "ocr_max_retries", 0)
+    monkeypatch.setattr(module.settings, "ocr_pages_per_range", 8)
+    ocr = StubOCR(latency=0.01)
+    service = make_service(ocr)
+    text = await service.process_pdf(make_pdf(32))
+    assert text == "\n".join(f"page {i}" for i in range(32))
+    assert sorted(ocr.requested_pages) == [
+        list(range(start, start + 8)) for start in range(0, 32, 8)
+    ]
+    assert ocr.peak == 4
+
+
+@pytest.mark.asyncio
+@pytest.mark.benchmark
+async def test_benchmark_process_pdf_ranges_against_whole(monkeypatch):
+    module = importlib.import_module("app.services.ocr_service")
+
+    monkeypatch.setattr(module.settings, "ocr_max_retries", 0)
+    pdf = make_pdf(32)
+
+    monkeypatch.setattr(module.settings, "ocr_pages_per_range", 32)
+    service = make_service(StubOCR(latency=LATENCY * 4))
+    start = time.perf_counter()
+    whole = await service.process_pdf(pdf)
+    whole_time = time.perf_counter() - start
+
+    monkeypatch.setattr(module.settings, "ocr_pages_per_range", 8)
+    service = make_service(StubOCR())
+    start = time.perf_counter()
+    ranged = await service.process_pdf(pdf)
+    ranged_time = time.perf_counter() - start
+    print(f"whole={whole_time:.2f}s ranged={ranged_time:.2f}s")
+    assert whole == ranged
+    assert ranged_time < whole_time / 2
+
+
+@pytest.mark.asyncio
+async def test_process_pdf_retries_only_failed_range(monkeypatch):
+    module = importlib.import_module("app.services.ocr_service")
+
+    monkeypatch.setattr(module.settings, "ocr_pages_per_range", 4)
+    monkeypatch.setattr(module.settings, "ocr_max_retries", 0)
+    pdf = make_pdf(12)
+    cache = MemoryCache(max_entries=100)
+    page_cache = MemoryCache(max_entries=100)
+    ocr = StubOCR(latency=0, fail_pages={5})
+    assert await make_service(ocr, cache, page_cache).process_pdf(pdf) is None
+    assert len(page_cache.entries) == 8
+
+    ocr = StubOCR(latency=0)
+    text = await make_service(ocr, cache, page_cache).process_pdf(pdf)
+    assert text == "\n".join(f"page {i}" for i in range(12))
+    # Pages of the ranges that succeeded came from the cache
+    assert ocr.requested_pages == [[4, 5, 6, 7]]
+    # Only the whole text stays cached
+    assert len(cache.entries) == 1
+    assert len(page_cache.entries) == 0
+
+
+@pytest.mark.asyncio
+async def test_ocr_range_rejects_missing_pages(monkeypatch):
+    module = importlib.import_module("app.services.ocr_service")
+
+    monkeypatch.setattr(module.settings, "ocr_pages_per_range", 4)
+    monkeypatch.setattr(module.settings, "ocr_max_retries", 0)
+    service = make_service(StubOCR(latency=0, drop_pages={6}))
+    with pytest.raises(ValueError, match="pages 4-7 returned 3 pages"):
+        async for _ in service.iter_pages(make_pdf(8)):
+            pass
+
+
+def test_score_page_text():
+    assert score_page_text("") == 0.0
+    assert score_page_text("Attention is all you need. " * 20) == 1.0
+    # Sparse pages and unmapped glyphs score low
+    assert score_page_text("Figure 3") < 0.1
+    assert score_page_text("(cid:12)(cid:34) " * 50) < 0.1
+    assert score_page_text("\ufffd" * 300) == 0.0
+
+
+@pytest.mark.asyncio
+async def test_process_pdf_uses_text_layer(monkeypatch):
+    module = importlib.import_module("app.services.ocr_service")
+
+    monkeypatch.setattr(module.settings, "ocr_pages_per_range", 8)
+    ocr = StubOCR(latency=0)
+    service = make_service(ocr)
+    stats = {}
+    text = await service.process_pdf(make_pdf(6, text_pages={0, 1, 4}), stats)
+    # Only the pages without a text layer are sent to OCR
+    assert ocr.requested_pages == [[2, 3], [5]]
+    assert stats == {"local_pages": 3, "remote_pages": 3}
+    assert service.page_stats == stats
+    assert "Text layer of page 0, line 0" in text
+    assert text.index("Text layer of page 1") < text.index("page 2\n")
+    assert text.index("page 3\n") < text.index("Text layer of page 4")
+    assert text.endswith("page 5")
+    await service.close()
+    assert service._local_pool is None
+
+
+def text_layer_corpus() -> list:
+    """Sample corpus: half the PDFs have a text layer on every page"""
+    return [
+        make_pdf(12, text_pages=range(12) if i % 2 else ()) for i in range(8)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_text_layer_skips_remote_ocr(monkeypatch):
+    module = importlib.import_module("app.services.ocr_service")
+
+    monkeypatch.setattr(module.settings, "ocr_pages_per_range", 4)
+    corpus = text_layer_corpus()
+    remote_pages = {}
+    for local_text in (False, True):
+        monkeypatch.setattr(module.settings, "ocr_local_text", local_text)
+        ocr = StubOCR(latency=0)
+        service = make_service(ocr)
+        texts = await asyncio.gather(*map(service.process_pdf, corpus))
+        assert all(texts)
+        remote_pages[local_text] = sum(map(len, ocr.requested_pages))
+    assert remote_pages == {False: 96, True: 48}
+    assert service.page_stats == {"local_pages": 48, "remote_pages": 48}
+
+
+@pytest.mark.asyncio
+@pytest.mark.benchmark
+async def test_benchmark_text_layer_throughput(monkeypatch):
+    module = importlib.import_module("app.services.ocr_service")
+
+    monkeypatch.setattr(module.settings, "ocr_pages_per_range", 4)
+    corpus = text_layer_corpus()
+    timings = {}
+    for local_text in (False, True):
+        monkeypatch.setattr(module.settings, "ocr_local_text", local_text)
+        service = make_service(StubOCR())
+        start = time.perf_counter()
+        await asyncio.gather(*map(service.process_pdf, corpus))
+        timings[local_text] = time.perf_counter() - start
+    pages = 12 * len(corpus)
+    print(
+        f"remote only={pages / timings[False]:.1f} pages/s "
+        f"text layer={pages / timings[True]:.1f} pages/s"
+    )
+    assert timings[True] < timings[False]
+
+
+class SyntheticOCR:
+    """Stub OCR API returning the same synthetic response for any PDF"""
+
+    def __init__(self, page_count: int, blocks_per_page: int = 20):
+        block = SimpleNamespace(text="Lorem ipsum dolor sit amet. " * 10)
+        self.response = SimpleNamespace(
+            pages=[
+                SimpleNamespace(blocks=[block] * blocks_per_page)
+                for _ in range(page_count)
+            ]
+        )
+
+    async def process_async(self, model, document, include_image_base64):
+        return self.response
+
+
+@pytest.mark.asyncio
+async def test_text_assembly_peak_memory(monkeypatch):
+    module = importlib.import_module("app.services.ocr_service")
+
+    monkeypatch.setattr(module.settings, "ocr_local_text", False)
+    monkeypatch.setattr(module.settings, "ocr_pages_per_range", 1000)
+    pdf = make_pdf(1000)
+    service = make_service(SyntheticOCR(1000))
+    tracemalloc.start()
+    text = await service.process_pdf(pdf)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(text) > 5_000_000
+    # The yielded pages plus the cached and the returned joined text
+    assert peak < 4 * len(text)
+
+
+@pytest.mark.asyncio
+@pytest.mark.benchmark
+async def test_benchmark_text_assembly(monkeypatch):
+    module = importlib.import_module("app.services.ocr_service")
+
+    monkeypatch.setattr(module.settings, "ocr_local_text", False)
+    monkeypatch.setattr(module.settings, "ocr_pages_per_range", 1000)
+    rows = []
+    for page_count in (250, 1000):
+        pdf = make_pdf(page_count)
+        service = make_service(SyntheticOCR(page_count))
+        tracemalloc.start()
+        start = time.perf_counter()
+        text = await service.process_pdf(pdf)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(
+            f"{page_count} pages: {len(text) / 1e6:.1f}M chars in "
+            f"{elapsed:.2f}s, peak {peak / 1e6:.1f}MB"
+        )
+        rows.append((elapsed, peak, len(text)))
+    (small_time, _, _), (large_time, large_peak, large_text) = rows
+    # Four times the pages: linear, not quadratic (16 times), assembly
+    assert large_time < small_time * 10
+    assert large_peak < 4 * large_text
+
+
+@pytest.mark.asyncio
+async def test_iter_pages_streams_in_page_order(monkeypatch):
+    module = importlib.import_module("app.services.ocr_service")
+
+    monkeypatch.setattr(module.settings, "ocr_pages_per_range", 2)
+    ocr = StubOCR()
+    service = make_service(ocr)
+    pages = []
+    completed = []
+    async for text in service.iter_pages(make_pdf(8, text_pages={0})):
+        completed.append(len(ocr.requested_pages))
+        pages.append(text)
+    # The text layer page is yielded before any OCR range completes
+    assert completed[0] == 0
+    assert pages[0].startswith("Text layer of page 0")
+    assert pages[1:] == [f"\npage {i}" for i in range(1, 8)]
@@ -0,0 +1,321 @@
+import asyncio
+import copy
+import random
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app import pipeline
+from app.database import Storage
+from app.models import ProcessingStage, ProcessingStatus
+from app.routers import documents
+from app.services.queue_service import InMemoryQueue
+
+TEXT = "Extracted text of the paper."
+
+
+def document(status: str, updated_at=None) -> dict:
+    metadata = {
+        "id": str(uuid.uuid4()),
+        "title": "Paper",
+        "document_type": "RESEARCH_PAPER",
+        "authors": [],
+        "upload_date": "2024-01-01T00:00:00",
+        "status": status,
+        "tags": [],
+        "pdf_key": "pdfs/paper.pdf",
+        "stages": {},
+    }
+    if updated_at is not None:
+        metadata["updated_at"] = updated_at.isoformat()
+    return metadata
+
+
+@pytest.fixture
+def reprocess_env(moto_endpoint, monkeypatch):
+    storage = Storage(moto_endpoint)
+    queue = InMemoryQueue()
+    monkeypatch.setattr(documents, "storage", storage)
+    monkeypatch.setattr(documents, "processing_queue", queue)
+    monkeypatch.setattr(documents.settings, "processing_stale_after", 3600)
+    return storage, queue
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "status",
+    [
+        ProcessingStatus.PENDING,
+        ProcessingStatus.PROCESSING,
+        ProcessingStatus.INDEXED,
+    ],
+)
+async def test_reprocess_rejects_documents_in_flight(reprocess_env, status):
+    storage, queue = reprocess_env
+    metadata = document(status.value, datetime.utcnow())
+    await storage.save_document_metadata(metadata)
+    with pytest.raises(HTTPException) as raised:
+        await documents.reprocess_document(uuid.UUID(metadata["id"]))
+    assert raised.value.status_code == 409
+    assert await queue.depth() == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "status", [ProcessingStatus.PROCESSING, ProcessingStatus.INDEXED]
+)
+async def test_reprocess_recovers_stale_processing(reprocess_env, status):
+    storage, queue = reprocess_env
+    metadata = document(
+        status.value, datetime.utcnow() - timedelta(seconds=7200)
+    )
+    await storage.save_document_metadata(metadata)
+    response = await documents.reprocess_document(uuid.UUID(metadata["id"]))
+    assert response.status == ProcessingStatus.PENDING
+    assert await queue.depth() == 1
+    saved = await storage.get_document_metadata(metadata["id"])
+    assert saved["status"] == ProcessingStatus.PENDING
+
+
+class StubStorage:
+    """Document metadata in memory, with a snapshot of every save"""
+
+    def __init__(self, metadata):
+        self.metadata = copy.deepcopy(metadata)
+        self.saves = []
+
+    async def get_document_metadata(self, document_id):
+        return copy.deepcopy(self.metadata)
+
+    async def save_document_metadata(self, metadata):
+        self.metadata = copy.deepcopy(metadata)
+        self.saves.append(self.metadata)
+        return True
+
+    async def get_text(self, key):
+        return TEXT
+
+
+class StubStages:
+    """Stage handlers that record the order they ran in"""
+
+    def __init__(self):
+        self.ran = []
+
+    def handler(self, stage):
+        async def run(metadata, state):
+            self.ran.append(stage)
+            if stage == ProcessingStage.OCR:
+                state["text"] = TEXT
+                metadata["raw_text_key"] = "raw_text/paper.txt"
+            return f"{stage.value} artifact"
+
+        return run
+
+
+def checkpointed(stages) -> dict:
+    metadata = document(ProcessingStatus.FAILED.value)
+    metadata["raw_text_key"] = "raw_text/paper.txt"
+    for stage in stages:
+        metadata["stages"][stage.value] = {
+            "status": ProcessingStatus.COMPLETED,
+            "artifact": f"{stage.value} artifact",
+            "duration_ms": 100,
+            "completed_at": "2024-01-01T00:00:00",
+        }
+    return metadata
+
+
+@pytest.fixture
+def stub_pipeline(monkeypatch):
+    stages = StubStages()
+    monkeypatch.setattr(
+        pipeline,
+        "STAGE_HANDLERS",
+        {stage: stages.handler(stage) for stage in pipeline.STAGES},
+    )
+
+    def use_storage(metadata):
+        storage = StubStorage(metadata)
+        monkeypatch.setattr(pipeline, "storage", storage)
+        monkeypatch.setattr(documents, "storage", storage)
+        return storage
+
+    return stages, use_storage
+
+
+FETCH, OCR, PERSIST_TEXT, LLM, INDEX = pipeline.STAGES
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "completed, expected",
+    [
+        ([], [FETCH, OCR, PERSIST_TEXT, LLM, INDEX]),
+        ([FETCH], [OCR, PERSIST_TEXT, LLM, INDEX]),
+        ([FETCH, OCR], [PERSIST_TEXT, LLM, INDEX]),
+        ([FETCH, OCR, PERSIST_TEXT], [LLM, INDEX]),
+        ([FETCH, OCR, PERSIST_TEXT, LLM], [INDEX]),
+        ([FETCH, OCR, PERSIST_TEXT, INDEX], [LLM]),
+        ([FETCH, OCR, PERSIST_TEXT, LLM, INDEX], []),
+        # Later checkpoints depend on the missing one, so they rerun
+        ([FETCH, PERSIST_TEXT, LLM, INDEX], [OCR, PERSIST_TEXT, LLM, INDEX]),
+    ],
+)
+async def test_resume_skips_checkpointed_stages(
+    stub_pipeline, completed, expected
+):
+    stages, use_storage = stub_pipeline
+    storage = use_storage(checkpointed(completed))
+
+    await pipeline.process_document_task(uuid.UUID(storage.metadata["id"]))
+
+    assert sorted(stages.ran) == sorted(expected)
+    # Text extraction stages run in order, before both branches
+    sequential = [s for s in expected if s in pipeline.SEQUENTIAL_STAGES]
+    assert stages.ran[: len(sequential)] == sequential
+    saved = storage.metadata
+    assert saved["status"] == ProcessingStatus.COMPLETED
+    assert all(pipeline.stage_completed(saved, s) for s in pipeline.STAGES)
+    if completed and expected:
+        assert saved["resume_savings"]["skipped_stages"] == [
+            s.value for s in pipeline.STAGES if s not in expected
+        ]
+
+
+@pytest.mark.asyncio
+async def test_llm_and_index_run_concurrently_and_index_first(stub_pipeline):
+    stages, use_storage = stub_pipeline
+    storage = use_storage(checkpointed([FETCH, OCR, PERSIST_TEXT]))
+    started = {LLM: asyncio.Event(), INDEX: asyncio.Event()}
+    indexed = asyncio.Event()
+
+    async def llm(metadata, state):
+        started[LLM].set()
+        # Deadlocks, and times out, unless indexing runs alongside
+        await asyncio.wait_for(started[INDEX].wait(), 5)
+        await asyncio.wait_for(indexed.wait(), 5)
+        return "llm artifact"
+
+    async def index(metadata, state):
+        started[INDEX].set()
+        await asyncio.wait_for(started[LLM].wait(), 5)
+        return 1
+
+    pipeline.STAGE_HANDLERS[LLM] = llm
+    pipeline.STAGE_HANDLERS[INDEX] = index
+    save = storage.save_document_metadata
+
+    async def save_and_signal(metadata):
+        await save(metadata)
+        if pipeline.stage_completed(metadata, INDEX):
+            indexed.set()
+
+    storage.save_document_metadata = save_and_signal
+
+    await pipeline.process_document_task(uuid.UUID(storage.metadata["id"]))
+
+    statuses = [saved["status"] for saved in storage.saves]
+    # Answerable once indexed, complete once the analysis finishes too
+    assert statuses[0] == ProcessingStatus.PROCESSING
+    assert ProcessingStatus.INDEXED in statuses
+    assert statuses.index(ProcessingStatus.INDEXED) < statuses.index(
+        ProcessingStatus.COMPLETED
+    )
+    assert statuses[-1] == ProcessingStatus.COMPLETED
+    assert "time_to_indexed_ms" in storage.metadata
+
+
+@pytest.mark.asyncio
+async def test_failed_branch_marks_document_failed(stub_pipeline):
+    stages, use_storage = stub_pipeline
+    storage = use_storage(checkpointed([FETCH, OCR, PERSIST_TEXT]))
+
+    async def failing_llm(metadata, state):
+        raise RuntimeError("model unavailable")
+
+    pipeline.STAGE_HANDLERS[LLM] = failing_llm
+    with pytest.raises(RuntimeError):
+        await pipeline.process_document_task(uuid.UUID(storage.metadata["id"]))
+    saved = storage.metadata
+    assert saved["status"] == ProcessingStatus.FAILED
+    assert saved["failed_stage"] == LLM.value
+    # The index branch still checkpointed, so a retry only reruns the LLM
+    assert pipeline.pending_stages(saved) == [LLM]
+
+
+@pytest.mark.asyncio
+async def test_reprocess_from_stage_reruns_dependent_stages(
+    stub_pipeline, monkeypatch
+):
+    stages, use_storage = stub_pipeline
+    storage = use_storage(checkpointed(pipeline.STAGES))
+    storage.metadata["status"] = ProcessingStatus.COMPLETED
+    queue = InMemoryQueue()
+    monkeypatch.setattr(documents, "processing_queue", queue)
+    document_id = uuid.UUID(storage.metadata["id"])
+
+    await documents.reprocess_document(document_id, PERSIST_TEXT)
+    assert storage.metadata["status"] == ProcessingStatus.PENDING
+    [job] = await queue.receive(wait_seconds=1)
+    await pipeline.process_document_task(uuid.UUID(job.document_id))
+    assert sorted(stages.ran) == sorted([PERSIST_TEXT, LLM, INDEX])
+
+    # Without from_stage, a completed document is processed from scratch
+    stages.ran.clear()
+    await documents.reprocess_document(document_id)
+    await pipeline.process_document_task(document_id)
+    assert sorted(stages.ran) == sorted(pipeline.STAGES)
+
+
+class StreamingStubStorage:
+    def __init__(self):
+        self.uploaded = ""
+
+    async def upload_text_stream(self, document_id, texts, prefix):
+        async for text in texts:
+            self.uploaded += text
+        return f"{prefix}/{document_id}.txt"
+
+    async def get_text(self, key):
+        return self.uploaded
+
+
+class StubOCRService:
+    def __init__(self, pages):
+        self.pages = pages
+
+    async def iter_pages(self, pdf_content, page_stats):
+        for page in self.pages:
+            yield page
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("seed", range(5))
+async def test_ocr_stage_chunks_match_a_resumed_run(monkeypatch, seed):
+    rng = random.Random(seed)
+    words = ["attention", "layer", "loss", "token", "gradient", "batch"]
+    separators = [" ", " ", " ", ".\n", "\n\n"]
+    pages = [
+        "".join(
+            rng.choice(words) + rng.choice(separators)
+            for _ in range(rng.randint(0, 600))
+        )
+        for _ in range(rng.randint(1, 12))
+    ]
+    storage = StreamingStubStorage()
+    monkeypatch.setattr(pipeline, "storage", storage)
+    monkeypatch.setattr(pipeline, "ocr_service", StubOCRService(pages))
+    metadata = document(ProcessingStatus.PROCESSING.value)
+    state = {"pdf_content": b"%PDF"}
+
+    await pipeline.ocr_stage(metadata, state)
+    assert storage.uploaded == "".join(pages)
+    assert state["text"] == storage.uploaded
+
+    # A run resumed after OCR reads the uploaded text back and splits it
+    resumed = {}
+    assert await pipeline._extracted_text(metadata, resumed) == state["text"]
+    assert pipeline._chunks(resumed) == state["chunks"]
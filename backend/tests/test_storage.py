@@ -0,0 +1,81 @@
+import uuid
+
+import pytest
+
+from app.database import STREAM_CHUNK_SIZE, AsyncStorage, Storage
+
+
+async def read_stream(result: dict) -> bytes:
+    return b"".join([chunk async for chunk in result["body"]])
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("storage_class", [Storage, AsyncStorage])
+async def test_stream_object_supports_range_and_etag(
+    moto_endpoint, storage_class
+):
+    storage = storage_class(moto_endpoint)
+    text = "x" * (STREAM_CHUNK_SIZE * 2 + 10)
+    key = await storage.upload_text(uuid.uuid4(), text, "raw_text")
+
+    full = await storage.stream_object(key)
+    assert full["status_code"] == 200
+    assert await read_stream(full) == text.encode("utf-8")
+
+    partial = await storage.stream_object(key, byte_range="bytes=0-9")
+    assert partial["status_code"] == 206
+    assert partial["headers"]["Content-Range"].startswith("bytes 0-9/")
+    assert await read_stream(partial) == b"x" * 10
+
+    etag = full["headers"]["ETag"]
+    unchanged = await storage.stream_object(key, if_none_match=etag)
+    assert unchanged["status_code"] == 304
+    assert unchanged["body"] is None
+    await storage.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("storage_class", [Storage, AsyncStorage])
+async def test_upload_text_stream(moto_endpoint, storage_class):
+    storage = storage_class(moto_endpoint)
+    pages = [f"Page {i}\n" * 1000 for i in range(20)]
+
+    async def page_texts():
+        for page in pages:
+            yield page
+
+    key = await storage.upload_text_stream(
+        uuid.uuid4(), page_texts(), "raw_text"
+    )
+    assert await storage.get_text(key) == "".join(pages)
+
+    async def failing_texts():
+        yield "partial"
+        raise RuntimeError("OCR failed")
+
+    with pytest.raises(RuntimeError):
+        await storage.upload_text_stream(
+            uuid.uuid4(), failing_texts(), "raw_text"
+        )
+    await storage.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("storage_class", [Storage, AsyncStorage])
+async def test_find_document_by_hash_skips_failed(
+    moto_endpoint, storage_class
+):
+    storage = storage_class(moto_endpoint)
+    content_hash = uuid.uuid4().hex
+    assert await storage.find_document_by_hash(content_hash) is None
+
+    failed_id, current_id = str(uuid.uuid4()), str(uuid.uuid4())
+    for document_id, status in (
+        (failed_id, "FAILED"),
+        (current_id, "PENDING"),
+    ):
+        await storage.save_document_metadata(
+            {"id": document_id, "status": status, "content_hash": content_hash}
+        )
+    assert await storage.find_document_by_hash(content_hash) == current_id
+    await storage.close()
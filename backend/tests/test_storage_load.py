@@ -0,0 +1,137 @@
+import asyncio
+import hashlib
+import importlib
+import time
+import uuid
+
+import pytest
+
+from app.database import AsyncStorage, Storage, UploadTooLargeError
+
+REQUESTS = 200
+
+
+async def fetch_concurrently(storage: Storage) -> tuple:
+    """Save one document, then fetch it concurrently"""
+    document_id = uuid.uuid4()
+    await storage.save_document_metadata(
+        {"id": document_id, "title": "Load Test"}
+    )
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(storage.get_document_metadata(document_id) for _ in range(REQUESTS))
+    )
+    elapsed = time.perf_counter() - start
+    await storage.close()
+    return results, elapsed
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("storage_class", [Storage, AsyncStorage])
+async def test_concurrent_get_document_returns_every_item(
+    moto_endpoint, storage_class
+):
+    results, _ = await fetch_concurrently(storage_class(moto_endpoint))
+    assert len(results) == REQUESTS
+    assert all(item["title"] == "Load Test" for item in results)
+
+
+class TableLatency:
+    """
+    Adds the DynamoDB round trip a local moto server lacks; moto answers
+    one request at a time, so without it concurrency cannot show
+    """
+
+    DELAY = 0.01
+
+    async def _table_call(self, method: str, **kwargs):
+        await asyncio.sleep(self.DELAY)
+        return await super()._table_call(method, **kwargs)
+
+
+@pytest.mark.asyncio
+@pytest.mark.benchmark
+@pytest.mark.parametrize("storage_class", [Storage, AsyncStorage])
+async def test_benchmark_concurrent_get_document_throughput(
+    moto_endpoint, storage_class
+):
+    delayed_class = type(
+        storage_class.__name__, (TableLatency, storage_class), {}
+    )
+    storage = delayed_class(moto_endpoint)
+    document_id = uuid.uuid4()
+    await storage.save_document_metadata(
+        {"id": document_id, "title": "Load Test"}
+    )
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        await storage.get_document_metadata(document_id)
+    sequential = time.perf_counter() - start
+    _, concurrent = await fetch_concurrently(storage)
+    print(
+        f"{storage_class.__name__}: {REQUESTS / sequential:.0f} requests/s "
+        f"one at a time, {REQUESTS / concurrent:.0f} requests/s concurrently"
+    )
+    assert concurrent < sequential
+
+
+class DelayedStorage(Storage):
+    """Storage whose S3 reads take a fixed latency and record overlap"""
+
+    DELAY = 0.01
+
+    def __init__(self):
+        self.bucket_name = "test-bucket"
+        self.in_flight = 0
+        self.peak = 0
+
+    async def _read_object(self, key: str) -> bytes:
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(self.DELAY)
+        self.in_flight -= 1
+        return key.encode("utf-8")
+
+
+@pytest.mark.asyncio
+async def test_get_texts_fetches_concurrently():
+    storage = DelayedStorage()
+    keys = {
+        "raw_text": "raw_text/1.txt",
+        "summary": "summaries/1.txt",
+        "insights": "insights/1.txt",
+        "opportunities": None,
+    }
+    texts = await storage.get_texts(keys)
+    assert texts == {
+        "raw_text": "raw_text/1.txt",
+        "summary": "summaries/1.txt",
+        "insights": "insights/1.txt",
+        "opportunities": None,
+    }
+    assert storage.peak == 3
+
+
+async def pdf_chunks(total: int, chunk_size: int = 64 * 1024):
+    for offset in range(0, total, chunk_size):
+        yield b"%" * min(chunk_size, total - offset)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("storage_class", [Storage, AsyncStorage])
+async def test_upload_pdf_stream_in_parts(moto_endpoint, storage_class):
+    database = importlib.import_module("app.database")
+
+    storage = storage_class(moto_endpoint)
+    total = 3 * database.MULTIPART_PART_SIZE + 1024
+    upload = await storage.upload_pdf_stream(
+        uuid.uuid4(), pdf_chunks(total), max_size=total
+    )
+    assert upload["size"] == total
+    assert upload["sha256"] == hashlib.sha256(b"%" * total).hexdigest()
+    assert len(await storage.get_pdf(upload["key"])) == total
+    with pytest.raises(UploadTooLargeError):
+        await storage.upload_pdf_stream(
+            uuid.uuid4(), pdf_chunks(total), max_size=total - 1
+        )
+    await storage.close()
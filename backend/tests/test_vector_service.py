@@ -0,0 +1,405 @@
+import asyncio
+import importlib
+import re
+import time
+import uuid
+
+import numpy as np
+import pytest
+
+from app.database import Storage
+from app.services.vector_service import VectorService
+from app.services.vector_store import LocalVectorStore, vector_id
+
+DIMENSION = 32
+CHUNKS_PER_DOCUMENT = 40
+
+
+class StubLLMService:
+    """Embeds queries as the vectors registered for them"""
+
+    def __init__(self):
+        self.queries = {}
+
+    async def create_embeddings(self, texts, stats=None):
+        return [self.queries[text] for text in texts]
+
+
+async def index_corpus(service, rng, start: int, stop: int, topics: dict):
+    for doc in range(start, stop):
+        document_id = f"doc-{doc}"
+        topics[document_id] = rng.normal(size=DIMENSION)
+        chunks = topics[document_id] + rng.normal(
+            scale=0.5, size=(CHUNKS_PER_DOCUMENT, DIMENSION)
+        )
+        vectors = [
+            {
+                "id": vector_id(document_id, i),
+                "values": chunk.tolist(),
+                "metadata": {
+                    "document_id": document_id,
+                    "chunk_id": i,
+                    "chunk_text": f"chunk {i} of {document_id}",
+                },
+            }
+            for i, chunk in enumerate(chunks)
+        ]
+        await service.store.upsert(document_id, vectors)
+        await service.upsert_centroid(document_id, chunks.tolist())
+
+
+class RecordingStore(LocalVectorStore):
+    """Local store recording the namespace of every query"""
+
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.queried = []
+
+    async def query(self, vector, top_k, namespace=None):
+        self.queried.append(namespace)
+        return await super().query(vector, top_k, namespace)
+
+
+@pytest.mark.asyncio
+async def test_search_ranks_only_the_closest_documents(tmp_path, monkeypatch):
+    module = importlib.import_module("app.services.vector_service")
+
+    llm = StubLLMService()
+    monkeypatch.setattr(module, "llm_service", llm)
+    store = RecordingStore(str(tmp_path))
+    service = VectorService(store=store)
+    rng = np.random.default_rng(0)
+    topics = {}
+    indexed = 0
+    for corpus_size in (20, 200):
+        await index_corpus(service, rng, indexed, corpus_size, topics)
+        indexed = corpus_size
+        document_id = f"doc-{corpus_size - 1}"
+        llm.queries[document_id] = topics[document_id].tolist()
+        store.queried.clear()
+        matches = await service.search(document_id, top_k=5)
+        assert matches[0]["document_id"] == document_id
+        # One centroid query, then one per selected document
+        assert store.queried[0] == module.CENTROIDS_NAMESPACE
+        assert len(store.queried) == 1 + 5
+        assert document_id in store.queried
+
+
+@pytest.mark.asyncio
+@pytest.mark.benchmark
+async def test_benchmark_search_against_per_document_scan(
+    tmp_path, monkeypatch
+):
+    module = importlib.import_module("app.services.vector_service")
+
+    llm = StubLLMService()
+    monkeypatch.setattr(module, "llm_service", llm)
+    service = VectorService(store=LocalVectorStore(str(tmp_path)))
+    rng = np.random.default_rng(0)
+    topics = {}
+    indexed = 0
+    rows = []
+    for corpus_size in (100, 1000):
+        await index_corpus(service, rng, indexed, corpus_size, topics)
+        indexed = corpus_size
+        targets = list(topics)[-10:]
+        for document_id in targets:
+            llm.queries[document_id] = topics[document_id].tolist()
+
+        start = time.perf_counter()
+        for document_id in targets:
+            matches = await service.search(document_id, top_k=5)
+            assert matches[0]["document_id"] == document_id
+        search_time = (time.perf_counter() - start) / len(targets)
+
+        # Baseline: rank the chunks of every document
+        start = time.perf_counter()
+        for document_id in targets[:2]:
+            await asyncio.gather(
+                *(
+                    service.store.query(topics[document_id].tolist(), 5, d)
+                    for d in topics
+                )
+            )
+        scan_time = (time.perf_counter() - start) / 2
+        rows.append((corpus_size, search_time, scan_time))
+    for corpus_size, search_time, scan_time in rows:
+        print(
+            f"{corpus_size} documents: two-stage search "
+            f"{search_time * 1000:.1f}ms, per-document scan "
+            f"{scan_time * 1000:.1f}ms"
+        )
+    (_, small_search, _), (_, large_search, large_scan) = rows
+    assert large_search < small_search * 5
+    assert large_search < large_scan / 10
+
+
+@pytest.mark.asyncio
+async def test_search_applies_document_filter(
+    tmp_path, monkeypatch, moto_endpoint
+):
+    module = importlib.import_module("app.services.vector_service")
+
+    llm = StubLLMService()
+    monkeypatch.setattr(module, "llm_service", llm)
+    monkeypatch.setattr(module, "storage", Storage(moto_endpoint))
+    service = VectorService(store=LocalVectorStore(str(tmp_path)))
+    topics = {}
+    await index_corpus(service, np.random.default_rng(1), 0, 20, topics)
+    llm.queries["query"] = topics["doc-3"].tolist()
+
+    async def exclude_doc_3(document_ids):
+        return [d for d in document_ids if d != "doc-3"]
+
+    matches = await service.search(
+        "query", top_k=5, document_filter=exclude_doc_3
+    )
+    assert matches
+    assert "doc-3" not in {match["document_id"] for match in matches}
+
+    await service.delete_document("doc-3")
+    matches = await service.search("query", top_k=5)
+    assert "doc-3" not in {match["document_id"] for match in matches}
+
+
+class FakePineconeIndex:
+    """
+    In-memory Pinecone pod index: vectors are fetched by ID, as the
+    client has no way to list them
+    """
+
+    def __init__(self):
+        self.namespaces = {}
+
+    def upsert(self, vectors, namespace=""):
+        stored = self.namespaces.setdefault(namespace, {})
+        for vector in vectors:
+            stored[vector["id"]] = dict(vector)
+
+    def fetch(self, ids, namespace=""):
+        stored = self.namespaces.get(namespace, {})
+        return {"vectors": {i: stored[i] for i in ids if i in stored}}
+
+    def delete(self, ids=None, delete_all=False, namespace=""):
+        stored = self.namespaces.get(namespace, {})
+        for i in list(stored) if delete_all else ids:
+            stored.pop(i, None)
+
+
+class CentroidRecorder:
+    def __init__(self, store):
+        self.store = store
+        self.centroids = {}
+
+    async def upsert_centroid(self, document_id, embeddings):
+        self.centroids[document_id] = embeddings
+
+
+@pytest.mark.asyncio
+async def test_migration_moves_documents_without_record_type(
+    moto_endpoint, monkeypatch
+):
+    module = importlib.import_module("app.migrate_vectors")
+    vector_store = importlib.import_module("app.services.vector_store")
+
+    storage = Storage(moto_endpoint)
+    legacy_id, current_id = str(uuid.uuid4()), str(uuid.uuid4())
+    # Only the current document has its chunk count stored
+    for document_id, extra in (
+        (legacy_id, {}),
+        (current_id, {"chunks_indexed": 2}),
+    ):
+        await storage.save_document_metadata(
+            {
+                "id": document_id,
+                "title": "Paper",
+                "upload_date": "2024-01-01T00:00:00",
+                "status": "COMPLETED",
+                **extra,
+            }
+        )
+    # Only the current document is visible to list_documents
+    await storage.set_record_type(current_id)
+    index = FakePineconeIndex()
+    index.upsert(
+        [
+            {
+                "id": vector_id(document_id, i),
+                "values": [1.0, float(i)],
+                "metadata": {"document_id": document_id, "chunk_index": i},
+            }
+            for document_id, count in ((legacy_id, 250), (current_id, 2))
+            for i in range(count)
+        ]
+    )
+    store = vector_store.PineconeVectorStore(index=index)
+    service = CentroidRecorder(store)
+    monkeypatch.setattr(module, "storage", storage)
+    monkeypatch.setattr(module, "vector_service", service)
+
+    assert await module.migrate_to_namespaces() == 252
+    assert index.namespaces[""] == {}
+    assert len(index.namespaces[legacy_id]) == 250
+    assert index.namespaces[current_id][vector_id(current_id, 1)] == {
+        "id": vector_id(current_id, 1),
+        "values": [1.0, 1.0],
+        "metadata": {"document_id": current_id, "chunk_index": 1},
+    }
+    assert len(service.centroids[legacy_id]) == 250
+    assert set(service.centroids) == {legacy_id, current_id}
+    # A rerun finds nothing left to move
+    assert await module.migrate_to_namespaces() == 0
+
+
+TOPICS = 40
+CHUNKS_PER_TOPIC = 10
+# Simulated round trip of an embedding API call
+EMBEDDING_LATENCY = 0.005
+
+
+class TopicEmbeddings:
+    """
+    Embeds text as the vector of the topic it mentions, like a dense model
+    that captures what a text is about but not rare identifiers
+    """
+
+    def __init__(self, rng):
+        self.topics = rng.normal(size=(TOPICS, DIMENSION))
+        self.rng = rng
+        self.calls = 0
+
+    async def create_embeddings(self, texts, stats=None):
+        self.calls += 1
+        await asyncio.sleep(EMBEDDING_LATENCY)
+        if stats is not None:
+            stats.update(hits=0, bytes_saved=0)
+        embeddings = []
+        for text in texts:
+            topic = int(re.search(r"topic-(\d+)", text).group(1))
+            noise = self.rng.normal(scale=0.3, size=DIMENSION)
+            embeddings.append((self.topics[topic] + noise).tolist())
+        return embeddings
+
+    def count_tokens(self, text):
+        return len(text.split())
+
+
+def retrieval_corpus():
+    """Chunks about topics, each naming a unique model identifier"""
+    chunks = []
+    for topic in range(TOPICS):
+        for i in range(CHUNKS_PER_TOPIC):
+            chunks.append(
+                f"Experiments on topic-{topic} compare training recipes. "
+                f"We evaluate model-{topic}x{i} against strong baselines "
+                "and report accuracy with confidence intervals."
+            )
+    return chunks
+
+
+# Exact-term questions: the chunk naming the model is relevant
+EXACT_QUESTIONS = [
+    (f"How well does model-{t}x{i} do on topic-{t}?", t, i)
+    for t in range(0, TOPICS, 4)
+    for i in (2, 7)
+]
+
+
+async def indexed_retrieval_corpus(tmp_path, monkeypatch, moto_endpoint):
+    """Index the retrieval corpus as one document with topic embeddings"""
+    module = importlib.import_module("app.services.vector_service")
+
+    llm = TopicEmbeddings(np.random.default_rng(2))
+    monkeypatch.setattr(module, "llm_service", llm)
+    monkeypatch.setattr(module, "storage", Storage(moto_endpoint))
+    service = VectorService(store=LocalVectorStore(str(tmp_path)))
+    document_id = uuid.uuid4()
+    chunks = retrieval_corpus()
+    await service.index_document(document_id, "\n".join(chunks), chunks)
+    # Queries are answered from S3, as in a fresh process
+    service.lexical_indexes.entries.clear()
+    service.chunk_stores.entries.clear()
+    return service, llm, document_id
+
+
+@pytest.mark.asyncio
+async def test_hybrid_retrieval_quality(tmp_path, monkeypatch, moto_endpoint):
+    service, llm, document_id = await indexed_retrieval_corpus(
+        tmp_path, monkeypatch, moto_endpoint
+    )
+    rows = {}
+    for mode in ("vector", "lexical", "hybrid"):
+        calls = llm.calls
+        hits = 0
+        for question, topic, i in EXACT_QUESTIONS:
+            matches = await service.query_document(
+                document_id, question, top_k=5, mode=mode
+            )
+            target = topic * CHUNKS_PER_TOPIC + i
+            hits += target in [match["chunk_id"] for match in matches]
+        rows[mode] = (hits / len(EXACT_QUESTIONS), llm.calls - calls)
+    assert rows["hybrid"][0] == 1.0
+    assert rows["vector"][0] < rows["hybrid"][0]
+    # Lexical retrieval needs no embedding call
+    assert rows["lexical"][1] == 0
+    assert rows["vector"][1] == rows["hybrid"][1] == len(EXACT_QUESTIONS)
+
+    # Paraphrased questions share no terms but the topic, so hybrid keeps
+    # the dense results
+    for topic in range(0, TOPICS, 8):
+        matches = await service.query_document(
+            document_id, f"Findings about topic-{topic}?", top_k=5
+        )
+        assert {m["chunk_id"] // CHUNKS_PER_TOPIC for m in matches} == {topic}
+
+    passages = await service.build_context(document_id, matches, 200)
+    assert matches[0]["chunk_id"] in passages[0]["chunk_ids"]
+
+    await service.delete_document(document_id)
+    assert await service.lexical_index(document_id) is None
+    assert await service.chunk_store(document_id) is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.benchmark
+async def test_benchmark_retrieval_modes(tmp_path, monkeypatch, moto_endpoint):
+    service, _, document_id = await indexed_retrieval_corpus(
+        tmp_path, monkeypatch, moto_endpoint
+    )
+    timings = {}
+    for mode in ("vector", "lexical", "hybrid"):
+        start = time.perf_counter()
+        for question, _, _ in EXACT_QUESTIONS:
+            await service.query_document(
+                document_id, question, top_k=5, mode=mode
+            )
+        timings[mode] = (time.perf_counter() - start) / len(EXACT_QUESTIONS)
+        print(f"{mode}: {timings[mode] * 1000:.2f}ms per query")
+    assert timings["lexical"] < timings["vector"]
+
+
+@pytest.mark.asyncio
+async def test_reindex_drops_vectors_of_removed_chunks(
+    tmp_path, monkeypatch, moto_endpoint
+):
+    module = importlib.import_module("app.services.vector_service")
+
+    monkeypatch.setattr(
+        module, "llm_service", TopicEmbeddings(np.random.default_rng(3))
+    )
+    monkeypatch.setattr(module, "storage", Storage(moto_endpoint))
+    service = VectorService(store=LocalVectorStore(str(tmp_path)))
+    document_id = uuid.uuid4()
+    chunks = retrieval_corpus()
+    await service.index_document(document_id, "\n".join(chunks), chunks)
+
+    shorter = chunks[:20]
+    assert await service.index_document(
+        document_id, "\n".join(shorter), shorter
+    ) == len(shorter)
+    matches = await service.store.query(
+        [1.0] * DIMENSION, len(chunks), str(document_id)
+    )
+    assert sorted(m["metadata"]["chunk_id"] for m in matches) == list(
+        range(len(shorter))
+    )
@@ -0,0 +1,212 @@
+import asyncio
+import importlib
+import os
+import time
+
+import numpy as np
+import pytest
+
+from app.services.vector_store import LocalVectorStore, normalize_rows
+
+BENCHMARK_VECTORS = int(os.environ.get("VECTOR_BENCHMARK_ITEMS", "1000000"))
+
+
+def make_vectors(document_id: str, matrix: np.ndarray, offset: int = 0):
+    return [
+        {
+            "id": f"{document_id}_{offset + i}",
+            "values": row.tolist(),
+            "metadata": {"document_id": document_id, "chunk_id": offset + i},
+        }
+        for i, row in enumerate(matrix)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_local_store_query_upsert_and_delete(tmp_path):
+    rng = np.random.default_rng(0)
+    store = LocalVectorStore(str(tmp_path))
+    matrices = {doc: rng.normal(size=(20, 8)) for doc in ("a", "b")}
+    for doc, matrix in matrices.items():
+        await store.upsert(doc, make_vectors(doc, matrix))
+
+    matches = await store.query(matrices["a"][3].tolist(), 3)
+    assert matches[0]["id"] == "a_3"
+    assert matches[0]["score"] == pytest.approx(1.0, abs=1e-5)
+    assert [m["score"] for m in matches] == sorted(
+        (m["score"] for m in matches), reverse=True
+    )
+    only_b = await store.query(matrices["a"][3].tolist(), 5, "b")
+    assert {m["metadata"]["document_id"] for m in only_b} == {"b"}
+    # Batched queries rank like single ones
+    queries = [matrices["a"][i].tolist() for i in (3, 5)]
+    batched = await store.query_many(queries, 5, "b")
+    singles = [only_b, await store.query(queries[1], 5, "b")]
+    for batch_matches, single_matches in zip(batched, singles):
+        assert [m["id"] for m in batch_matches] == [
+            m["id"] for m in single_matches
+        ]
+        assert [m["score"] for m in batch_matches] == pytest.approx(
+            [m["score"] for m in single_matches], abs=1e-5
+        )
+
+    # Upsert replaces vectors with the same id and keeps the others
+    await store.upsert("a", make_vectors("a", -matrices["a"][3:4], 3))
+    matches = await store.query(matrices["a"][3].tolist(), 40, "a")
+    assert len(matches) == 20
+    assert matches[-1]["id"] == "a_3"
+
+    await store.delete("a")
+    assert await store.query(matrices["a"][0].tolist(), 5, "a") == []
+
+    # Vectors persist on disk for a new store instance
+    reopened = await LocalVectorStore(str(tmp_path)).query(
+        matrices["b"][7].tolist(), 1
+    )
+    assert reopened[0]["id"] == "b_7"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_upserts_to_one_namespace_keep_every_row(tmp_path):
+    rng = np.random.default_rng(0)
+    store = LocalVectorStore(str(tmp_path))
+    matrices = [rng.normal(size=(5, 8)) for _ in range(20)]
+    await asyncio.gather(
+        *(
+            store.upsert("centroids", make_vectors(str(doc), matrix))
+            for doc, matrix in enumerate(matrices)
+        )
+    )
+
+    matches = await store.query(matrices[0][0].tolist(), 200, "centroids")
+    assert len(matches) == 100
+    reopened = LocalVectorStore(str(tmp_path))
+    matches = await reopened.query(matrices[0][0].tolist(), 200, "centroids")
+    assert len(matches) == 100
+    # No temporary files are left behind
+    assert sorted(os.listdir(tmp_path)) == ["centroids.json", "centroids.npy"]
+
+
+def test_create_vector_store_rejects_unsupported_backends(monkeypatch):
+    module = importlib.import_module("app.services.vector_store")
+
+    monkeypatch.setattr(module.settings, "vector_db", "qdrant")
+    with pytest.raises(ValueError, match="Unsupported VECTOR_DB: qdrant"):
+        module.create_vector_store()
+
+
+async def median_seconds(calls) -> float:
+    timings = []
+    for call in calls:
+        start = time.perf_counter()
+        await call
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+@pytest.mark.asyncio
+async def test_namespace_query_scans_only_its_namespace(tmp_path, monkeypatch):
+    scanned = []
+    search = LocalVectorStore._search
+
+    def counting_search(partitions, vector, top_k):
+        scanned.append(sum(len(matrix) for matrix, _ in partitions))
+        return search(partitions, vector, top_k)
+
+    monkeypatch.setattr(
+        LocalVectorStore, "_search", staticmethod(counting_search)
+    )
+    rng = np.random.default_rng(0)
+    store = LocalVectorStore(str(tmp_path))
+    for doc in range(100):
+        matrix = rng.normal(size=(50, 16))
+        await store.upsert(str(doc), make_vectors(str(doc), matrix))
+    query = rng.normal(size=16).tolist()
+
+    assert len(await store.query(query, 5, "7")) == 5
+    await store.query(query, 5)
+    assert scanned == [50, 5000]
+
+    # Deleting a document removes its namespace and nothing else
+    await store.delete("7")
+    assert await store.query(query, 5, "7") == []
+    assert len(os.listdir(tmp_path)) == 2 * 99
+
+
+@pytest.mark.asyncio
+@pytest.mark.benchmark
+async def test_benchmark_namespace_latency_against_corpus_size(tmp_path):
+    rng = np.random.default_rng(0)
+    store = LocalVectorStore(str(tmp_path))
+    query = rng.normal(size=16).tolist()
+    indexed = 0
+    rows = []
+    for corpus_size in (10, 100, 1000):
+        for doc in range(indexed, corpus_size):
+            matrix = rng.normal(size=(50, 16))
+            await store.upsert(str(doc), make_vectors(str(doc), matrix))
+        namespace_query = await median_seconds(
+            store.query(query, 5, str(doc)) for doc in range(20)
+        )
+        # What a metadata-filtered query over the whole index has to scan
+        global_query = await median_seconds(
+            store.query(query, 5) for _ in range(5)
+        )
+        deleted = range(corpus_size - 5, corpus_size)
+        delete = await median_seconds(store.delete(str(d)) for d in deleted)
+        # Deleted documents are indexed again for the next corpus size
+        indexed = deleted.start
+        rows.append((corpus_size, namespace_query, global_query, delete))
+    for corpus_size, namespace_query, global_query, delete in rows:
+        print(
+            f"{corpus_size} documents: namespace query "
+            f"{namespace_query * 1000:.2f}ms, global query "
+            f"{global_query * 1000:.2f}ms, delete {delete * 1000:.2f}ms"
+        )
+    assert rows[-1][1] < rows[0][1] * 5
+    assert rows[-1][3] < rows[0][3] * 5
+    assert rows[-1][2] > rows[0][2] * 10
+
+
+@pytest.mark.asyncio
+@pytest.mark.benchmark
+async def test_benchmark_local_store_against_brute_force(tmp_path):
+    rng = np.random.default_rng(0)
+    dimension, documents, top_k = 64, 1000, 10
+    per_document = BENCHMARK_VECTORS // documents
+    store = LocalVectorStore(str(tmp_path))
+    matrices = []
+    for doc in range(documents):
+        matrix = rng.normal(size=(per_document, dimension)).astype(np.float32)
+        matrices.append(matrix)
+        await store.upsert(str(doc), make_vectors(str(doc), matrix))
+    corpus = normalize_rows(np.concatenate(matrices))
+    queries = rng.normal(size=(20, dimension)).astype(np.float32)
+
+    start = time.perf_counter()
+    expected = [
+        set(np.argsort(-(corpus @ normalize_rows(q[None])[0]))[:top_k])
+        for q in queries
+    ]
+    brute_force_time = (time.perf_counter() - start) / len(queries)
+
+    start = time.perf_counter()
+    results = [await store.query(q.tolist(), top_k) for q in queries]
+    store_time = (time.perf_counter() - start) / len(queries)
+
+    def row(match) -> int:
+        doc, chunk = match["id"].split("_")
+        return int(doc) * per_document + int(chunk)
+
+    recall = np.mean(
+        [
+            len(expected_rows & {row(m) for m in matches}) / top_k
+            for expected_rows, matches in zip(expected, results)
+        ]
+    )
+    print(
+        f"{len(corpus)} vectors: brute force {brute_force_time * 1000:.1f}ms, "
+        f"local store {store_time * 1000:.1f}ms, recall@{top_k} {recall:.3f}"
+    )
+    # Search is exact, partitioned by document
+    assert recall == 1.0
@@ -0,0 +1,122 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+
+from app.services.queue_service import InMemoryQueue, ProcessingMetrics
+from app.worker import Worker, handle_records
+
+
+@pytest.mark.asyncio
+async def test_worker_retries_then_dead_letters(monkeypatch):
+    from app import worker as module
+
+    monkeypatch.setattr(module.settings, "queue_max_attempts", 3)
+    monkeypatch.setattr(module.settings, "queue_retry_backoff", 0)
+    attempts = []
+
+    async def failing_handler(document_id):
+        attempts.append(document_id)
+        raise RuntimeError("boom")
+
+    queue = InMemoryQueue()
+    worker = Worker(queue, failing_handler, 2, ProcessingMetrics())
+    document_id = uuid.uuid4()
+    await queue.enqueue(document_id)
+    worker.start()
+    for _ in range(100):
+        if queue.dead_letters:
+            break
+        await asyncio.sleep(0.01)
+    await worker.shutdown()
+    assert attempts == [document_id] * 3
+    assert queue.dead_letters == [
+        {"document_id": str(document_id), "error": "boom"}
+    ]
+    assert await queue.depth() == 0
+
+
+@pytest.mark.asyncio
+async def test_worker_records_stage_latency():
+    processed = asyncio.Event()
+
+    async def handler(document_id):
+        processed.set()
+
+    metrics = ProcessingMetrics()
+    queue = InMemoryQueue()
+    worker = Worker(queue, handler, 1, metrics)
+    await queue.enqueue(uuid.uuid4())
+    worker.start()
+    await asyncio.wait_for(processed.wait(), 5)
+    await worker.shutdown()
+    snapshot = metrics.snapshot()
+    assert snapshot["stages"]["total"]["count"] == 1
+    assert snapshot["stages"]["queue_wait"]["count"] == 1
+
+
+class RecordingQueue(InMemoryQueue):
+    def __init__(self):
+        super().__init__()
+        self.extended = []
+
+    async def extend(self, job, seconds):
+        self.extended.append(job.document_id)
+
+
+@pytest.mark.asyncio
+async def test_worker_extends_visibility_while_a_job_runs():
+    queue = RecordingQueue()
+    release = asyncio.Event()
+
+    async def slow_handler(document_id):
+        await release.wait()
+
+    worker = Worker(queue, slow_handler, 1, ProcessingMetrics(), 0.01)
+    document_id = uuid.uuid4()
+    await queue.enqueue(document_id)
+    worker.start()
+    for _ in range(100):
+        if len(queue.extended) >= 3:
+            break
+        await asyncio.sleep(0.01)
+    release.set()
+    await worker.shutdown()
+    assert queue.extended[:3] == [str(document_id)] * 3
+    # The heartbeat stops once the job is acknowledged
+    extended = len(queue.extended)
+    await asyncio.sleep(0.05)
+    assert len(queue.extended) == extended
+    assert await queue.depth() == 0
+
+
+@pytest.mark.asyncio
+async def test_handle_records_reports_failed_messages():
+    processed = []
+    failing_id = uuid.uuid4()
+
+    async def handler(document_id):
+        if document_id == failing_id:
+            raise RuntimeError("boom")
+        processed.append(document_id)
+
+    document_ids = [uuid.uuid4(), failing_id, uuid.uuid4()]
+    records = [
+        {
+            "messageId": f"message-{i}",
+            "body": json.dumps({"document_id": str(document_id)}),
+        }
+        for i, document_id in enumerate(document_ids)
+    ]
+    records.append({"messageId": "message-3", "body": "not json"})
+    metrics = ProcessingMetrics()
+    response = await handle_records(records, handler, metrics)
+    assert processed == [document_ids[0], document_ids[2]]
+    assert response == {
+        "batchItemFailures": [
+            {"itemIdentifier": "message-1"},
+            {"itemIdentifier": "message-3"},
+        ]
+    }
+    assert metrics.snapshot()["stages"]["total"]["count"] == 3
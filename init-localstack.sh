@@ -47,11 +47,23 @@ if ! awslocal dynamodb describe-table --table-name research-metadata >/dev/null
     # Create DynamoDB table
     awslocal dynamodb create-table \
       --table-name research-metadata \
-      --attribute-definitions AttributeName=id,AttributeType=S \
+      --attribute-definitions \
+        AttributeName=id,AttributeType=S \
+        AttributeName=status,AttributeType=S \
+        AttributeName=record_type,AttributeType=S \
+        AttributeName=upload_date,AttributeType=S \
+        AttributeName=content_hash,AttributeType=S \
       --key-schema AttributeName=id,KeyType=HASH \
+      --global-secondary-indexes \
+        '[{"IndexName":"status-upload_date-index","KeySchema":[{"AttributeName":"status","KeyType":"HASH"},{"AttributeName":"upload_date","KeyType":"RANGE"}],"Projection":{"ProjectionType":"ALL"}},{"IndexName":"record_type-upload_date-index","KeySchema":[{"AttributeName":"record_type","KeyType":"HASH"},{"AttributeName":"upload_date","KeyType":"RANGE"}],"Projection":{"ProjectionType":"ALL"}},{"IndexName":"content_hash-index","KeySchema":[{"AttributeName":"content_hash","KeyType":"HASH"}],"Projection":{"ProjectionType":"INCLUDE","NonKeyAttributes":["status"]}}]' \
       --billing-mode PAY_PER_REQUEST
 else
     echo "DynamoDB table research-metadata already exists"
 fi
 
+# Create the document processing queue and its dead-letter queue
+echo "Creating SQS queues: document-processing, document-processing-dlq"
+awslocal sqs create-queue --queue-name document-processing-dlq >/dev/null
+awslocal sqs create-queue --queue-name document-processing >/dev/null
+
 echo "LocalStack initialization complete!"
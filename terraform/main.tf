@@ -60,7 +60,24 @@ resource "aws_iam_policy" "lambda_policy" {
           "dynamodb:UpdateItem"
         ]
         Effect   = "Allow"
-        Resource = aws_dynamodb_table.research_metadata.arn
+        Resource = [
+          aws_dynamodb_table.research_metadata.arn,
+          "${aws_dynamodb_table.research_metadata.arn}/index/*"
+        ]
+      },
+      {
+        Action = [
+          "sqs:SendMessage",
+          "sqs:ReceiveMessage",
+          "sqs:DeleteMessage",
+          "sqs:ChangeMessageVisibility",
+          "sqs:GetQueueAttributes"
+        ]
+        Effect   = "Allow"
+        Resource = [
+          aws_sqs_queue.document_processing.arn,
+          aws_sqs_queue.document_processing_dlq.arn
+        ]
       }
     ]
   })
@@ -101,11 +118,73 @@ resource "aws_dynamodb_table" "research_metadata" {
     type = "S"
   }
 
+  attribute {
+    name = "status"
+    type = "S"
+  }
+
+  attribute {
+    name = "record_type"
+    type = "S"
+  }
+
+  attribute {
+    name = "upload_date"
+    type = "S"
+  }
+
+  attribute {
+    name = "content_hash"
+    type = "S"
+  }
+
+  // Documents by processing status, newest first
+  global_secondary_index {
+    name            = "status-upload_date-index"
+    hash_key        = "status"
+    range_key       = "upload_date"
+    projection_type = "ALL"
+  }
+
+  // All documents by upload date, newest first
+  global_secondary_index {
+    name            = "record_type-upload_date-index"
+    hash_key        = "record_type"
+    range_key       = "upload_date"
+    projection_type = "ALL"
+  }
+
+  // Documents by SHA-256 of the PDF, to deduplicate uploads
+  global_secondary_index {
+    name               = "content_hash-index"
+    hash_key           = "content_hash"
+    projection_type    = "INCLUDE"
+    non_key_attributes = ["status"]
+  }
+
   tags = {
     Name = "GenAI Research Metadata"
   }
 }
 
+// Queue of documents waiting for OCR, LLM analysis and indexing.
+// Workers dead-letter jobs themselves after QUEUE_MAX_ATTEMPTS; the
+// redrive policy does the same for the Lambda consumer.
+resource "aws_sqs_queue" "document_processing" {
+  name                       = "document-processing"
+  visibility_timeout_seconds = 900
+  message_retention_seconds  = 1209600
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.document_processing_dlq.arn
+    maxReceiveCount     = 3
+  })
+}
+
+resource "aws_sqs_queue" "document_processing_dlq" {
+  name                      = "document-processing-dlq"
+  message_retention_seconds = 1209600
+}
+
 // Lambda for processing new reports
 resource "aws_lambda_function" "process_reports" {
   filename         = "process_reports.zip"
@@ -123,6 +202,22 @@ resource "aws_lambda_function" "process_reports" {
   }
 }
 
+locals {
+  backend_environment = {
+    DYNAMODB_TABLE = aws_dynamodb_table.research_metadata.name
+    S3_BUCKET_NAME = aws_s3_bucket.research_storage.id
+    AWS_REGION = var.aws_region
+    PINECONE_API_KEY = var.pinecone_api_key
+    PINECONE_ENVIRONMENT = var.pinecone_environment
+    PINECONE_INDEX_NAME = var.pinecone_index_name
+    EMBEDDING_DIMENSION = var.embedding_dimension
+    MISTRAL_API_KEY = var.mistral_api_key
+    QUEUE_BACKEND = "sqs"
+    SQS_QUEUE_URL = aws_sqs_queue.document_processing.url
+    SQS_DEAD_LETTER_QUEUE_URL = aws_sqs_queue.document_processing_dlq.url
+  }
+}
+
 # Lambda function for API backend
 resource "aws_lambda_function" "api_lambda" {
   function_name = "genai-research-api"
@@ -134,19 +229,34 @@ resource "aws_lambda_function" "api_lambda" {
   role          = aws_iam_role.lambda_role.arn
 
   environment {
-    variables = {
-      DYNAMODB_TABLE = aws_dynamodb_table.research_metadata.name
-      S3_BUCKET_NAME = aws_s3_bucket.research_storage.id
-      AWS_REGION = var.aws_region
-      PINECONE_API_KEY = var.pinecone_api_key
-      PINECONE_ENVIRONMENT = var.pinecone_environment
-      PINECONE_INDEX_NAME = var.pinecone_index_name
-      EMBEDDING_DIMENSION = var.embedding_dimension
-      MISTRAL_API_KEY = var.mistral_api_key
-    }
+    variables = local.backend_environment
+  }
+}
+
+# Lambda function consuming the document processing queue
+resource "aws_lambda_function" "worker_lambda" {
+  function_name = "genai-research-worker"
+  filename      = "../backend_lambda.zip"
+  handler       = "app.worker.lambda_handler"
+  runtime       = "python3.9"
+  // At most the queue's visibility timeout, so jobs are not redelivered
+  // while they run
+  timeout     = 900
+  memory_size = 2048
+  role        = aws_iam_role.lambda_role.arn
+
+  environment {
+    variables = local.backend_environment
   }
 }
 
+resource "aws_lambda_event_source_mapping" "document_processing" {
+  event_source_arn        = aws_sqs_queue.document_processing.arn
+  function_name           = aws_lambda_function.worker_lambda.arn
+  batch_size              = 1
+  function_response_types = ["ReportBatchItemFailures"]
+}
+
 resource "aws_apigatewayv2_api" "api_gateway" {
   name          = "genai-research-api"
   protocol_type = "HTTP"